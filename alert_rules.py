@@ -0,0 +1,324 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from datetime import datetime
+
+import numpy as np
+
+import rollups
+from data_version import bump_generation
+from db_connections import connect_for_write
+
+# ==============================================================================
+# CLASSIFICAÇÃO DOS ALERTAS NA INGESTÃO
+# ------------------------------------------------------------------------------
+# Cada alerta é marcado uma única vez, ao ser carregado, em colunas flag_*
+# (0/1, com índice parcial) de SecurityAlerts; o dashboard só conta linhas com
+# a flag em vez de varrer os textos a cada requisição. Uma regra casa se alguma
+# das suas palavras aparece (sem diferenciar maiúsculas) em algum dos campos
+# indicados. Todas as palavras de todas as regras formam uma única expressão
+# compilada, aplicada uma vez a cada valor distinto de cada campo.
+#
+# As regras padrão estão em DEFAULT_RULES; o arquivo JSON em ALERT_RULES_FILE
+# (padrão: alert_rules.json ao lado deste módulo) acrescenta ou substitui regras
+# pelo nome da flag ({"flag_x": {"fields": {"campo": ["palavra", ...]}}}, ou
+# null para remover). O banco guarda a impressão digital das regras usadas:
+# quando ela muda, retag_alerts() (python alert_rules.py, a ingestão ou a task
+# 'alerts.retag') reclassifica a tabela inteira e invalida os caches.
+# ==============================================================================
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+RULES_FILE = os.environ.get('ALERT_RULES_FILE') or os.path.join(BASE_DIR, 'alert_rules.json')
+ALERTS_TABLE = 'SecurityAlerts'
+RULESET_TABLE = 'AlertRuleSet'
+
+DEFAULT_RULES = {
+    'flag_deletion': {
+        'description': 'Exclusões/desativações administrativas',
+        'fields': {
+            'alert_category': ['delet', 'desativ'],
+            'threat_model_name': ['delet', 'deactiv'],
+        },
+    },
+    'flag_admin_tool': {
+        'description': 'Acesso a ferramentas administrativas',
+        'fields': {
+            'alert_category': ['admin'],
+            'threat_model_name': ['admin', 'psexec', 'wmic', 'dcom', 'schtask', 'system administration tools',
+                                  'remote desktop', 'winrm'],
+        },
+    },
+    'flag_ransomware': {
+        'description': 'Indícios de ransomware',
+        'fields': {
+            'threat_model_name': ['ransom', 'encrypt', 'crypto'],
+            'alert_category': ['ransom'],
+        },
+    },
+    'flag_kerberos': {
+        'description': 'Menções a krbtgt/Kerberos',
+        'fields': {
+            'threat_model_name': ['krbtgt', 'kerberos'],
+            'alert_category': ['krbtgt', 'kerberos'],
+            'asset': ['krbtgt', 'kerberos'],
+        },
+    },
+    'flag_antt_access': {
+        'description': 'Acesso ao ambiente ANTT',
+        'fields': {
+            'asset': ['antt'],
+            'file_server_domain': ['antt'],
+            'user_name': ['antt'],
+        },
+    },
+    'flag_step_meeting': {
+        'description': 'Reuniões "ANTT STEP"',
+        'fields': {
+            'threat_model_name': ['step', 'meeting', 'calendar'],
+        },
+    },
+    'flag_itsm_ticket': {
+        'description': 'Fechamento com referência a chamado (ITSM)',
+        'fields': {
+            'close_reason': ['inc', 'sr-', '#', 'ticket', 'jira', 'servicenow'],
+        },
+    },
+}
+
+# Contadores da seção 'security' do dashboard (sobre alertas ativos) e a flag de cada um
+SECURITY_COUNTS = {
+    'admin_deletions': 'flag_deletion',
+    'admin_tool_access': 'flag_admin_tool',
+    'ransomware_indicators': 'flag_ransomware',
+}
+
+_FLAG_NAME = re.compile(r'^flag_[a-z0-9_]+$')
+
+
+def load_rules(path=RULES_FILE):
+    """Regras padrão combinadas com as do arquivo JSON (se existir), validadas."""
+    rules = {name: rule for name, rule in DEFAULT_RULES.items()}
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for name, rule in json.load(f).items():
+                if rule is None:
+                    rules.pop(name, None)
+                else:
+                    rules[name] = rule
+    for name, rule in rules.items():
+        if not _FLAG_NAME.match(name):
+            raise ValueError(f"nome de flag inválido (use flag_<nome> em minúsculas): {name!r}")
+        fields = rule.get('fields') if isinstance(rule, dict) else None
+        if not fields or not all(isinstance(words, list) and words for words in fields.values()):
+            raise ValueError(f"regra {name!r} sem campos/palavras")
+    return rules
+
+
+def rules_fingerprint(rules):
+    # Só o que muda a classificação entra na impressão digital (a descrição não)
+    canonical = {name: {field: sorted(w.lower() for w in words) for field, words in rule['fields'].items()}
+                 for name, rule in rules.items()}
+    return hashlib.sha1(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
+
+class AlertClassifier:
+    def __init__(self, rules):
+        self.rules = rules
+        self.flags = tuple(sorted(rules))
+        self.fingerprint = rules_fingerprint(rules)
+        # (campo, palavra) -> flags que ela dispara
+        self._targets = {}
+        for flag, rule in rules.items():
+            for field, words in rule['fields'].items():
+                for word in words:
+                    self._targets.setdefault((field, word.lower()), set()).add(flag)
+        self.fields = tuple(sorted({field for field, _ in self._targets}))
+        words = sorted({word for _, word in self._targets}, key=len, reverse=True)
+        # Lookahead: uma tentativa por posição, com a palavra mais longa que começa
+        # ali; as palavras contidas nela (ex: 'ransom' em 'ransomware') vêm de _within.
+        self._pattern = re.compile('(?=({}))'.format('|'.join(re.escape(w) for w in words)))
+        self._within = {w: [v for v in words if v in w] for w in words}
+
+    def words_in(self, text):
+        found = set()
+        for m in self._pattern.finditer(text.lower()):
+            found.update(self._within[m.group(1)])
+        return found
+
+    def flags_for(self, field, value):
+        """Flags disparadas por um valor do campo."""
+        if value is None:
+            return set()
+        flags = set()
+        for word in self.words_in(str(value)):
+            flags.update(self._targets.get((field, word), ()))
+        return flags
+
+    def tag_frame(self, df):
+        """Acrescenta as colunas flag_* (0/1) a um DataFrame de alertas, classificando cada valor distinto uma vez."""
+        flags = {flag: np.zeros(len(df), dtype=bool) for flag in self.flags}
+        for field in self.fields:
+            if field not in df.columns:
+                continue
+            column = df[field]
+            hits = {}
+            for value in column.dropna().unique():
+                for flag in self.flags_for(field, value):
+                    hits.setdefault(flag, []).append(value)
+            for flag, values in hits.items():
+                flags[flag] |= column.isin(values).to_numpy()
+        for flag, mask in flags.items():
+            df[flag] = mask.astype('int64')
+        return df
+
+
+_classifier = None
+
+
+def get_classifier():
+    """Classificador das regras atuais (carregadas uma vez por processo)."""
+    global _classifier
+    if _classifier is None:
+        _classifier = AlertClassifier(load_rules())
+    return _classifier
+
+
+def tag_frame(df):
+    return get_classifier().tag_frame(df)
+
+
+# ==============================================================================
+# REGRAS GRAVADAS NO BANCO E RECLASSIFICAÇÃO
+# ==============================================================================
+
+def _columns(conn, table):
+    return [r[1] for r in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def _ensure_ruleset_table(conn):
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {RULESET_TABLE} ("
+        "id INTEGER PRIMARY KEY CHECK (id = 1), fingerprint TEXT NOT NULL, rules TEXT NOT NULL, tagged_at TEXT)"
+    )
+
+
+def record_rules(conn, classifier=None):
+    """Registra as regras com que a tabela foi classificada (na transação da carga/reclassificação)."""
+    classifier = classifier or get_classifier()
+    _ensure_ruleset_table(conn)
+    conn.execute(
+        f"INSERT OR REPLACE INTO {RULESET_TABLE} (id, fingerprint, rules, tagged_at) VALUES (1, ?, ?, ?)",
+        (classifier.fingerprint, json.dumps(classifier.rules, ensure_ascii=False, sort_keys=True),
+         datetime.now().isoformat(timespec='seconds'))
+    )
+
+
+def stored_fingerprint(conn):
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (RULESET_TABLE,)).fetchone():
+        return None
+    row = conn.execute(f"SELECT fingerprint FROM {RULESET_TABLE} WHERE id = 1").fetchone()
+    return row[0] if row else None
+
+
+def needs_retag(conn, classifier=None):
+    """True se há alertas classificados com outras regras (ou ainda sem as colunas flag_*)."""
+    classifier = classifier or get_classifier()
+    columns = _columns(conn, ALERTS_TABLE)
+    if not columns:
+        return False
+    return (stored_fingerprint(conn) != classifier.fingerprint
+            or not set(classifier.flags).issubset(columns))
+
+
+def ensure_flag_indexes(conn, classifier=None):
+    # Índice parcial por flag, com o status (filtro de alertas ativos): o COUNT
+    # do dashboard lê só as linhas marcadas
+    classifier = classifier or get_classifier()
+    columns = set(_columns(conn, ALERTS_TABLE))
+    for flag in classifier.flags:
+        if flag in columns:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS ix_securityalerts_{flag} '
+                         f'ON {ALERTS_TABLE} (status) WHERE {flag} = 1')
+
+
+def _retag(conn, classifier):
+    columns = _columns(conn, ALERTS_TABLE)
+    # Flags que saíram das regras deixam de existir (com os seus índices)
+    for stale in [c for c in columns if _FLAG_NAME.match(c) and c not in classifier.flags]:
+        conn.execute(f'DROP INDEX IF EXISTS ix_securityalerts_{stale}')
+        conn.execute(f'ALTER TABLE {ALERTS_TABLE} DROP COLUMN "{stale}"')
+    for flag in classifier.flags:
+        if flag not in columns:
+            conn.execute(f'ALTER TABLE {ALERTS_TABLE} ADD COLUMN "{flag}" INTEGER NOT NULL DEFAULT 0')
+
+    # Valores distintos que disparam cada flag, por campo; o UPDATE consulta a tabela temporária
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS alert_rule_hits (flag TEXT, field TEXT, value, '
+                 'PRIMARY KEY (flag, field, value))')
+    conn.execute('DELETE FROM temp.alert_rule_hits')
+    fields = [f for f in classifier.fields if f in columns]
+    for field in fields:
+        hits = [(flag, field, value)
+                for (value,) in conn.execute(f'SELECT DISTINCT "{field}" FROM {ALERTS_TABLE} WHERE "{field}" IS NOT NULL')
+                for flag in classifier.flags_for(field, value)]
+        conn.executemany('INSERT INTO temp.alert_rule_hits VALUES (?, ?, ?)', hits)
+
+    assignments = []
+    for flag in classifier.flags:
+        tests = [f"EXISTS (SELECT 1 FROM temp.alert_rule_hits h WHERE h.flag = '{flag}' AND h.field = '{field}' "
+                 f'AND h.value = {ALERTS_TABLE}."{field}")'
+                 for field in fields if field in classifier.rules[flag]['fields']]
+        assignments.append(f'"{flag}" = ({" OR ".join(tests) or "0"})')
+    cursor = conn.execute(f'UPDATE {ALERTS_TABLE} SET {", ".join(assignments)}')
+    conn.execute('DROP TABLE temp.alert_rule_hits')
+    return cursor.rowcount
+
+
+def retag(conn, classifier=None, force=False):
+    """Reclassifica na transação aberta se as regras mudaram (ou sempre, com force). Retorna o nº de linhas ou None."""
+    classifier = classifier or get_classifier()
+    if not _columns(conn, ALERTS_TABLE) or not (force or needs_retag(conn, classifier)):
+        return None
+    rollup_current = rollups.is_current(conn, ALERTS_TABLE)
+    rows = _retag(conn, classifier)
+    ensure_flag_indexes(conn, classifier)
+    record_rules(conn, classifier)
+    # Nova geração: snapshot do dashboard, caches da API e cache colunar ficam desatualizados
+    bump_generation(conn, ALERTS_TABLE)
+    if rollup_current:
+        # As flags não entram no rollup diário: ele continua válido na nova geração
+        rollups.record(conn, ALERTS_TABLE)
+    return rows
+
+
+def retag_alerts(db_path, force=False):
+    """Reclassifica todos os alertas se as regras mudaram (ou sempre, com force). Retorna o nº de linhas ou None."""
+    if not os.path.exists(db_path):
+        return None
+    conn = connect_for_write(db_path, isolation_level=None)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = retag(conn, force=force)
+            conn.execute('COMMIT' if rows is not None else 'ROLLBACK')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return rows
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Reclassifica os alertas com as regras atuais (alert_rules.json).")
+    parser.add_argument('db_path', nargs='?', default=os.path.join(BASE_DIR, 'antt_data.db'))
+    parser.add_argument('--force', action='store_true', help="Reclassifica mesmo que as regras não tenham mudado")
+    args = parser.parse_args()
+    from dashboard_tasks import trigger_alert_retag
+    if trigger_alert_retag(args.db_path, force=args.force):
+        print("Reclassificação dos alertas disparada.")
+    else:
+        print(f"Não foi possível reclassificar os alertas de {args.db_path}.", file=sys.stderr)
+        sys.exit(1)
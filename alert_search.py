@@ -0,0 +1,126 @@
+import re
+
+# ==============================================================================
+# BUSCA TEXTUAL NOS ALERTAS (SQLite FTS5)
+# ------------------------------------------------------------------------------
+# SecurityAlertsSearch é um índice FTS5 de "conteúdo externo" sobre as colunas
+# de texto que os analistas procuram (usuário, conta, ativo, modelo de ameaça,
+# departamento, file server/domínio): o índice guarda só os termos e aponta
+# para o rowid (= id) de SecurityAlerts, sem duplicar o texto.
+#   - Carga completa: a tabela é recriada sem gatilhos (inserção rápida) e o
+#     índice é reconstruído de uma vez ao fim da carga, na mesma transação;
+#   - Carga incremental: gatilhos em SecurityAlerts atualizam o índice a cada
+#     linha inserida, removida ou com texto indexado alterado pelo upsert (as
+#     flags da classificação, alert_rules.py, não disparam o gatilho de UPDATE).
+# Se a tabela foi recriada, ganhou uma coluna indexável ou os gatilhos faltam,
+# update() reconstrói o índice. /api/v1/securityalerts/search?q= ordena pelo
+# bm25 do FTS5 ("rank").
+# ==============================================================================
+
+ALERTS_TABLE = 'SecurityAlerts'
+SEARCH_TABLE = 'SecurityAlertsSearch'
+SEARCH_COLUMNS = (
+    'user_name', 'sam_account_name', 'asset', 'threat_model_name', 'department', 'file_server_domain',
+)
+# Sem diferenciar acentos ("Florêncio" casa com "florencio"); prefixos de 2 e 3
+# caracteres indexados para buscas "joa*"
+TOKENIZE = "unicode61 remove_diacritics 2"
+PREFIX = '2 3'
+
+_TRIGGERS = {
+    'ai': 'AFTER INSERT',
+    'ad': 'AFTER DELETE',
+    'au': 'AFTER UPDATE OF {columns}',
+}
+_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def _columns(conn, table_name):
+    return [r[1] for r in conn.execute(f'PRAGMA table_info("{table_name}")')]
+
+
+def _trigger_name(suffix):
+    return f'{SEARCH_TABLE.lower()}_{suffix}'
+
+
+def indexed_columns(conn):
+    """Colunas de SEARCH_COLUMNS presentes em SecurityAlerts, na ordem de SEARCH_COLUMNS."""
+    columns = set(_columns(conn, ALERTS_TABLE))
+    return [c for c in SEARCH_COLUMNS if c in columns]
+
+
+def is_current(conn):
+    """True se o índice cobre as colunas atuais e os gatilhos que o mantêm existem."""
+    columns = indexed_columns(conn)
+    if not columns or _columns(conn, SEARCH_TABLE) != columns:
+        return False
+    names = [_trigger_name(suffix) for suffix in _TRIGGERS]
+    found = conn.execute(
+        f"SELECT COUNT(*) FROM sqlite_master WHERE type='trigger' AND tbl_name=? "
+        f"AND name IN ({', '.join('?' for _ in names)})", (ALERTS_TABLE, *names)
+    ).fetchone()[0]
+    return found == len(names)
+
+
+def drop(conn):
+    for suffix in _TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS "{_trigger_name(suffix)}"')
+    conn.execute(f'DROP TABLE IF EXISTS "{SEARCH_TABLE}"')
+
+
+def rebuild(conn):
+    """Recria o índice a partir da tabela inteira, com os gatilhos de sincronização."""
+    drop(conn)
+    columns = indexed_columns(conn)
+    if not columns:
+        return
+    names = ', '.join(f'"{c}"' for c in columns)
+    new = ', '.join(f'new."{c}"' for c in columns)
+    old = ', '.join(f'old."{c}"' for c in columns)
+    # O upsert reescreve todas as colunas: só reindexa se algum texto indexado mudou
+    changed = ' OR '.join(f'old."{c}" IS NOT new."{c}"' for c in columns)
+    conn.execute(
+        f'CREATE VIRTUAL TABLE "{SEARCH_TABLE}" USING fts5({names}, content=\'{ALERTS_TABLE}\', '
+        f"tokenize='{TOKENIZE}', prefix='{PREFIX}')"
+    )
+    conn.execute(f"INSERT INTO \"{SEARCH_TABLE}\" (\"{SEARCH_TABLE}\") VALUES ('rebuild')")
+    insert = f'INSERT INTO "{SEARCH_TABLE}" (rowid, {names}) VALUES (new.rowid, {new});'
+    delete = (f'INSERT INTO "{SEARCH_TABLE}" ("{SEARCH_TABLE}", rowid, {names}) '
+              f"VALUES ('delete', old.rowid, {old});")
+    bodies = {'ai': f'BEGIN {insert}', 'ad': f'BEGIN {delete}', 'au': f'WHEN {changed} BEGIN {delete} {insert}'}
+    for suffix, event in _TRIGGERS.items():
+        conn.execute(
+            f'CREATE TRIGGER "{_trigger_name(suffix)}" {event.format(columns=names)} ON "{ALERTS_TABLE}" '
+            f'{bodies[suffix]} END'
+        )
+
+
+def update(conn, full=False):
+    """Após uma carga de SecurityAlerts: full=True reconstrói; senão só se o índice não está em dia."""
+    if full or not is_current(conn):
+        rebuild(conn)
+
+
+# ==============================================================================
+# CONSULTA
+# ==============================================================================
+
+def match_query(text):
+    """Texto do usuário -> expressão MATCH do FTS5, ou None se não há termos.
+
+    Cada palavra (ou "frase entre aspas") vira uma frase FTS5 entre aspas, então
+    operadores e pontuação do texto não são interpretados; todas precisam
+    aparecer (AND). Um '*' no fim da palavra busca por prefixo.
+    """
+    phrases = []
+    for quoted, word in _TERM.findall(text or ''):
+        term = quoted if quoted else word
+        prefix = not quoted and term.endswith('*')
+        term = term.rstrip('*') if prefix else term
+        # Só pontuação não gera termo no tokenizador (o FTS5 ignoraria a frase vazia)
+        if not re.search(r'\w', term):
+            continue
+        phrase = '"{}"'.format(term.replace('"', '""'))
+        phrases.append(phrase + '*' if prefix else phrase)
+    return ' '.join(phrases) or None
+
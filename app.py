@@ -1,24 +1,73 @@
+import base64
+import hashlib
 import json
 import os
-from flask import Flask, jsonify, render_template, send_from_directory, request
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+from flask import Flask, Response, g, jsonify, render_template, send_from_directory, request, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from flask_restful import Api, Resource
+from flask_restful import Api, Resource, abort
+from sqlalchemy import and_, column, event, or_, select, table, text, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+import alert_rules
+import alert_search
+import metrics
+from db_connections import configure_engine
+from profiler import RequestProfiler, to_speedscope
+from data_version import TRACKED_TABLES, DataVersionTracker
+from db_schema import upgrade_database
+from response_cache import CachedResponse, ResponseCache, compress_stream, negotiate_encoding
 from flask_swagger_ui import get_swaggerui_blueprint
 
+try:
+    import orjson
+except ImportError:  # dependência opcional: sem ela, o encoder JSON do Flask
+    orjson = None
+
 # ==============================================================================
 # 1. CONFIGURAÇÃO INICIAL
 # ==============================================================================
 app = Flask(__name__)
 basedir = os.path.abspath(os.path.dirname(__file__))
+# ANTT_DB_PATH aponta a API para outro banco (ex: bancos sintéticos dos benchmarks)
+db_path = os.environ.get('ANTT_DB_PATH') or os.path.join(basedir, 'antt_data.db')
 
 # Configuração do Banco de Dados
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'antt_data.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = 'uma_chave_secreta_muito_segura'
 
 db = SQLAlchemy(app)
+# Mesmos PRAGMAs (WAL, mmap, cache, query_only) das demais leituras: db_connections.py
+with app.app_context():
+    configure_engine(db.engine)
 api = Api(app)
 
+
+def prepare_database():
+    """Migra o banco para o esquema atual e reclassifica os alertas se as regras mudaram.
+
+    Roda ao importar o app (servidor de desenvolvimento, gunicorn, Celery): o
+    banco servido está sempre na versão SCHEMA_VERSION. Idempotente e barato
+    quando já está em dia (só lê PRAGMA user_version e a impressão das regras).
+    """
+    try:
+        if upgrade_database(db_path):
+            print("✅ Banco migrado para o esquema atual.")
+        # Regras de classificação dos alertas alteradas desde a última carga
+        if alert_rules.retag_alerts(db_path) is not None:
+            print("✅ Alertas reclassificados com as regras atuais.")
+    except sqlite3.Error as e:
+        # Ex: banco bloqueado por uma carga em andamento; a API sobe com o banco como está
+        print(f"⚠️ Não foi possível migrar o banco ({db_path}): {e}")
+
+
+prepare_database()
+
 # ==============================================================================
 # 2. GERADOR DO ARQUIVO SWAGGER.JSON
 # ==============================================================================
@@ -118,8 +167,12 @@ def generate_swagger_spec():
                     {"name":"date_from","in":"query","required":False,"type":"string","format":"date","description":"Data inicial (YYYY-MM-DD)"},
                     {"name":"date_to","in":"query","required":False,"type":"string","format":"date","description":"Data final (YYYY-MM-DD)"},
                     {"name":"page","in":"query","required":False,"type":"integer","format":"int32","description":"Página (para paginação)"},
-                    {"name":"page_size","in":"query","required":False,"type":"integer","format":"int32","description":"Tamanho da página"}
+                    {"name":"page_size","in":"query","required":False,"type":"integer","format":"int32","description":"Tamanho da página"},
+                    {"name":"fields","in":"query","required":False,"type":"string","description":"Só estes campos, separados por vírgula (ex: date,file_server); as demais colunas nem são lidas do banco"},
+                    {"name":"stream","in":"query","required":False,"type":"boolean","description":"Exporta tudo como array JSON em streaming (sem paginação)"},
+                    {"name":"format","in":"query","required":False,"type":"string","enum":["ndjson","columnar"],"description":"'ndjson': exporta tudo em NDJSON (equivale a 'Accept: application/x-ndjson'); 'columnar': {\"columns\": [...], \"data\": {coluna: [valores]}}, com cada nome de campo uma única vez"}
                 ],
+                "produces": ["application/json", "application/x-ndjson"],
                 "responses": {
                     "200": {
                         "description": "Lista de métricas",
@@ -144,18 +197,27 @@ def generate_swagger_spec():
             "get": {
                 "tags": ["SecurityAlerts"],
                 "summary": "Lista alertas (filtragem disponível pela API)",
+                "description": "Alertas do mais recente para o mais antigo (alert_time, id), paginados por cursor. Quando há mais resultados, o cabeçalho 'Link' (rel=\"next\") e 'X-Next-Cursor' trazem o cursor da próxima página.",
                 "parameters": [
-                    {"name":"status","in":"query","required":False,"type":"string","description":"Filtra por status (ex: Open, Closed)"},
-                    {"name":"severity","in":"query","required":False,"type":"string","description":"Filtra por severidade (Low, Medium, High)"},
+                    {"name":"status","in":"query","required":False,"type":"string","description":"Filtra por status (ex: Open, Closed). Aceita vários separados por vírgula"},
+                    {"name":"severity","in":"query","required":False,"type":"string","description":"Filtra por severidade (Low, Medium, High). Aceita vários separados por vírgula"},
                     {"name":"date_from","in":"query","required":False,"type":"string","format":"date","description":"Data inicial (YYYY-MM-DD)"},
-                    {"name":"date_to","in":"query","required":False,"type":"string","format":"date","description":"Data final (YYYY-MM-DD)"},
-                    {"name":"page","in":"query","required":False,"type":"integer","format":"int32","description":"Página (para paginação)"},
-                    {"name":"page_size","in":"query","required":False,"type":"integer","format":"int32","description":"Tamanho da página"}
+                    {"name":"date_to","in":"query","required":False,"type":"string","format":"date","description":"Data final, inclusiva (YYYY-MM-DD)"},
+                    {"name":"cursor","in":"query","required":False,"type":"string","description":"Cursor da próxima página (valor de X-Next-Cursor)"},
+                    {"name":"page","in":"query","required":False,"type":"integer","format":"int32","description":"Página (OFFSET; prefira 'cursor' para varrer a lista)"},
+                    {"name":"page_size","in":"query","required":False,"type":"integer","format":"int32","description":"Tamanho da página (padrão 100, máximo 1000)"},
+                    {"name":"stream","in":"query","required":False,"type":"boolean","description":"Exporta tudo como array JSON em streaming (sem paginação)"},
+                    {"name":"format","in":"query","required":False,"type":"string","enum":["ndjson"],"description":"Exporta tudo em NDJSON (equivale a 'Accept: application/x-ndjson')"}
                 ],
+                "produces": ["application/json", "application/x-ndjson"],
                 "responses": {
                     "200": {
                         "description": "Lista de alertas",
                         "schema": {"type": "array", "items": {"$ref": "#/definitions/SecurityAlert"}},
+                        "headers": {
+                            "Link": {"type": "string", "description": "URL da próxima página (rel=\"next\")"},
+                            "X-Next-Cursor": {"type": "string", "description": "Cursor da próxima página"}
+                        },
                         "examples": {
                             "application/json": [
                                 {
@@ -173,10 +235,37 @@ def generate_swagger_spec():
                 }
             }
         },
+        "/api/v1/securityalerts/search": {
+            "get": {
+                "tags": ["SecurityAlerts"],
+                "summary": "Busca textual nos alertas (usuário, conta, ativo, modelo de ameaça, departamento, file server/domínio)",
+                "description": "Busca no índice FTS5 dos alertas, do mais relevante ao menos (bm25), sem diferenciar maiúsculas nem acentos. Todas as palavras precisam aparecer; \"texto entre aspas\" busca a frase e 'palavra*', o prefixo. Quando há mais resultados, o cabeçalho 'Link' (rel=\"next\") traz a próxima página.",
+                "parameters": [
+                    {"name":"q","in":"query","required":True,"type":"string","description":"Termos a buscar (ex: \"Rafael Nunes\" SUTEC, joa*)"},
+                    {"name":"page","in":"query","required":False,"type":"integer","format":"int32","description":"Página (padrão 1)"},
+                    {"name":"page_size","in":"query","required":False,"type":"integer","format":"int32","description":"Tamanho da página (padrão 100, máximo 1000)"}
+                ],
+                "responses": {
+                    "200": {
+                        "description": "Alertas encontrados, do mais relevante ao menos",
+                        "schema": {"type": "array", "items": {"$ref": "#/definitions/SecurityAlert"}},
+                        "headers": {"Link": {"type": "string", "description": "URL da próxima página (rel=\"next\")"}}
+                    },
+                    "400": {"description": "Parâmetro 'q' ausente ou sem termos"},
+                    "503": {"description": "Banco sem o índice de busca (migrar com python db_schema.py)"}
+                }
+            }
+        },
         "/api/v1/admetrics": {
             "get": {
                 "tags": ["ADMetrics"],
                 "summary": "Métricas do Active Directory por domínio",
+                "parameters": [
+                    {"name":"fields","in":"query","required":False,"type":"string","description":"Só estes campos, separados por vírgula (ex: date,file_server); as demais colunas nem são lidas do banco"},
+                    {"name":"stream","in":"query","required":False,"type":"boolean","description":"Exporta tudo como array JSON em streaming (sem paginação)"},
+                    {"name":"format","in":"query","required":False,"type":"string","enum":["ndjson","columnar"],"description":"'ndjson': exporta tudo em NDJSON (equivale a 'Accept: application/x-ndjson'); 'columnar': {\"columns\": [...], \"data\": {coluna: [valores]}}, com cada nome de campo uma única vez"}
+                ],
+                "produces": ["application/json", "application/x-ndjson"],
                 "responses": {"200": {"description": "Lista de métricas AD", "schema": {"type": "array", "items": {"$ref": "#/definitions/ADMetric"}}}}
             }
         },
@@ -184,12 +273,70 @@ def generate_swagger_spec():
             "get": {
                 "tags": ["Dashboard"],
                 "summary": "Dados agregados para o dashboard executivo",
-                "description": "Retorna KPIs e séries temporais usadas pelo dashboard: usuários, admins, contas de serviço, alertas ativos, mapa de vulnerabilidade e exposição de dados.",
-                "responses": {"200": {"description": "Objeto com dados do dashboard", "schema": {"$ref": "#/definitions/DashboardData"}}}
+                "description": "Retorna KPIs e séries temporais usadas pelo dashboard: usuários, admins, contas de serviço, alertas ativos, mapa de vulnerabilidade e exposição de dados. Os filtros opcionais restringem o cálculo ao período e ao domínio/servidor informados (AD por domain_name, file servers por file_server/file_server_domain, alertas por file_server_domain); cada combinação de filtros é calculada uma vez por versão dos dados.",
+                "parameters": [
+                    {"name":"date_from","in":"query","required":False,"type":"string","format":"date","description":"Data inicial (YYYY-MM-DD)"},
+                    {"name":"date_to","in":"query","required":False,"type":"string","format":"date","description":"Data final, inclusiva (YYYY-MM-DD)"},
+                    {"name":"domain","in":"query","required":False,"type":"string","description":"Domínio (ADMetrics.domain_name; file_server_domain ou file_server nas demais tabelas)"},
+                    {"name":"file_server","in":"query","required":False,"type":"string","description":"File server (FileServerMetrics.file_server; file_server_domain nos alertas). Não filtra o AD"},
+                    {"name":"sections","in":"query","required":False,"type":"string","description":"Só estas chaves da resposta, separadas por vírgula (ad_health, security, ad_vulnerability_map, data_exposure, governance, varonis, vulnerabilities). Só as seções necessárias são calculadas"},
+                    {"name":"fields","in":"query","required":False,"type":"string","description":"Só estes campos, em caminhos com '.' separados por vírgula (ex: ad_health.latest,security.total_alerts)"}
+                ],
+                "responses": {
+                    "200": {
+                        "description": "Objeto com dados do dashboard",
+                        "schema": {"$ref": "#/definitions/DashboardData"},
+                        "headers": {"X-Dashboard-Version": {"type": "string", "description": "Versão dos dados (o 'version' dos eventos de /api/v1/dashboard_data/stream)"}}
+                    },
+                    "400": {"description": "Data inválida, date_from posterior a date_to ou campo desconhecido"}
+                }
+            }
+        },
+        "/api/v1/dashboard_data/{section}": {
+            "get": {
+                "tags": ["Dashboard"],
+                "summary": "Uma seção do dashboard",
+                "description": "Equivale a /api/v1/dashboard_data?sections={section}: calcula só a seção que produz a chave e retorna {\"<section>\": ...}. Aceita os mesmos filtros de período/domínio/servidor. Os indicadores de 'security' calculados pela governança (krbtgt_reset_recommended, itsm_integration, access_antt, antt_step_meetings) só vêm quando 'governance' também é pedida.",
+                "parameters": [
+                    {"name":"section","in":"path","required":True,"type":"string","enum":["ad_health","security","ad_vulnerability_map","data_exposure","governance","varonis","vulnerabilities"]},
+                    {"name":"fields","in":"query","required":False,"type":"string","description":"Campos da seção, separados por vírgula (ex: total_alerts,timeline)"},
+                    {"name":"date_from","in":"query","required":False,"type":"string","format":"date","description":"Data inicial (YYYY-MM-DD)"},
+                    {"name":"date_to","in":"query","required":False,"type":"string","format":"date","description":"Data final, inclusiva (YYYY-MM-DD)"},
+                    {"name":"domain","in":"query","required":False,"type":"string","description":"Domínio"},
+                    {"name":"file_server","in":"query","required":False,"type":"string","description":"File server"}
+                ],
+                "responses": {
+                    "200": {"description": "Objeto com a seção pedida"},
+                    "400": {"description": "Data inválida ou date_from posterior a date_to"},
+                    "404": {"description": "Seção inexistente"}
+                }
             }
         }
     }
 
+    # Todas as leituras aceitam requisições condicionais (ETag / Last-Modified)
+    for path in paths.values():
+        path["get"].setdefault("parameters", []).extend([
+            {"name":"If-None-Match","in":"header","required":False,"type":"string","description":"ETag de uma resposta anterior: 304 se os dados não mudaram"},
+            {"name":"If-Modified-Since","in":"header","required":False,"type":"string","description":"Data HTTP: 304 se não houve carga desde então"}
+        ])
+        path["get"]["responses"]["304"] = {"description": "Não modificado: a cópia em cache do cliente continua válida"}
+
+    # Canal de eventos: sempre aberto, não participa das requisições condicionais
+    paths["/api/v1/dashboard_data/stream"] = {
+        "get": {
+            "tags": ["Dashboard"],
+            "summary": "Atualizações do dashboard em tempo real (Server-Sent Events)",
+            "description": "Fluxo text/event-stream com eventos 'dashboard' a cada carga de dados. O primeiro evento traz todas as seções ({\"version\", \"full\": true, \"sections\"}); os seguintes, só as seções que mudaram ({\"version\", \"base\", \"sections\", \"removed\"}). Ao reconectar com Last-Event-ID igual ao 'base', o cliente recebe só a diferença; com o 'version' atual, nada é reenviado. A conexão é encerrada periodicamente e o EventSource reconecta sozinho.",
+            "produces": ["text/event-stream"],
+            "parameters": [
+                {"name":"Last-Event-ID","in":"header","required":False,"type":"string","description":"'version' do último evento recebido"},
+                {"name":"last_event_id","in":"query","required":False,"type":"string","description":"O mesmo que o cabeçalho Last-Event-ID"}
+            ],
+            "responses": {"200": {"description": "Fluxo de eventos 'dashboard'"}}
+        }
+    }
+
     swagger_spec = {
         "swagger": "2.0",
         "info": {
@@ -228,6 +375,8 @@ def generate_swagger_spec():
 # ==============================================================================
 class FileServerMetrics(db.Model):
     __tablename__ = 'FileServerMetrics'
+    # Nomes de saída diferentes do nome da coluna (ver to_dict)
+    output_names = {'size_of_all_files_and_folders': 'size_of_all_files_and_folders_gb'}
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Text)
     file_server = db.Column(db.Text)
@@ -293,33 +442,455 @@ class ADMetrics(db.Model):
             'no_of_disabled_users': self.no_of_disabled_users,
         }
 
+# Serialização rápida das listas: em vez de montar objetos ORM e chamar
+# to_dict() linha a linha, seleciona só as colunas mapeadas como tuplas (Core)
+# e monta os dicionários já na ordem alfabética das chaves, que é a ordem em
+# que o jsonify as escreve. O JSON sai pelo orjson, quando instalado.
+def output_columns(model):
+    """[(nome na saída, coluna)] do modelo, ordenados pelo nome de saída (mesmas chaves de to_dict)."""
+    renames = getattr(model, 'output_names', {})
+    return sorted(((renames.get(c.key, c.key), c) for c in model.__table__.columns), key=lambda nc: nc[0])
+
+def row_select(model, fields=None):
+    """(nomes de saída, select() das colunas correspondentes); `fields` restringe às colunas pedidas."""
+    columns = output_columns(model)
+    if fields:
+        unknown = sorted(set(fields) - {name for name, _ in columns})
+        if unknown:
+            abort(400, message="Campo(s) desconhecido(s): {}. Disponíveis: {}.".format(
+                ', '.join(unknown), ', '.join(name for name, _ in columns)))
+        columns = [(name, column) for name, column in columns if name in fields]
+    return [name for name, _ in columns], select(*[column for _, column in columns])
+
+def dumps_json(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return app.json.dumps(obj).encode('utf-8')
+
+def rows_payload(names, rows):
+    """Tuplas -> corpo JSON (bytes) equivalente a jsonify([m.to_dict() for m in ...])."""
+    return dumps_json([dict(zip(names, row)) for row in rows]) + b'\n'
+
+def rows_response(names, rows):
+    return Response(rows_payload(names, rows), mimetype='application/json')
+
+# Formato colunar (?format=columnar): {"columns": [...], "data": {coluna: [valores]}}.
+# Cada nome de campo aparece uma vez, não uma vez por linha; para gráficos e
+# exportações de poucas colunas e muitas linhas, o corpo e a codificação encolhem.
+# As linhas são transpostas em lotes: manter todas as tuplas vivas até o fim
+# dispara o coletor de lixo repetidas vezes (2x mais lento em 10^5 linhas).
+COLUMNAR_FORMAT = 'columnar'
+COLUMNAR_BATCH_SIZE = 500
+
+def columns_payload(names, result):
+    """Result do SQLAlchemy -> corpo JSON (bytes) no formato colunar."""
+    data = {name: [] for name in names}
+    columns = list(data.values())
+    for batch in result.partitions(COLUMNAR_BATCH_SIZE):
+        for column, values in zip(columns, zip(*batch)):
+            column.extend(values)
+    return dumps_json({'columns': names, 'data': data}) + b'\n'
+
+def columns_response(names, result):
+    return Response(columns_payload(names, result), mimetype='application/json')
+
 # ==============================================================================
 # 4. RECURSOS (Flask-RESTful)
 # ==============================================================================
+
+# Profiler opcional (profiler.py): PROFILE_TOKEN habilita ?profile=<token> em
+# qualquer rota; PROFILE_REQUESTS lista prefixos de rota sempre perfilados.
+# Registrado antes de todos os outros hooks, para cobrir a requisição inteira.
+profiler = RequestProfiler(
+    os.environ.get('PROFILE_DIR') or os.path.join(basedir, 'profiles'),
+    token=os.environ.get('PROFILE_TOKEN'),
+    prefixes=os.environ.get('PROFILE_REQUESTS', '').split(','),
+    keep=int(os.environ.get('PROFILE_KEEP') or 20),
+)
+
+def profile_token():
+    return request.headers.get('X-Profile-Token') or request.args.get('profile')
+
+@app.before_request
+def start_profile():
+    if profiler.enabled and not request.path.startswith('/profiles') and profiler.wanted(request.path, profile_token()):
+        g.profile = profiler.start()
+
+@app.after_request
+def save_profile(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        response.headers['X-Profile-Id'] = profiler.stop(profile, request.method, request.path)
+    return response
+
+@app.teardown_request
+def discard_profile(exc):
+    # Exceção não tratada: o after_request não rodou
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.discard(profile)
+
+# Instrumentação (metrics.py): latência por endpoint, consultas ao banco por
+# requisição e tempo de cada seção do dashboard, expostos em /metrics. Com
+# SERVER_TIMING=1 no ambiente, cada resposta traz o detalhamento no cabeçalho
+# Server-Timing (aba Network do navegador). Registrado antes das requisições
+# condicionais, para medir também os 304 e as respostas vindas do cache.
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def query_started(conn, cursor, statement, parameters, context, executemany):
+    context.query_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def query_finished(conn, cursor, statement, parameters, context, executemany):
+    metrics.record_query(time.perf_counter() - context.query_started)
+
+@app.before_request
+def start_timing():
+    # Regra da rota (ex: /api/v1/fileservermetrics/<int:id>), não a URL: poucos rótulos
+    metrics.start_request(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.after_request
+def record_timing(response):
+    # Roda por último entre os after_request: vê o status e os cabeçalhos finais.
+    # Respostas em streaming são medidas até o início do envio
+    timings = metrics.finish_request(request.method, response.status_code)
+    if timings is not None and app.config['SERVER_TIMING']:
+        response.headers['Server-Timing'] = timings.server_timing()
+    return response
+
+# Requisições condicionais: cada recurso declara em 'data_tables' as tabelas de
+# que depende. O ETag combina a versão dessas tabelas (nº de linhas + geração de
+# carga) com a URL (com o host, usado no cabeçalho Link) e o Accept; o
+# Last-Modified é a última carga entre elas. Um If-None-Match /
+# If-Modified-Since ainda válido recebe 304 sem consultar o banco: a versão
+# fica em memória e só é relida quando o arquivo do banco muda.
+CACHE_CONTROL = 'public, no-cache'
+data_versions = DataVersionTracker(db_path)
+
+def resource_tables():
+    view = app.view_functions.get(request.endpoint)
+    return getattr(getattr(view, 'view_class', None), 'data_tables', None)
+
+def resource_validators(tables):
+    version, loaded_at = data_versions.get()
+    key = json.dumps([request.host_url, request.path, sorted(request.args.items(multi=True)),
+                      request.headers.get('Accept', ''), [version.get(t) for t in tables]])
+    etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    stamps = [loaded_at[t] for t in tables if loaded_at.get(t)]
+    # loaded_at é gravado no horário local da máquina da ingestão
+    last_modified = datetime.fromisoformat(max(stamps)).astimezone(timezone.utc) if stamps else None
+    return etag, last_modified
+
+def representation_etag(etag, encoding):
+    # Cada codificação (gzip, br) é uma representação diferente, com ETag próprio
+    return f'{etag}-{encoding}' if encoding else etag
+
+def set_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    response.vary.add('Accept')
+    response.vary.add('Accept-Encoding')
+    return response
+
+# Respostas JSON já codificadas (e comprimidas sob demanda) ficam em memória,
+# indexadas pelo ETag: uma requisição repetida não consulta o banco, não monta
+# dicionários nem codifica JSON de novo. Respostas em streaming são comprimidas
+# bloco a bloco, mas não entram no cache.
+CACHEABLE_MIMETYPES = ('application/json',)
+UNCACHED_HEADERS = ('Content-Length', 'Content-Type', 'Content-Encoding')
+response_cache = ResponseCache()
+
+def cached_response(etag, entry, encoding):
+    data, used = response_cache.encode(etag, entry, encoding)
+    response = Response(data, mimetype=entry.mimetype, headers=entry.headers)
+    if used:
+        response.headers['Content-Encoding'] = used
+    return response
+
+@app.before_request
+def conditional_get():
+    tables = resource_tables() if request.method in ('GET', 'HEAD') else None
+    if not tables:
+        return None
+    etag, last_modified = resource_validators(tables)
+    encoding = negotiate_encoding(request.accept_encodings)
+    g.validators = (etag, last_modified, encoding)
+    # If-None-Match tem precedência; If-Modified-Since só vale sem ele
+    if request.if_none_match:
+        candidates = [representation_etag(etag, encoding), etag]
+        matched = next((tag for tag in candidates if request.if_none_match.contains(tag)), None)
+        fresh = matched is not None
+    else:
+        matched = representation_etag(etag, encoding)
+        fresh = bool(last_modified and request.if_modified_since and last_modified <= request.if_modified_since)
+    if g.get('profile') is not None:
+        # Requisição perfilada: mede a geração da resposta, não o 304/cache
+        return None
+    if fresh:
+        g.pop('validators')
+        return set_validators(Response(status=304), matched, last_modified)
+
+    entry = response_cache.get(etag)
+    if entry is not None:
+        g.cached = True
+        return cached_response(etag, entry, encoding)
+    return None
+
+@app.after_request
+def finalize_response(response):
+    # Validadores calculados antes do handler: se os dados mudarem durante a
+    # requisição, o ETag fica "mais velho" que o conteúdo, nunca o contrário
+    validators = g.pop('validators', None)
+    if not validators or response.status_code != 200:
+        return response
+    etag, last_modified, encoding = validators
+
+    if not g.pop('cached', False):
+        if response.is_streamed:
+            if encoding:
+                response.response = compress_stream(response.iter_encoded(), encoding)
+                response.headers['Content-Encoding'] = encoding
+        elif response.mimetype in CACHEABLE_MIMETYPES:
+            headers = [(k, v) for k, v in response.headers if k not in UNCACHED_HEADERS]
+            entry = CachedResponse(response.get_data(), response.mimetype, headers)
+            response_cache.put(etag, entry)
+            data, used = response_cache.encode(etag, entry, encoding)
+            response.set_data(data)
+            if used:
+                response.headers['Content-Encoding'] = used
+
+    return set_validators(response, representation_etag(etag, response.headers.get('Content-Encoding')), last_modified)
+
+# Exportação em streaming das listas: 'Accept: application/x-ndjson' (ou
+# ?format=ndjson) gera uma linha JSON por registro; '?stream=1' gera o mesmo
+# array JSON da resposta normal, mas em blocos. Em ambos os casos as linhas
+# vêm do cursor em lotes (yield_per) e são codificadas à medida que chegam,
+# então a memória por requisição não depende do tamanho da tabela.
+STREAM_BATCH_SIZE = 500
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+def stream_mode():
+    if request.args.get('format') == 'ndjson':
+        return 'ndjson'
+    if request.accept_mimetypes[NDJSON_MIMETYPE] > request.accept_mimetypes['application/json']:
+        return 'ndjson'
+    if request.args.get('stream') in ('1', 'true'):
+        return 'json'
+    return None
+
+def stream_response(names, stmt, mode):
+    def generate():
+        if mode == 'json':
+            yield b'['
+        first = True
+        batch = []
+        rows = db.session.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        for row in rows:
+            encoded = dumps_json(dict(zip(names, row)))
+            if mode == 'ndjson':
+                batch.append(encoded + b'\n')
+            else:
+                batch.append(encoded if first else b',' + encoded)
+                first = False
+            if len(batch) >= STREAM_BATCH_SIZE:
+                yield b''.join(batch)
+                batch = []
+        if batch:
+            yield b''.join(batch)
+        if mode == 'json':
+            yield b']\n'
+
+    mimetype = NDJSON_MIMETYPE if mode == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+def list_response(model, order_by):
+    """Lista completa do modelo com ?fields= (projeção no SELECT), ?format=columnar ou streaming."""
+    names, stmt = row_select(model, parse_list_arg('fields'))
+    if request.args.get('format') == COLUMNAR_FORMAT:
+        return columns_response(names, db.session.execute(stmt))
+    mode = stream_mode()
+    if mode:
+        return stream_response(names, stmt.order_by(order_by), mode)
+    return rows_response(names, db.session.execute(stmt))
+
 class FileServerMetricsList(Resource):
+    data_tables = ('FileServerMetrics',)
+
     def get(self):
-        metrics = FileServerMetrics.query.all()
-        return jsonify([m.to_dict() for m in metrics])
+        return list_response(FileServerMetrics, FileServerMetrics.id)
 
 class FileServerMetricsResource(Resource):
+    data_tables = ('FileServerMetrics',)
+
     def get(self, id):
         metric = FileServerMetrics.query.get_or_404(id)
         return metric.to_dict()
 
+# Paginação por cursor (keyset) dos alertas: ordem (alert_time, id) decrescente.
+# O cursor codifica a chave do último item da página; a próxima página é um
+# "WHERE chave < cursor" servido pelo índice, sem OFFSET.
+ALERTS_DEFAULT_PAGE_SIZE = 100
+ALERTS_MAX_PAGE_SIZE = 1000
+
+def encode_cursor(alert_time, id):
+    raw = json.dumps([alert_time, id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        alert_time, id = json.loads(raw)
+        if not isinstance(id, int) or not (alert_time is None or isinstance(alert_time, str)):
+            raise ValueError
+        return alert_time, id
+    except (ValueError, TypeError):
+        abort(400, message="Parâmetro 'cursor' inválido.")
+
+def parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        abort(400, message=f"Parâmetro '{name}' deve estar no formato YYYY-MM-DD.")
+
+def parse_int_arg(name, default, minimum=1, maximum=None):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        abort(400, message=f"Parâmetro '{name}' deve ser um inteiro.")
+    if value < minimum:
+        abort(400, message=f"Parâmetro '{name}' deve ser >= {minimum}.")
+    return min(value, maximum) if maximum else value
+
+def parse_list_arg(name):
+    # Aceita valores separados por vírgula: ?status=Open,Reopened
+    value = request.args.get(name)
+    return [v.strip() for v in value.split(',') if v.strip()] if value else []
+
+def security_alerts_filters():
+    """Filtros de /securityalerts traduzidos para cláusulas SQL."""
+    filters = []
+    severities = parse_list_arg('severity')
+    if severities:
+        filters.append(SecurityAlerts.alert_severity.in_(severities))
+    statuses = parse_list_arg('status')
+    if statuses:
+        filters.append(SecurityAlerts.status.in_(statuses))
+    # alert_time é ISO 8601 (texto), então a comparação lexicográfica é cronológica
+    date_from = parse_date_arg('date_from')
+    if date_from:
+        filters.append(SecurityAlerts.alert_time >= date_from.strftime('%Y-%m-%d'))
+    date_to = parse_date_arg('date_to')
+    if date_to:
+        filters.append(SecurityAlerts.alert_time < (date_to + timedelta(days=1)).strftime('%Y-%m-%d'))
+    return filters
+
+def keyset_after(alert_time, id):
+    # Alertas sem alert_time ficam no fim da ordem decrescente (NULL é o menor valor no SQLite)
+    if alert_time is None:
+        return and_(SecurityAlerts.alert_time.is_(None), SecurityAlerts.id < id)
+    return or_(
+        tuple_(SecurityAlerts.alert_time, SecurityAlerts.id) < (alert_time, id),
+        SecurityAlerts.alert_time.is_(None)
+    )
+
 class SecurityAlertsList(Resource):
+    data_tables = ('SecurityAlerts',)
+
+    def get(self):
+        page_size = parse_int_arg('page_size', ALERTS_DEFAULT_PAGE_SIZE, maximum=ALERTS_MAX_PAGE_SIZE)
+        names, stmt = row_select(SecurityAlerts)
+        stmt = stmt.where(*security_alerts_filters())
+
+        mode = stream_mode()
+        if mode:
+            # Exportação completa (com os mesmos filtros), sem paginação
+            return stream_response(names, stmt.order_by(SecurityAlerts.alert_time.desc(), SecurityAlerts.id.desc()), mode)
+
+        cursor = request.args.get('cursor')
+        if cursor:
+            stmt = stmt.where(keyset_after(*decode_cursor(cursor)))
+
+        stmt = stmt.order_by(SecurityAlerts.alert_time.desc(), SecurityAlerts.id.desc())
+        page = request.args.get('page')
+        if page and not cursor:
+            # 'page' mantido por compatibilidade (OFFSET); para varrer a tabela use 'cursor'
+            stmt = stmt.offset((parse_int_arg('page', 1) - 1) * page_size)
+
+        # Busca um item a mais para saber se existe próxima página
+        alerts = db.session.execute(stmt.limit(page_size + 1)).all()
+        has_next = len(alerts) > page_size
+        alerts = alerts[:page_size]
+
+        response = rows_response(names, alerts)
+        if has_next:
+            last = alerts[-1]
+            next_cursor = encode_cursor(last.alert_time, last.id)
+            args = request.args.to_dict()
+            args.pop('page', None)
+            args['cursor'] = next_cursor
+            next_url = request.base_url + '?' + urlencode(args)
+            response.headers['Link'] = f'<{next_url}>; rel="next"'
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+
+# Busca textual (alert_search.py): a página de ids mais relevantes sai do
+# índice FTS5 (rank = bm25, desempate pelo id) e só essas linhas são lidas de
+# SecurityAlerts, pela chave primária.
+search_index = table(alert_search.SEARCH_TABLE, column('rowid'), column('rank'))
+
+class SecurityAlertsSearch(Resource):
+    data_tables = ('SecurityAlerts',)
+
     def get(self):
-        alerts = SecurityAlerts.query.all()
-        return jsonify([a.to_dict() for a in alerts])
+        query = alert_search.match_query(request.args.get('q'))
+        if query is None:
+            abort(400, message="Parâmetro 'q' obrigatório: termos a buscar (usuário, ativo, modelo de ameaça, departamento...).")
+        page_size = parse_int_arg('page_size', ALERTS_DEFAULT_PAGE_SIZE, maximum=ALERTS_MAX_PAGE_SIZE)
+        page = parse_int_arg('page', 1)
+
+        index = search_index
+        # Um item a mais para saber se existe próxima página
+        hits = (select(index.c.rowid.label('id'), index.c.rank)
+                .where(text(f'"{alert_search.SEARCH_TABLE}" MATCH :q').bindparams(q=query))
+                .order_by(index.c.rank, index.c.rowid)
+                .limit(page_size + 1).offset((page - 1) * page_size)
+                .subquery())
+        names, stmt = row_select(SecurityAlerts)
+        stmt = stmt.join(hits, hits.c.id == SecurityAlerts.id).order_by(hits.c.rank, hits.c.id)
+        try:
+            alerts = db.session.execute(stmt).all()
+        except OperationalError:
+            abort(503, message="Índice de busca dos alertas indisponível: migre o banco (python db_schema.py).")
+        has_next = len(alerts) > page_size
+        alerts = alerts[:page_size]
+
+        response = rows_response(names, alerts)
+        if has_next:
+            args = request.args.to_dict()
+            args['page'] = page + 1
+            response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+        return response
 
 class ADMetricsList(Resource):
+    data_tables = ('ADMetrics',)
+
     def get(self):
-        metrics = ADMetrics.query.all()
-        return jsonify([m.to_dict() for m in metrics])
+        return list_response(ADMetrics, ADMetrics.id)
 
 # Adiciona os recursos à API
 api.add_resource(FileServerMetricsList, '/api/v1/fileservermetrics')
 api.add_resource(FileServerMetricsResource, '/api/v1/fileservermetrics/<int:id>')
 api.add_resource(SecurityAlertsList, '/api/v1/securityalerts')
+api.add_resource(SecurityAlertsSearch, '/api/v1/securityalerts/search')
 api.add_resource(ADMetricsList, '/api/v1/admetrics')
 
 # ==============================================================================
@@ -339,12 +910,85 @@ app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
 
 # Rota opcional para processar dados do dashboard
 try:
-    from dashboard_data_processor import get_dashboard_data
+    from dashboard_data_processor import (
+        KEY_SECTIONS, get_dashboard_snapshot, get_scoped_dashboard, only_sections, sections_for, select_fields
+    )
+    from dashboard_scope import DashboardScope
+    from dashboard_tasks import get_result_store, published_for
+    from dashboard_stream import DashboardFeed, version_id
+    dashboard_results = get_result_store(db_path)
+
+    def current_dashboard(version, sections=None):
+        # Resultado publicado pelo recálculo em segundo plano após a carga. Se
+        # ainda não há um para a versão atual dos dados, usa o snapshot em
+        # memória (que só recalcula as seções pedidas cujas tabelas mudaram).
+        data = published_for(dashboard_results.latest(), version)
+        if data is None:
+            return get_dashboard_snapshot(sections)
+        # O resultado publicado tem todas as seções: mesmas chaves do snapshot
+        return only_sections(data, sections)
+
+    def dashboard_scope_args():
+        date_from, date_to = parse_date_arg('date_from'), parse_date_arg('date_to')
+        if date_from and date_to and date_from > date_to:
+            abort(400, message="Parâmetro 'date_from' deve ser anterior ou igual a 'date_to'.")
+        return DashboardScope(
+            date_from.strftime('%Y-%m-%d') if date_from else None,
+            date_to.strftime('%Y-%m-%d') if date_to else None,
+            request.args.get('domain'),
+            request.args.get('file_server'),
+        )
+
+    def dashboard_response(fields):
+        # Só as seções dos campos pedidos são calculadas; a resposta traz só os campos
+        try:
+            sections = sections_for(fields)
+        except ValueError as e:
+            abort(400, message=str(e))
+        version = data_versions.get()[0]
+        scope = dashboard_scope_args()
+        if scope:
+            # Recorte: consultas filtradas no SQLite/rollups, com LRU por combinação de filtros
+            data = get_scoped_dashboard(scope, version, sections)
+        else:
+            data = current_dashboard(version, sections)
+        response = jsonify(select_fields(data, fields) if fields else data)
+        # Versão dos dados da resposta: o dashboard assina o stream a partir dela
+        # (last_event_id) e só recebe as mudanças seguintes
+        response.headers['X-Dashboard-Version'] = version_id(version)
+        return response
+
     class DashboardData(Resource):
+        data_tables = TRACKED_TABLES
+
         def get(self):
-            data = get_dashboard_data()
-            return jsonify(data)
+            # ?sections=security,governance e/ou ?fields=ad_health.latest,security.timeline
+            return dashboard_response(parse_list_arg('sections') + parse_list_arg('fields'))
+
+    class DashboardSection(Resource):
+        data_tables = TRACKED_TABLES
+
+        def get(self, section):
+            if section not in KEY_SECTIONS:
+                abort(404, message=f"Seção '{section}' não encontrada. Disponíveis: {', '.join(KEY_SECTIONS)}.")
+            # ?fields= relativos à seção: /dashboard_data/security?fields=total_alerts,timeline
+            return dashboard_response([f'{section}.{f}' for f in parse_list_arg('fields')] or [section])
     api.add_resource(DashboardData, '/api/v1/dashboard_data')
+    api.add_resource(DashboardSection, '/api/v1/dashboard_data/<string:section>')
+
+    # Atualizações ao vivo: uma agregação por mudança dos dados, compartilhada
+    # por todas as telas abertas neste processo (ver dashboard_stream.py)
+    dashboard_feed = DashboardFeed(lambda: data_versions.get()[0], current_dashboard)
+
+    @app.route('/api/v1/dashboard_data/stream')
+    def dashboard_stream():
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        response = Response(stream_with_context(dashboard_feed.stream(last_event_id)),
+                            mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        # Sem buffer no nginx: cada evento sai assim que é gerado
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
 except ImportError:
     print("⚠️ Aviso: dashboard_data_processor.py não encontrado. Rota de dashboard desativada.")
 
@@ -352,6 +996,31 @@ except ImportError:
 def dashboard():
     return render_template('dashboard.html')
 
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Perfis gravados pelo profiler: só com o PROFILE_TOKEN (sem ele, as rotas não existem)
+def require_profile_token():
+    if not profiler.authorized(profile_token() or request.args.get('token')):
+        abort(404)
+
+@app.route('/profiles')
+def list_profiles():
+    require_profile_token()
+    return jsonify(profiles=profiler.list(), keep=profiler.keep)
+
+@app.route('/profiles/<name>')
+def download_profile(name):
+    require_profile_token()
+    if name not in profiler.list():
+        abort(404)
+    if request.args.get('format') == 'speedscope':
+        response = jsonify(to_speedscope(os.path.join(profiler.directory, name)))
+        response.headers['Content-Disposition'] = f'attachment; filename="{name[:-5]}.speedscope.json"'
+        return response
+    return send_from_directory(profiler.directory, name, as_attachment=True, mimetype='application/octet-stream')
+
 # ==============================================================================
 # 6. EXECUÇÃO PRINCIPAL (AQUI ESTAVA O ERRO)
 # ==============================================================================
@@ -362,10 +1031,9 @@ if __name__ == '__main__':
     # 2. Garante pastas necessárias
     os.makedirs(os.path.join(basedir, 'templates'), exist_ok=True)
     
-    # 3. Inicializa o banco (se necessário)
-    with app.app_context():
-        # db.create_all() # Descomente se precisar criar tabelas do zero
-        pass
+    # 3. Banco já migrado para o esquema atual ao importar o app (prepare_database)
+    # with app.app_context():
+    #     db.create_all() # Descomente se precisar criar tabelas do zero
 
     print("🚀 Servidor rodando!")
     print(f"👉 Swagger UI: http://127.0.0.1:5000{SWAGGER_URL}")
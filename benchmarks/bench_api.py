@@ -0,0 +1,374 @@
+"""Benchmark da API e do processador do dashboard em bancos sintéticos de 10^3 a 10^7 linhas.
+
+Para cada tamanho, gera um banco com ADMetrics, FileServerMetrics e
+SecurityAlerts (cada tabela com o número de linhas pedido), com as mesmas
+colunas dos CSVs do repositório e valores reamostrados deles. O banco é gravado
+pelo mesmo caminho da ingestão (process_data.py), com índices, versão dos dados
+e cache colunar. Depois, num processo separado por tamanho, mede:
+
+  - get_dashboard_data() direto, nos backends 'sql' e 'pandas';
+  - cada endpoint pelo test client do Flask, 'cold' (cache de respostas e
+    snapshot do dashboard limpos antes de cada requisição) e 'warm' (repetição
+    da mesma requisição, sem If-None-Match).
+
+Latência (p50/p90/p95/p99/máx), vazão (requisições/s e MB/s) e memória de pico
+(tracemalloc, numa execução à parte; o SQLite aloca fora dele, então o RSS
+máximo de cada processo também é registrado) vão para um JSON, que pode ser
+comparado com o de outro commit:
+
+    python benchmarks/bench_api.py --sizes 1e3,1e4,1e5 --output antes.json
+    python benchmarks/bench_api.py --sizes 1e3,1e4,1e5 --output depois.json --compare antes.json
+
+Bancos de 10^6 linhas ou mais levam minutos para gerar e ocupam GBs
+(FileServerMetrics tem ~130 colunas): use --data-dir para reaproveitá-los entre
+execuções.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import alert_rules  # noqa: E402
+import columnar_cache  # noqa: E402
+from db_schema import normalize_frame  # noqa: E402
+from process_data import _load_chunks, connect_for_load, detect_encoding, file_to_table, read_export_chunks  # noqa: E402
+
+# Muda quando a geração muda: bancos antigos em --data-dir são regerados
+GENERATOR_VERSION = 3
+GENERATE_CHUNK_ROWS = 50_000
+# Máximo de datas distintas por tabela de snapshots; acima disso crescem os servidores/domínios
+MAX_SNAPSHOT_DATES = 3650
+DEFAULT_SIZES = '1e3,1e4,1e5'
+
+ENDPOINTS = (
+    '/api/v1/dashboard_data',
+    '/api/v1/fileservermetrics',
+    '/api/v1/admetrics',
+    # Consumidores de gráfico: poucas colunas, formato colunar
+    '/api/v1/fileservermetrics?format=columnar&fields=date,file_server,size_of_all_files_and_folders_gb',
+    '/api/v1/admetrics?format=columnar&fields=date,domain_name,no_of_users',
+    '/api/v1/securityalerts',
+    '/api/v1/securityalerts?page_size=1000',
+    '/api/v1/securityalerts?format=ndjson',
+)
+DASHBOARD_BACKENDS = ('sql', 'pandas')
+
+# Colunas geradas (chaves, datas e flags dos alertas); as demais são reamostradas dos CSVs
+ENTITY_COLUMNS = {'FileServerMetrics': 'file_server', 'ADMetrics': 'domain_name'}
+DERIVED_COLUMNS = ('date_iso', 'alert_epoch') + alert_rules.get_classifier().flags
+
+
+# ==============================================================================
+# GERAÇÃO DOS BANCOS SINTÉTICOS
+# ==============================================================================
+
+def load_templates():
+    """DataFrames dos CSVs do repositório, com as colunas como a ingestão as grava."""
+    templates = {}
+    for file_name, table_name in file_to_table.items():
+        path = os.path.join(ROOT, file_name)
+        chunks = read_export_chunks(path, table_name, detect_encoding(path), chunk_size=10**9)
+        df = pd.concat(list(chunks), ignore_index=True)
+        templates[table_name] = df.drop(columns=[c for c in DERIVED_COLUMNS if c in df.columns])
+    return templates
+
+
+def _resample(rng, series, n):
+    """n valores com a distribuição da coluna (inclusive a fração de vazios)."""
+    values = series.to_numpy()
+    picked = values[rng.integers(0, len(values), n)]
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        # Variação de ±10% para não repetir sempre os mesmos valores
+        picked = picked * rng.uniform(0.9, 1.1, n)
+        integral = series.dropna()
+        if integral.empty or (integral == integral.round()).all():
+            picked = np.round(picked)
+        if pd.api.types.is_integer_dtype(series):
+            picked = picked.astype('int64')
+    return pd.Series(picked, dtype=series.dtype if pd.api.types.is_numeric_dtype(series) else object)
+
+
+def _entities(names, count):
+    # Servidores/domínios reais e, se precisar de mais, cópias numeradas
+    names = list(names)
+    return [names[i % len(names)] if i < len(names) else f'{names[i % len(names)]}-{i // len(names)}'
+            for i in range(count)]
+
+
+def snapshot_chunks(rng, template, table_name, n, chunk_rows=GENERATE_CHUNK_ROWS):
+    """Linhas (data, servidor/domínio) únicas, em ordem de data, como nos exports mensais."""
+    entity_col = ENTITY_COLUMNS[table_name]
+    real = template[entity_col].dropna().unique()
+    entity_count = max(len(real), -(-n // MAX_SNAPSHOT_DATES))
+    entities = np.array(_entities(real, entity_count), dtype=object)
+    start = pd.to_datetime(template['date'], format='%d.%b.%Y', errors='coerce').min()
+    start = start.to_pydatetime() if pd.notna(start) else datetime(2024, 1, 1)
+    others = [c for c in template.columns if c not in ('date', entity_col)]
+
+    for offset in range(0, n, chunk_rows):
+        idx = np.arange(offset, min(offset + chunk_rows, n))
+        days = idx // entity_count
+        dates = {d: (start + timedelta(days=int(d))).strftime('%d.%b.%Y').lower() for d in np.unique(days)}
+        chunk = pd.DataFrame({'date': [dates[d] for d in days], entity_col: entities[idx % entity_count]})
+        for col in others:
+            chunk[col] = _resample(rng, template[col], len(idx))
+        yield normalize_frame(chunk[template.columns], table_name)
+
+
+def alert_chunks(rng, template, n, chunk_rows=GENERATE_CHUNK_ROWS):
+    """Alertas com Alert ID único e horários espalhados pelo período dos CSVs."""
+    times = pd.to_datetime(template['alert_time'], errors='coerce').dropna()
+    lo, hi = int(times.min().timestamp()), int(times.max().timestamp())
+    others = [c for c in template.columns if c not in ('alert_id', 'alert_time', 'initial_event_time')]
+
+    for offset in range(0, n, chunk_rows):
+        size = min(chunk_rows, n - offset)
+        epochs = rng.integers(lo, hi + 1, size) // 60 * 60
+        alert_time = pd.to_datetime(epochs, unit='s')
+        chunk = pd.DataFrame({
+            'alert_id': [f'{offset + i:08X}-0000-4000-8000-{v:012X}'
+                         for i, v in enumerate(rng.integers(0, 2**48, size))],
+            'alert_time': alert_time.strftime('%Y-%m-%dT%H:%M:%S'),
+            # Evento inicial alguns minutos antes do alerta, como nos exports
+            'initial_event_time': (alert_time - pd.to_timedelta(rng.integers(0, 30, size), unit='m'))
+            .strftime('%Y-%m-%dT%H:%M:%S'),
+        })
+        for col in others:
+            chunk[col] = _resample(rng, template[col], size)
+        yield normalize_frame(chunk[template.columns], 'SecurityAlerts')
+
+
+def build_database(db_path, size, seed, templates):
+    rng = np.random.default_rng(seed)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = connect_for_load(db_path)
+    try:
+        for table_name, template in sorted(templates.items()):
+            if table_name == 'SecurityAlerts':
+                chunks = alert_chunks(rng, template, size)
+            else:
+                chunks = snapshot_chunks(rng, template, table_name, size)
+            _load_chunks(conn, chunks, f'synthetic-{size}', table_name, incremental=False)
+            if columnar_cache.available():
+                columnar_cache.write_table(conn, db_path, table_name)
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+
+
+def prepare_database(data_dir, size, seed, templates):
+    """Caminho do banco sintético de `size` linhas, reaproveitado se já foi gerado igual."""
+    directory = os.path.join(data_dir, f'rows_{size}')
+    db_path = os.path.join(directory, 'antt_data.db')
+    meta_path = os.path.join(directory, 'bench_meta.json')
+    meta = {'size': size, 'seed': seed, 'generator_version': GENERATOR_VERSION}
+    try:
+        with open(meta_path) as f:
+            if json.load(f) == meta and os.path.exists(db_path):
+                return db_path, 0.0
+    except (OSError, ValueError):
+        pass
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+    started = time.perf_counter()
+    build_database(db_path, size, seed, templates)
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return db_path, time.perf_counter() - started
+
+
+# ==============================================================================
+# MEDIÇÃO (processo filho, com ANTT_DB_PATH apontando para o banco sintético)
+# ==============================================================================
+
+def summarize(name, mode, timings, nbytes, peak_bytes):
+    ms = np.array(timings) * 1000
+    total = float(np.sum(timings)) or 1e-9
+    return {
+        'target': name,
+        'mode': mode,
+        'iterations': len(timings),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p90_ms': round(float(np.percentile(ms, 90)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'max_ms': round(float(ms.max()), 3),
+        'throughput_rps': round(len(timings) / total, 2),
+        'throughput_mb_s': round(nbytes * len(timings) / total / 2**20, 2),
+        'response_bytes': nbytes,
+        'peak_mem_mib': round(peak_bytes / 2**20, 2),
+    }
+
+
+def measure(func, setup, repeat, budget):
+    """Executa func() até `repeat` vezes ou `budget` segundos (mínimo 3) e mede uma vez com tracemalloc."""
+    setup()
+    nbytes = func()  # aquecimento (imports, conexões, planos de consulta)
+    timings = []
+    deadline = time.perf_counter() + budget
+    while len(timings) < repeat and (len(timings) < 3 or time.perf_counter() < deadline):
+        setup()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    setup()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return timings, nbytes, peak
+
+
+def run_worker(repeat, budget, endpoints, backends):
+    import app as api
+    import dashboard_data_processor as processor
+
+    results = []
+
+    def reset_caches():
+        api.response_cache.clear()
+        processor.dashboard_snapshot.invalidate()
+
+    for backend in backends:
+        def direct(backend=backend):
+            return len(json.dumps(processor.get_dashboard_data(backend)))
+        timings, nbytes, peak = measure(direct, lambda: None, repeat, budget)
+        results.append(summarize(f'get_dashboard_data[{backend}]', 'direct', timings, nbytes, peak))
+
+    client = api.app.test_client()
+    for url in endpoints:
+        def request(url=url):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url}: HTTP {response.status_code}')
+            return len(response.get_data())
+        for mode, setup in (('cold', reset_caches), ('warm', lambda: None)):
+            timings, nbytes, peak = measure(request, setup, repeat, budget)
+            results.append(summarize(url, mode, timings, nbytes, peak))
+
+    return {'results': results, 'max_rss_mib': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+def run_size(db_path, args):
+    env = dict(os.environ, ANTT_DB_PATH=db_path)
+    # Sem broker/result store de verdade: o benchmark mede a API servindo do próprio banco
+    env.pop('DASHBOARD_RESULT_STORE', None)
+    cmd = [sys.executable, '-W', 'ignore', os.path.abspath(__file__), '--worker',
+           '--repeat', str(args.repeat), '--budget', str(args.budget),
+           '--endpoints', ','.join(args.endpoints), '--backends', ','.join(args.backends)]
+    out = subprocess.run(cmd, env=env, cwd=ROOT, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+# ==============================================================================
+# RELATÓRIO
+# ==============================================================================
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, check=True, text=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report, baseline=None):
+    previous = {}
+    if baseline:
+        for run in baseline['runs']:
+            for r in run['results']:
+                previous[(run['size'], r['target'], r['mode'])] = r['p50_ms']
+    header = f"{'linhas':>9}  {'alvo':<42}{'modo':<7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'pico MiB':>10}"
+    if previous:
+        header += f"{'vs. base':>10}"
+    print(header)
+    for run in report['runs']:
+        for r in run['results']:
+            line = (f"{run['size']:>9}  {r['target']:<42}{r['mode']:<7}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+                    f"{r['p99_ms']:>10.2f}{r['throughput_rps']:>10.1f}{r['peak_mem_mib']:>10.1f}")
+            before = previous.get((run['size'], r['target'], r['mode']))
+            if before:
+                line += f"{r['p50_ms'] / before:>9.2f}x"
+            print(line)
+        print(f"{run['size']:>9}  RSS máximo do processo: {run['max_rss_mib']} MiB")
+
+
+def parse_sizes(text):
+    return [int(float(s)) for s in text.split(',') if s.strip()]
+
+
+def main(args):
+    sizes = parse_sizes(args.sizes)
+    templates = load_templates()
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='antt_bench_')
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': {'repeat': args.repeat, 'budget_s': args.budget, 'seed': args.seed,
+                     'columnar_cache': columnar_cache.available()},
+        'runs': [],
+    }
+    try:
+        for size in sizes:
+            print(f"Gerando banco sintético com {size} linhas por tabela...", file=sys.stderr)
+            db_path, build_seconds = prepare_database(data_dir, size, args.seed, templates)
+            print(f"Medindo {size} linhas ({db_path})...", file=sys.stderr)
+            run = run_size(db_path, args)
+            run.update(size=size, build_seconds=round(build_seconds, 2),
+                       db_mib=round(os.path.getsize(db_path) / 2**20, 1))
+            report['runs'].append(run)
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"Resultados gravados em {args.output}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help=f"Linhas por tabela, separadas por vírgula (padrão: {DEFAULT_SIZES}; até 1e7)")
+    parser.add_argument('--repeat', type=int, default=30, help="Máximo de execuções medidas por caso")
+    parser.add_argument('--budget', type=float, default=10.0,
+                        help="Segundos por caso; para antes de --repeat (mínimo de 3 execuções)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', help="Diretório para guardar/reaproveitar os bancos gerados (padrão: temporário)")
+    parser.add_argument('--output', default='bench_results.json', help="Arquivo JSON de resultados")
+    parser.add_argument('--compare', help="JSON de uma execução anterior: mostra a razão do p50 em relação a ela")
+    parser.add_argument('--endpoints', type=lambda s: s.split(','), default=list(ENDPOINTS))
+    parser.add_argument('--backends', type=lambda s: s.split(','), default=list(DASHBOARD_BACKENDS))
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(run_worker(args.repeat, args.budget, args.endpoints, args.backends)))
+    else:
+        main(args)
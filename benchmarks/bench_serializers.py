@@ -0,0 +1,115 @@
+"""Micro-benchmark da serialização das listas da API, por 10 mil linhas.
+
+Compara o caminho antigo (objetos ORM + to_dict() + encoder JSON do Flask) com
+o caminho rápido usado pelos recursos (tuplas via Core select + orjson), num
+banco SQLite temporário com dados sintéticos.
+
+    python benchmarks/bench_serializers.py [--rows 10000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import ADMetrics, FileServerMetrics, SecurityAlerts, app, db, orjson, row_select, rows_payload  # noqa: E402
+
+THREATS = [
+    'Activity performed by Admin user from a non-corporate IP address',
+    'Abnormal service behavior: access to an atypical number of idle mailboxes',
+    'Deletion: multiple files deleted by a user',
+    'Suspicious access to sensitive data',
+]
+ASSETS = ['Exchange Online2', 'SharePoint Online', 'OneDrive', 'srvm812', 'srvm931']
+
+
+def synthetic_rows(model, n):
+    rnd = random.Random(42)
+    start = datetime(2025, 1, 1)
+    for i in range(1, n + 1):
+        if model is SecurityAlerts:
+            yield {
+                'id': i,
+                'threat_model_name': rnd.choice(THREATS),
+                'alert_time': (start + timedelta(minutes=7 * i)).isoformat(timespec='seconds'),
+                'file_server_domain': rnd.choice(ASSETS),
+                'user_name': f'Usuário {rnd.randint(1, 500)} (antt.gov.br)',
+                'alert_severity': rnd.choice(['Low', 'Medium', 'High']),
+                'alert_category': rnd.choice(['Exploitation', 'Reconnaissance', 'Impact']),
+                'status': rnd.choice(['Open', 'Closed', 'Under investigation']),
+            }
+        elif model is FileServerMetrics:
+            yield {
+                'id': i,
+                'date': (start + timedelta(days=i // 40)).strftime('%d.%b.%Y'),
+                'file_server': f'SRVM{i % 40:03d}',
+                'no_of_folders': rnd.randint(1_000, 1_000_000),
+                'no_of_files': rnd.randint(10_000, 10_000_000),
+                'no_of_permission_entries': rnd.randint(1_000, 3_000_000),
+                'size_of_all_files_and_folders': round(rnd.uniform(1, 20_000), 2),
+            }
+        else:
+            yield {
+                'id': i,
+                'date': (start + timedelta(days=i // 6)).strftime('%d.%b.%Y'),
+                'domain_name': f'dominio{i % 6}.antt.gov.br',
+                'no_of_groups': rnd.randint(100, 5_000),
+                'no_of_users': rnd.randint(1_000, 20_000),
+                'no_of_computer_accounts': rnd.randint(100, 10_000),
+                'no_of_admin_accounts': rnd.randint(5, 200),
+                'no_of_disabled_users': rnd.randint(10, 5_000),
+            }
+
+
+def orm_path(engine, model):
+    with Session(engine) as session:
+        return app.json.dumps([m.to_dict() for m in session.scalars(select(model))]).encode('utf-8')
+
+
+def tuple_path(engine, model):
+    names, stmt = row_select(model)
+    with Session(engine) as session:
+        return rows_payload(names, session.execute(stmt))
+
+
+def best_of(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(rows, repeat):
+    models = (FileServerMetrics, SecurityAlerts, ADMetrics)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine('sqlite:///' + os.path.join(tmp, 'bench.db'))
+        db.metadata.create_all(engine, tables=[m.__table__ for m in models])
+        with engine.begin() as conn:
+            for model in models:
+                conn.execute(insert(model), list(synthetic_rows(model, rows)))
+
+        print(f"Linhas por tabela: {rows} | melhor de {repeat} | encoder: {'orjson' if orjson else 'json (Flask)'}")
+        print(f"{'recurso':<20}{'ORM+to_dict (ms/10k)':>24}{'tuplas (ms/10k)':>18}{'ganho':>8}")
+        scale = 10_000 / rows * 1000
+        for model in models:
+            old = best_of(lambda: orm_path(engine, model), repeat)
+            new = best_of(lambda: tuple_path(engine, model), repeat)
+            print(f"{model.__tablename__:<20}{old * scale:>24.1f}{new * scale:>18.1f}{old / new:>7.1f}x")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    main(args.rows, args.repeat)
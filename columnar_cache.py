@@ -0,0 +1,96 @@
+import json
+import os
+
+from data_version import read_data_version
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # dependência opcional: sem pyarrow, as leituras usam o SQLite
+    pa = None
+
+# ==============================================================================
+# CACHE COLUNAR (Arrow IPC) DAS TABELAS CARREGADAS
+# ------------------------------------------------------------------------------
+# Após cada carga, process_data.py grava uma cópia colunar da tabela em
+# <diretório do banco>/columnar/<Tabela>.arrow (Arrow IPC sem compressão, lido
+# via memory-map, sem cópia). Leituras analíticas (backend 'pandas' do
+# dashboard) carregam só as colunas de que precisam. O arquivo guarda a versão
+# dos dados (nº de linhas, geração) da tabela: se não bater com o banco, ou se
+# o pyarrow não estiver instalado, quem lê volta para o SQLite.
+# ==============================================================================
+
+CACHE_DIR_NAME = 'columnar'
+BATCH_ROWS = 64 * 1024
+_VERSION_KEY = b'antt_data_version'
+
+
+def available():
+    return pa is not None
+
+
+def cache_path(db_path, table_name):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), CACHE_DIR_NAME, f'{table_name}.arrow')
+
+
+def _arrow_type(declared):
+    # Afinidade de tipo do SQLite -> tipo Arrow (mesmos dtypes que o pandas obtém via read_sql)
+    declared = (declared or '').upper()
+    if 'INT' in declared:
+        return pa.int64()
+    if any(t in declared for t in ('REAL', 'FLOA', 'DOUB')):
+        return pa.float64()
+    return pa.string()
+
+
+def write_table(conn, db_path, table_name, batch_rows=BATCH_ROWS):
+    """Regrava o cache colunar da tabela a partir do SQLite. Retorna False se não foi possível."""
+    if pa is None:
+        return False
+    info = conn.execute(f'PRAGMA table_info("{table_name}")').fetchall()
+    if not info:
+        return False
+    version = read_data_version(conn, (table_name,))[table_name]
+    schema = pa.schema([(c[1], _arrow_type(c[2])) for c in info],
+                       metadata={_VERSION_KEY: json.dumps(version).encode()})
+
+    path = cache_path(db_path, table_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp'
+    try:
+        cursor = conn.execute(f'SELECT * FROM "{table_name}" ORDER BY rowid')
+        with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+            while True:
+                rows = cursor.fetchmany(batch_rows)
+                if not rows:
+                    break
+                columns = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+                writer.write_batch(pa.record_batch(columns, schema=schema))
+        # Troca atômica: leitores nunca veem um arquivo pela metade
+        os.replace(tmp, path)
+        return True
+    except (pa.ArrowException, TypeError, ValueError, OverflowError):
+        # Coluna com valores de tipos mistos (ex: texto numa coluna INTEGER): sem cache
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        if os.path.exists(path):
+            os.remove(path)
+        return False
+
+
+def read_table(conn, db_path, table_name, columns=None):
+    """DataFrame da tabela lido do cache (só `columns`, se informado) ou None se indisponível/desatualizado."""
+    path = cache_path(db_path, table_name)
+    if pa is None or not os.path.exists(path):
+        return None
+    try:
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    except (OSError, pa.ArrowException):
+        return None
+    metadata = table.schema.metadata or {}
+    current = read_data_version(conn, (table_name,))[table_name]
+    if json.loads(metadata.get(_VERSION_KEY, b'null')) != list(current):
+        return None
+    if columns is not None:
+        table = table.select([c for c in table.column_names if c in columns])
+    return table.to_pandas()
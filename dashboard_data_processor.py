@@ -1,77 +1,265 @@
-import sqlite3
+import threading
+from collections import OrderedDict
 import pandas as pd
 import os
 
-BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DB_PATH = os.path.join(BASE_DIR, 'antt_data.db')
+import alert_rules
+import columnar_cache
+import dashboard_sql
+import db_connections
+import metrics
+import rollups
+from data_version import read_data_version
+from db_schema import normalize_date
 
-def get_dashboard_data():
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+# ANTT_DB_PATH aponta a API e o dashboard para outro banco (ex: benchmarks)
+DB_PATH = os.environ.get('ANTT_DB_PATH') or os.path.join(BASE_DIR, 'antt_data.db')
+
+# Backend de agregação: 'sql' (padrão) faz agrupamentos e contagens no SQLite
+# (dashboard_sql.py); 'pandas' carrega as tabelas em DataFrames (referência),
+# lendo do cache colunar (columnar_cache.py) quando ele estiver atualizado.
+DASHBOARD_BACKEND = os.environ.get('DASHBOARD_BACKEND', 'sql')
+
+# Nº de recortes (dashboard_scope.py) calculados mantidos em memória
+SCOPE_CACHE_SIZE = int(os.environ.get('DASHBOARD_SCOPE_CACHE_SIZE') or 64)
+
+# Tabelas de origem de cada seção do dashboard. Uma seção só é recalculada
+# pelo snapshot quando a versão de alguma das suas tabelas muda.
+SECTION_SOURCES = {
+    'ad_health': ('ADMetrics',),
+    'security': ('SecurityAlerts',),
+    'governance': ('FileServerMetrics', 'ADMetrics', 'SecurityAlerts'),
+}
+
+# Chaves da resposta produzidas por cada seção
+SECTION_KEYS = {
+    'ad_health': ('ad_health',),
+    'security': ('security',),
+    'governance': ('governance', 'data_exposure', 'ad_vulnerability_map', 'varonis', 'vulnerabilities'),
+}
+
+# Colunas que as seções do backend 'pandas' usam de cada tabela: só elas são
+# lidas (do cache colunar, quando disponível, ou do SQLite)
+FRAME_COLUMNS = {
+    'ADMetrics': (
+        'date', 'date_iso', 'domain_name', 'no_of_users', 'no_of_disabled_users', 'no_of_admin_accounts',
+        'no_of_disable_admin_accounts', 'no_of_service_accounts', 'no_of_enabled_but_stale_users',
+        'no_of_executive_accounts', 'no_of_domains_with_a_delinquent_kerberos_account_password',
+    ),
+    'SecurityAlerts': (
+        'status', 'alert_severity', 'alert_time', 'user_name', 'threat_model_name',
+        # classificação feita na ingestão (alert_rules.py)
+        'flag_deletion', 'flag_admin_tool', 'flag_ransomware', 'flag_kerberos', 'flag_itsm_ticket',
+        'flag_antt_access', 'flag_step_meeting',
+    ),
+    'FileServerMetrics': (
+        'date', 'date_iso', 'file_server', 'file_server_domain', 'size_of_all_files_and_folders',
+        'size_of_folders_with_stale_data', 'no_of_folders_with_unresolved_sids', 'no_of_permission_entries',
+        'no_of_events', 'no_of_events_on_sensitive_files', 'no_of_files_with_hits_selected_rule',
+    ),
+}
+
+# Chave da resposta -> seção que a produz. As chaves também são os nomes aceitos
+# em ?sections= / ?fields= e em /api/v1/dashboard_data/<chave>.
+KEY_SECTIONS = {key: name for name, keys in SECTION_KEYS.items() for key in keys}
+
+# Indicadores extras que a seção de governança grava dentro de 'security'
+# (numa resposta parcial, só aparecem se a governança também foi calculada)
+GOVERNANCE_SECURITY_KEYS = ('krbtgt_reset_recommended', 'itsm_integration', 'access_antt', 'antt_step_meetings')
+
+
+def _empty_response():
     # Estrutura padrão para evitar erros no front-end
-    response = {
+    return {
         "ad_health": {
-            "evolution": {"dates":[], "users":[], "disabled":[]}, 
+            "evolution": {"dates":[], "users":[], "disabled":[]},
             "latest": {"users_total":0, "users_disabled":0, "admins_active":0, "disabled_pct":0, "service_accounts":0}
         },
         "security": {
-            "total_alerts":0, "critical_open":0, 
-            "timeline":{"labels":[], "data":[]}, 
+            "total_alerts":0, "critical_open":0,
+            "timeline":{"labels":[], "data":[]},
             "top_users":{}, "top_threats":{}, "severity_dist":{}
         },
         "ad_vulnerability_map": [],
         "data_exposure": {"exposure_score":0, "servers":[]},
         "governance": {
-            "storage": {"stale_percent":0, "active_tb":0, "stale_tb":0}, 
+            "storage": {"stale_percent":0, "active_tb":0, "stale_tb":0},
             "risks": {"unresolved_sids":0}
         }
     }
 
-    if not os.path.exists(DB_PATH):
+
+def sections_for(fields):
+    """Seções a calcular para os campos pedidos ('chave' ou 'chave.sub.campo'); None = todas.
+
+    ValueError para uma chave que não existe na resposta.
+    """
+    if not fields:
+        return None
+    keys = {field.split('.')[0] for field in fields}
+    unknown = sorted(keys - KEY_SECTIONS.keys())
+    if unknown:
+        raise ValueError("Campo(s) desconhecido(s): {}. Disponíveis: {}.".format(
+            ', '.join(unknown), ', '.join(KEY_SECTIONS)))
+    wanted = {KEY_SECTIONS[k] for k in keys}
+    return [name for name in SECTION_BUILDERS if name in wanted]
+
+
+def select_fields(response, fields):
+    """Só os campos pedidos da resposta, em caminhos com '.' (campos ausentes ficam de fora).
+
+    Não altera `response`: os dicionários do snapshot são compartilhados.
+    """
+    selected = {}
+    # Campos mais curtos primeiro: 'security' inteiro já cobre 'security.timeline'
+    for path in sorted((field.split('.') for field in fields), key=len):
+        source, target = response, selected
+        for depth, part in enumerate(path):
+            if not isinstance(source, dict) or part not in source or target.get(part) is source[part]:
+                break
+            if depth == len(path) - 1:
+                target[part] = source[part]
+            elif not _has_path(source[part], path[depth + 1:]):
+                break
+            else:
+                source, target = source[part], target.setdefault(part, {})
+    return selected
+
+
+def _has_path(value, path):
+    for part in path:
+        if not isinstance(value, dict) or part not in value:
+            return False
+        value = value[part]
+    return True
+
+
+def only_sections(response, sections):
+    """Só as chaves produzidas pelas seções pedidas (todas, se None).
+
+    Sem a governança, 'security' fica sem os indicadores que ela calcula
+    (GOVERNANCE_SECURITY_KEYS), como numa resposta calculada só com as seções
+    pedidas. Não altera `response`.
+    """
+    if sections is None:
         return response
+    selected = {k: v for k, v in response.items() if KEY_SECTIONS[k] in sections}
+    if 'governance' not in sections and isinstance(selected.get('security'), dict):
+        selected['security'] = {k: v for k, v in selected['security'].items() if k not in GOVERNANCE_SECURITY_KEYS}
+    return selected
+
+
+class _FrameLoader:
+    """Lê cada tabela no máximo uma vez por cálculo, compartilhando os DataFrames entre seções.
+
+    Uma tabela que não pôde ser lida vira ``None``. Com um recorte
+    (dashboard_scope.py), cada tabela traz só as linhas dele.
+    """
+
+    def __init__(self, conn, scope=None):
+        self.conn = conn
+        self.scope = scope
+        self.db_path = conn.execute('PRAGMA database_list').fetchone()[2]
+        self._frames = {}
+
+    def _get(self, name, loader):
+        if name not in self._frames:
+            try:
+                self._frames[name] = loader()
+            except Exception:
+                self._frames[name] = None
+        return self._frames[name]
+
+    def ad(self):
+        return self._get('ad', self._load_ad)
+
+    def latest_per_domain(self):
+        def load():
+            df_ad = self.ad()
+            # Para métricas agregadas mostramos o snapshot mais recente por domínio,
+            # depois somamos esses últimos snapshots para evitar misturar domínios.
+            return df_ad.groupby('domain_name', as_index=False).last() if not df_ad.empty else None
+        return self._get('latest_per_domain', load)
+
+    def sec(self):
+        return self._get('sec', lambda: self._read('SecurityAlerts').fillna(0))
+
+    def fs(self):
+        return self._get('fs', lambda: self._read('FileServerMetrics').fillna(0))
+
+    def _read(self, table_name):
+        # Só as colunas usadas pelas seções; se nenhuma existir, a tabela inteira
+        existing = [r[1] for r in self.conn.execute(f'PRAGMA table_info("{table_name}")')]
+        columns = [c for c in existing if c in FRAME_COLUMNS[table_name]]
+        if not self.scope:
+            return self._read_columns(table_name, columns)
+        # Colunas dos filtros entram só para a máscara do recorte
+        extra = [c for c in self.scope.frame_columns(table_name, existing) if c not in columns] if columns else []
+        df = self._read_columns(table_name, columns + extra if columns else None)
+        df = df[self.scope.frame_mask(table_name, df)]
+        return df.drop(columns=extra).reset_index(drop=True)
+
+    def _read_columns(self, table_name, columns):
+        df = columnar_cache.read_table(self.conn, self.db_path, table_name, columns or None)
+        if df is not None:
+            return df
+        select = ', '.join(f'"{c}"' for c in columns) if columns else '*'
+        return pd.read_sql_query(f'SELECT {select} FROM "{table_name}" ORDER BY rowid', self.conn)
+
+    def _load_ad(self):
+        df_ad = self._read('ADMetrics')
+        if df_ad is None or df_ad.empty:
+            return pd.DataFrame()
+        df_ad = df_ad.fillna(0)
+        # Parse de datas robusto e ordenação
+        try:
+            df_ad['date_obj'] = pd.to_datetime(df_ad['date'], dayfirst=True, errors='coerce', infer_datetime_format=True)
+        except:
+            df_ad['date_obj'] = pd.to_datetime(df_ad['date'], errors='coerce')
+        return df_ad.sort_values('date_obj')
+
+
+# ==============================================================================
+# SEÇÕES DO DASHBOARD
+# Cada seção preenche a sua parte de `response` e nunca propaga exceções: uma
+# seção com erro mantém os valores padrão (ou o que já tiver calculado).
+# ==============================================================================
 
+def _section_ad_health(response, frames):
+    # --- 1. AD METRICS (agregação correta) ---
     try:
-        conn = sqlite3.connect(DB_PATH)
-        
-        # --- 1. AD METRICS (agregação correta) ---
-        try:
-            df_ad = pd.read_sql_query("SELECT * FROM ADMetrics", conn)
-            if df_ad is None or df_ad.empty:
-                df_ad = pd.DataFrame()
+        df_ad = frames.ad()
+        if not df_ad.empty:
+            latest_per_domain = frames.latest_per_domain()
+
+            def safe_sum(col):
+                return int(latest_per_domain[col].fillna(0).astype(float).sum()) if col in latest_per_domain.columns else 0
+
+            total_users = safe_sum('no_of_users')
+            disabled = safe_sum('no_of_disabled_users')
+            admins_total = safe_sum('no_of_admin_accounts')
+            # tenta aplicar redução por administradores desativados se coluna existir
+            disabled_admins = safe_sum('no_of_disable_admin_accounts') if 'no_of_disable_admin_accounts' in latest_per_domain.columns else 0
+            admins_active = max(0, admins_total - disabled_admins)
+            service_accounts = safe_sum('no_of_service_accounts') if 'no_of_service_accounts' in latest_per_domain.columns else 0
+
+            response['ad_health']['latest'] = {
+                "users_total": total_users,
+                "users_disabled": disabled,
+                "admins_active": admins_active,
+                "disabled_pct": round((disabled/total_users*100), 1) if total_users > 0 else 0,
+                "service_accounts": service_accounts
+            }
+
+            # Evolução: somas por data já feitas pela ingestão (rollup diário) ou,
+            # sem ele, somamos por data (across domains) usando a coluna 'date_obj'
+            evolution = rollups.ad_evolution(frames.conn, frames.scope)
+            if evolution is not None:
+                dates = [d for d, _, _ in evolution]
+                users = [int(u) for _, u, _ in evolution]
+                disabled_series = [int(x) for _, _, x in evolution]
             else:
-                df_ad = df_ad.fillna(0)
-
-            if not df_ad.empty:
-                # Parse de datas robusto e ordenação
-                try:
-                    df_ad['date_obj'] = pd.to_datetime(df_ad['date'], dayfirst=True, errors='coerce', infer_datetime_format=True)
-                except:
-                    df_ad['date_obj'] = pd.to_datetime(df_ad['date'], errors='coerce')
-
-                df_ad = df_ad.sort_values('date_obj')
-
-                # Para métricas agregadas mostramos o snapshot mais recente por domínio,
-                # depois somamos esses últimos snapshots para evitar misturar domínios.
-                latest_per_domain = df_ad.groupby('domain_name', as_index=False).last()
-
-                def safe_sum(col):
-                    return int(latest_per_domain[col].fillna(0).astype(float).sum()) if col in latest_per_domain.columns else 0
-
-                total_users = safe_sum('no_of_users')
-                disabled = safe_sum('no_of_disabled_users')
-                admins_total = safe_sum('no_of_admin_accounts')
-                # tenta aplicar redução por administradores desativados se coluna existir
-                disabled_admins = safe_sum('no_of_disable_admin_accounts') if 'no_of_disable_admin_accounts' in latest_per_domain.columns else 0
-                admins_active = max(0, admins_total - disabled_admins)
-                service_accounts = safe_sum('no_of_service_accounts') if 'no_of_service_accounts' in latest_per_domain.columns else 0
-
-                response['ad_health']['latest'] = {
-                    "users_total": total_users,
-                    "users_disabled": disabled,
-                    "admins_active": admins_active,
-                    "disabled_pct": round((disabled/total_users*100), 1) if total_users > 0 else 0,
-                    "service_accounts": service_accounts
-                }
-
-                # Evolução: somamos por data (across domains) usando a coluna 'date_obj'
                 try:
                     df_evo = df_ad.dropna(subset=['date_obj']).groupby('date_obj')[['no_of_users', 'no_of_disabled_users']].sum().reset_index()
                     df_evo = df_evo.sort_values('date_obj')
@@ -83,221 +271,471 @@ def get_dashboard_data():
                     users = df_ad['no_of_users'].astype(int).tolist() if 'no_of_users' in df_ad.columns else []
                     disabled_series = df_ad['no_of_disabled_users'].astype(int).tolist() if 'no_of_disabled_users' in df_ad.columns else []
 
-                response['ad_health']['evolution'] = {
-                    "dates": dates,
-                    "users": users,
-                    "disabled": disabled_series
-                }
-        except Exception:
-            pass
-
-        # --- 2. SECURITY ALERTS ---
-        try:
-            df_sec = pd.read_sql_query("SELECT * FROM SecurityAlerts", conn)
-            df_sec = df_sec.fillna(0)
-
-            if not df_sec.empty:
-                # Consideramos "ativos" os alertas cujo status não esteja em estados finais
-                status_series = df_sec['status'].astype(str).str.lower()
-                closed_states = ['closed', 'resolved', 'dismissed', 'mitigated', 'false positive']
-                active_mask = ~status_series.isin(closed_states)
-                df_active = df_sec[active_mask]
+            response['ad_health']['evolution'] = {
+                "dates": dates,
+                "users": users,
+                "disabled": disabled_series
+            }
+    except Exception:
+        metrics.section_failed('ad_health', 'pandas')
 
-                response['security']['total_alerts'] = int(len(df_active))
-                # contar críticos abertos a partir do conjunto ativo
-                response['security']['critical_open'] = int(len(df_active[df_active['alert_severity'].astype(str).str.lower() == 'high']))
 
-                # Timeline baseada em alertas ativos
-                try:
-                    df_active['dt'] = pd.to_datetime(df_active['alert_time'], errors='coerce').dt.strftime('%Y-%m-%d')
+def _section_security(response, frames):
+    # --- 2. SECURITY ALERTS ---
+    try:
+        df_sec = frames.sec()
+
+        if not df_sec.empty:
+            # Consideramos "ativos" os alertas cujo status não esteja em estados finais
+            status_series = df_sec['status'].astype(str).str.lower()
+            closed_states = ['closed', 'resolved', 'dismissed', 'mitigated', 'false positive']
+            active_mask = ~status_series.isin(closed_states)
+            df_active = df_sec[active_mask].copy()
+
+            response['security']['total_alerts'] = int(len(df_active))
+            # contar críticos abertos a partir do conjunto ativo
+            response['security']['critical_open'] = int(len(df_active[df_active['alert_severity'].astype(str).str.lower() == 'high']))
+
+            # Timeline baseada em alertas ativos (contagens diárias do rollup, se atualizado)
+            try:
+                daily = rollups.alert_timeline(frames.conn, dashboard_sql.ACTIVE_ALERT, frames.scope)
+                if daily is not None:
+                    response['security']['timeline'] = {"labels": [d for d, _ in daily], "data": [n for _, n in daily]}
+                else:
+                    # alert_time ausente vira 0 no fillna(0): fica fora da timeline (e não em 1970-01-01
+                    # quando nenhum alerta do recorte tem data), como no rollup e no backend SQL
+                    alert_time = df_active['alert_time'].where(df_active['alert_time'].astype(str) != '0')
+                    df_active['dt'] = pd.to_datetime(alert_time, errors='coerce').dt.strftime('%Y-%m-%d')
                     daily = df_active['dt'].value_counts().sort_index()
                     response['security']['timeline'] = {"labels": daily.index.tolist(), "data": daily.values.tolist()}
-                except Exception:
-                    response['security']['timeline'] = {"labels": [], "data": []}
+            except Exception:
+                response['security']['timeline'] = {"labels": [], "data": []}
+
+            # Top usuários e ameaças em alertas ativos
+            response['security']['top_users'] = df_active['user_name'].value_counts().head(5).to_dict() if 'user_name' in df_active.columns else {}
+            response['security']['top_threats'] = df_active['threat_model_name'].value_counts().head(5).to_dict() if 'threat_model_name' in df_active.columns else {}
+            response['security']['severity_dist'] = df_active['alert_severity'].value_counts().to_dict() if 'alert_severity' in df_active.columns else {}
+
+            # Exclusões, ferramentas administrativas e ransomware entre os alertas ativos:
+            # flags gravadas pela ingestão (alert_rules.py)
+            for key, flag in alert_rules.SECURITY_COUNTS.items():
+                if flag in df_active.columns:
+                    response['security'][key] = _flag_count(df_active, flag)
+    except Exception:
+        metrics.section_failed('security', 'pandas')
 
-                # Top usuários e ameaças em alertas ativos
-                response['security']['top_users'] = df_active['user_name'].value_counts().head(5).to_dict() if 'user_name' in df_active.columns else {}
-                response['security']['top_threats'] = df_active['threat_model_name'].value_counts().head(5).to_dict() if 'threat_model_name' in df_active.columns else {}
-                response['security']['severity_dist'] = df_active['alert_severity'].value_counts().to_dict() if 'alert_severity' in df_active.columns else {}
 
-                # Contagens adicionais úteis para o dashboard (aplicadas a alertas ativos)
-                try:
-                    cat = df_active['alert_category'].astype(str).str.lower()
-                except:
-                    cat = pd.Series(['']*len(df_active))
-
-                txt = (df_active.get('threat_model_name') or pd.Series(['']*len(df_active))).astype(str).str.lower()
-
-                deletions = df_active[cat.str.contains('delet') | cat.str.contains('desativ') | txt.str.contains('delet') | txt.str.contains('deactiv')]
-                response['security']['admin_deletions'] = int(len(deletions))
-
-                # Acesso a ferramentas administrativas (heurística)
-                admin_tool_keywords = ['psexec', 'wmic', 'dcom', 'schtask', 'system administration tools', 'remote desktop', 'winrm']
-                admin_tools_mask = cat.str.contains('admin') | txt.str.contains('admin')
-                for k in admin_tool_keywords:
-                    admin_tools_mask = admin_tools_mask | txt.str.contains(k, case=False, na=False)
-                admin_tools = df_active[admin_tools_mask]
-                response['security']['admin_tool_access'] = int(len(admin_tools))
-
-                # Indícios de ransomware
-                ransomware_mask = txt.str.contains('ransom|encrypt|crypto|ransomware', case=False, na=False) | cat.str.contains('ransom', case=False, na=False)
-                ransomware = df_active[ransomware_mask]
-                response['security']['ransomware_indicators'] = int(len(ransomware))
-        except Exception: pass
-
-        # --- 3. GOVERNANCE ---
-        try:
-            df_fs = pd.read_sql_query("SELECT * FROM FileServerMetrics", conn)
-            df_fs = df_fs.fillna(0)
-
-            if not df_fs.empty:
-                latest_fs = df_fs.sort_values('date').groupby('file_server').tail(1)
-                tot = latest_fs['size_of_all_files_and_folders'].sum()
-                stale = latest_fs['size_of_folders_with_stale_data'].sum()
-                sids = latest_fs['no_of_folders_with_unresolved_sids'].sum()
-
-                response['governance']['storage'] = {
-                    "total_tb": round(tot/1024, 2),
-                    "stale_tb": round(stale/1024, 2),
-                    "active_tb": round((tot-stale)/1024, 2),
-                    "stale_percent": round((stale/tot*100), 1) if tot > 0 else 0
-                }
-                response['governance']['risks']['unresolved_sids'] = int(sids)
-
-                # Exposição de dados por servidor (heurística)
-                servers = []
-                for _, row in latest_fs.iterrows():
-                    server = str(row.get('file_server') or row.get('file_server_domain') or 'unknown')
-                    perms = int(row.get('no_of_permission_entries', 0) or 0)
-                    size = float(row.get('size_of_all_files_and_folders', 0) or 0)
-                    # score simples: permissões e tamanho — escala para 0-100
-                    score = min(100, int((perms / 1000.0) * 50 + (size / 1000.0) * 50))
-                    servers.append({"server": server, "permission_entries": perms, "size_gb": size, "exposure_score": score})
-
-                # média de exposição
-                exp_score = int(sum(s.get('exposure_score', 0) for s in servers) / len(servers)) if servers else 0
-                response['data_exposure'] = {"exposure_score": exp_score, "servers": servers}
-
-                # Mapa de vulnerabilidade do AD (por domínio)
-                try:
-                    vuln_list = []
-                    grp = df_ad.groupby('domain_name') if not df_ad.empty else []
-                    for domain, g in (grp if hasattr(grp, 'groups') else []):
-                        latest_dom = g.sort_values('date').iloc[-1]
-                        users_dom = int(latest_dom.get('no_of_users', 0) or 0)
-                        disabled_dom = int(latest_dom.get('no_of_disabled_users', 0) or 0)
-                        admins_dom = int(latest_dom.get('no_of_admin_accounts', 0) or 0)
+def _section_governance(response, frames):
+    # --- 3. GOVERNANCE ---
+    try:
+        df_fs = frames.fs()
+
+        if not df_fs.empty:
+            latest_fs = _latest_rows(df_fs, 'file_server')
+            tot = latest_fs['size_of_all_files_and_folders'].sum()
+            stale = latest_fs['size_of_folders_with_stale_data'].sum()
+            sids = latest_fs['no_of_folders_with_unresolved_sids'].sum()
+
+            response['governance']['storage'] = {
+                "total_tb": round(tot/1024, 2),
+                "stale_tb": round(stale/1024, 2),
+                "active_tb": round((tot-stale)/1024, 2),
+                "stale_percent": round((stale/tot*100), 1) if tot > 0 else 0
+            }
+            response['governance']['risks']['unresolved_sids'] = int(sids)
 
-                        disabled_pct = (disabled_dom / users_dom * 100) if users_dom>0 else 0
+            # Exposição de dados por servidor (heurística)
+            servers = _exposure_servers(latest_fs)
 
-                        # tentativa de mapear unresolved_sids por comparação com file_server names
-                        matched = df_fs[(df_fs.get('file_server')==domain) | (df_fs.get('file_server_domain')==domain)] if not df_fs.empty else pd.DataFrame()
-                        unresolved = int(matched['no_of_folders_with_unresolved_sids'].sum()) if not matched.empty and 'no_of_folders_with_unresolved_sids' in matched.columns else 0
+            # média de exposição
+            exp_score = int(sum(s.get('exposure_score', 0) for s in servers) / len(servers)) if servers else 0
+            response['data_exposure'] = {"exposure_score": exp_score, "servers": servers}
 
-                        # score ponderado e normalizado
-                        score = min(100, int(unresolved * 2 + disabled_pct * 0.6 + (admins_dom / users_dom * 100 if users_dom>0 else 0) * 0.8))
-                        vuln_list.append({"domain": domain, "vuln_score": score, "disabled_pct": round(disabled_pct,1), "admins": admins_dom, "unresolved_sids": unresolved})
+            df_ad = frames.ad()
 
+            # Mapa de vulnerabilidade do AD (por domínio)
+            with metrics.section('vulnerability_map', 'pandas'):
+                try:
+                    vuln_list = _vulnerability_map(df_ad, df_fs)
                     response['ad_vulnerability_map'] = sorted(vuln_list, key=lambda x: x['vuln_score'], reverse=True)
                 except Exception:
+                    metrics.section_failed('vulnerability_map', 'pandas')
                     response['ad_vulnerability_map'] = []
+                    _extra_checks(response, latest_fs, df_ad, frames.latest_per_domain(), frames.sec())
+    except Exception:
+        metrics.section_failed('governance', 'pandas')
+
+
+def _latest_rows(df, group):
+    """Último snapshot de cada grupo, na ordem cronológica desses snapshots.
+
+    A data é a ISO (date_iso, ou a normalizada de 'date' num banco sem ela);
+    linhas sem data válida ficam no fim, como NaT no pandas, e nos empates vale
+    a ordem das linhas (rowid). Mesmo critério de dashboard_sql.py.
+    """
+    day = df['date_iso'] if 'date_iso' in df.columns else df['date'].map(normalize_date)
+    # fillna(0) das seções troca a data ausente por 0
+    day = day.map(lambda v: v if isinstance(v, str) and v else None)
+    keys = pd.DataFrame({'day': day, 'row': df.index}, index=df.index)
+    ordered = df.loc[keys.sort_values(['day', 'row'], na_position='last').index]
+    return ordered.groupby(group).tail(1)
+
+
+def _column(df, name, default=0):
+    # lista explícita: pd.Series(None, index=...) viraria NaN, que é verdadeiro
+    return df[name] if name in df.columns else pd.Series([default] * len(df), index=df.index)
+
+
+def _exposure_servers(latest_fs):
+    """Exposição por servidor: score simples de permissões e tamanho, escala 0-100."""
+    primary = _column(latest_fs, 'file_server', None)
+    fallback = _column(latest_fs, 'file_server_domain', None)
+    # mesmo encadeamento `a or b or 'unknown'` da versão linha a linha
+    server = primary.where(primary.astype(bool), fallback)
+    server = server.where(server.astype(bool), 'unknown').map(str)
+    perms = _column(latest_fs, 'no_of_permission_entries').astype(int)
+    size = _column(latest_fs, 'size_of_all_files_and_folders').astype(float)
+    score = ((perms / 1000.0) * 50 + (size / 1000.0) * 50).astype(int).clip(upper=100)
+    return [
+        {"server": sv, "permission_entries": p, "size_gb": sz, "exposure_score": sc}
+        for sv, p, sz, sc in zip(server.tolist(), perms.tolist(), size.tolist(), score.tolist())
+    ]
+
+
+def _vulnerability_map(df_ad, df_fs):
+    """Mapa de vulnerabilidade por domínio (na ordem dos domínios, antes do sort por score).
+
+    Último snapshot (_latest_rows) de cada domínio, com a soma histórica de
+    SIDs não resolvidos das linhas de FileServerMetrics cujo file_server ou
+    file_server_domain é o domínio. As somas saem de um único groupby sobre as
+    chaves de cada linha (file_server, e file_server_domain quando diferente),
+    em vez de filtrar df_fs inteiro a cada domínio.
+    """
+    if df_ad.empty:
+        return []
+    counts = ['no_of_users', 'no_of_disabled_users', 'no_of_admin_accounts']
+    latest = _latest_rows(df_ad, 'domain_name').set_index('domain_name').sort_index()[
+        [c for c in counts if c in df_ad.columns]]
+    for c in counts:
+        if c not in latest.columns:
+            latest[c] = 0
+
+    sids = df_fs['no_of_folders_with_unresolved_sids']
+    keys, values = [df_fs['file_server']], [sids]
+    if 'file_server_domain' in df_fs.columns:
+        # uma linha que casa pelos dois campos entra uma vez só
+        other = df_fs['file_server_domain'] != df_fs['file_server']
+        keys.append(df_fs.loc[other, 'file_server_domain'])
+        values.append(sids[other])
+    per_key = pd.concat(values, ignore_index=True).groupby(pd.concat(keys, ignore_index=True).values, sort=False).sum()
+    latest['unresolved'] = per_key.reindex(latest.index, fill_value=0).values
+
+    users = latest['no_of_users'].astype(int)
+    disabled = latest['no_of_disabled_users'].astype(int)
+    admins = latest['no_of_admin_accounts'].astype(int)
+    unresolved = latest['unresolved'].astype(int)
+    has_users = users > 0
+    disabled_pct = (disabled / users.where(has_users) * 100).where(has_users, 0).astype(float)
+    admin_pct = (admins / users.where(has_users) * 100).where(has_users, 0).astype(float)
+    score = (unresolved * 2 + disabled_pct * 0.6 + admin_pct * 0.8).astype(int).clip(upper=100)
+
+    # sem usuários o percentual sai como o inteiro 0, como antes
+    return [
+        {"domain": domain, "vuln_score": sc, "disabled_pct": round(pct, 1) if ok else 0, "admins": adm,
+         "unresolved_sids": unr}
+        for domain, sc, pct, ok, adm, unr in zip(latest.index.tolist(), score.tolist(), disabled_pct.tolist(),
+                                                 has_users.tolist(), admins.tolist(), unresolved.tolist())
+    ]
+
+
+def _flag_count(df, flag):
+    # Nº de alertas marcados com a flag (0 sem alertas ou sem a coluna)
+    if df is None or df.empty or flag not in df.columns:
+        return 0
+    return int((df[flag] == 1).sum())
+
+
+def _extra_checks(response, latest_fs, df_ad, latest_per_domain, df_sec):
+    # --- 4. Verificações adicionais (Varonis / AD Health extras) ---
+    # Varonis-related indicators (procuramos colunas típicas)
+    try:
+        varonis = {}
+        varonis_events = 0
+        cols = latest_fs.columns if hasattr(latest_fs, 'columns') else []
+        if 'no_of_events' in cols:
+            varonis_events += int(latest_fs['no_of_events'].sum())
+        if 'no_of_events_on_sensitive_files' in cols:
+            varonis_events += int(latest_fs['no_of_events_on_sensitive_files'].sum())
+        if 'no_of_files_with_hits_selected_rule' in cols:
+            varonis_events += int(latest_fs['no_of_files_with_hits_selected_rule'].sum())
+
+        if varonis_events > 0:
+            varonis['events'] = int(varonis_events)
+            # Remediação sugerida se houver muitos eventos
+            varonis['remediation_needed'] = varonis_events > 0
+            response['varonis'] = varonis
+    except Exception:
+        pass
+
+    # AD vulnerabilidades (enable but stale, executive accounts)
+    try:
+        vuln = {}
+        if not df_ad.empty:
+            # soma across latest_per_domain se disponível
+            if 'no_of_enabled_but_stale_users' in latest_per_domain.columns:
+                vuln['enable_but_stale'] = int(latest_per_domain['no_of_enabled_but_stale_users'].fillna(0).astype(int).sum())
+            if 'no_of_executive_accounts' in latest_per_domain.columns:
+                vuln['executive_accounts'] = int(latest_per_domain['no_of_executive_accounts'].fillna(0).astype(int).sum())
+        if vuln:
+            response['vulnerabilities'] = vuln
+    except Exception:
+        pass
+
+    # Krbtgt / Kerberos password reset recommendation + ITSM integration + access ANTT + ANTT STEP meetings
+    try:
+        # krbtgt recommendation: check AD metrics or security alerts for kerberos/krbtgt mentions
+        krbtgt_flag = False
+        if not df_ad.empty and 'no_of_domains_with_a_delinquent_kerberos_account_password' in latest_per_domain.columns:
+            if int(latest_per_domain['no_of_domains_with_a_delinquent_kerberos_account_password'].fillna(0).astype(int).sum()) > 0:
+                krbtgt_flag = True
+
+        # alertas classificados pela ingestão como menção a krbtgt/kerberos
+        if _flag_count(df_sec, 'flag_kerberos'):
+            krbtgt_flag = True
+
+        if krbtgt_flag:
+            response.setdefault('security', {})
+            response['security']['krbtgt_reset_recommended'] = True
+
+        # ITSM integration: fechamentos com referência a chamado (INC, SR-, #, ticket, jira, servicenow)
+        itsm = _flag_count(df_sec, 'flag_itsm_ticket') > 0
+        if itsm:
+            response.setdefault('security', {})
+            response['security']['itsm_integration'] = True
+
+        # Acesso ao Ambiente ANTT: alertas com 'antt' em asset/file_server_domain/user_name
+        access_count = _flag_count(df_sec, 'flag_antt_access')
+        if access_count > 0:
+            response.setdefault('security', {})
+            response['security']['access_antt'] = access_count
+
+        # Agendamento de Reuniões "ANTT STEP": menções em threat_model_name (heurística)
+        step_count = _flag_count(df_sec, 'flag_step_meeting')
+        if step_count > 0:
+            response.setdefault('security', {})
+            response['security']['antt_step_meetings'] = step_count
+    except Exception:
+        pass
+
+
+SECTION_BUILDERS = {
+    'ad_health': _section_ad_health,
+    'security': _section_security,
+    'governance': _section_governance,
+}
+
+
+def _backend(name=None):
+    """Retorna (nome, fábrica da fonte de dados, construtores das seções) do backend."""
+    if (name or DASHBOARD_BACKEND) == 'pandas':
+        return 'pandas', _FrameLoader, SECTION_BUILDERS
+    return 'sql', dashboard_sql.SqlSource, dashboard_sql.SECTION_BUILDERS
 
-                    # --- 4. Verificações adicionais (Varonis / AD Health extras) ---
-                    # Varonis-related indicators (procuramos colunas típicas)
-                    try:
-                        varonis = {}
-                        varonis_events = 0
-                        cols = latest_fs.columns if hasattr(latest_fs, 'columns') else []
-                        if 'no_of_events' in cols:
-                            varonis_events += int(latest_fs['no_of_events'].sum())
-                        if 'no_of_events_on_sensitive_files' in cols:
-                            varonis_events += int(latest_fs['no_of_events_on_sensitive_files'].sum())
-                        if 'no_of_files_with_hits_selected_rule' in cols:
-                            varonis_events += int(latest_fs['no_of_files_with_hits_selected_rule'].sum())
-
-                        if varonis_events > 0:
-                            varonis['events'] = int(varonis_events)
-                            # Remediação sugerida se houver muitos eventos
-                            varonis['remediation_needed'] = varonis_events > 0
-                            response['varonis'] = varonis
-                    except Exception:
-                        pass
-
-                    # AD vulnerabilidades (enable but stale, executive accounts)
-                    try:
-                        vuln = {}
-                        if not df_ad.empty:
-                            # soma across latest_per_domain se disponível
-                            if 'no_of_enabled_but_stale_users' in latest_per_domain.columns:
-                                vuln['enable_but_stale'] = int(latest_per_domain['no_of_enabled_but_stale_users'].fillna(0).astype(int).sum())
-                            if 'no_of_executive_accounts' in latest_per_domain.columns:
-                                vuln['executive_accounts'] = int(latest_per_domain['no_of_executive_accounts'].fillna(0).astype(int).sum())
-                        if vuln:
-                            response['vulnerabilities'] = vuln
-                    except Exception:
-                        pass
-
-                    # Krbtgt / Kerberos password reset recommendation + ITSM integration + access ANTT + ANTT STEP meetings
-                    try:
-                        # krbtgt recommendation: check AD metrics or security alerts for kerberos/krbtgt mentions
-                        krbtgt_flag = False
-                        if not df_ad.empty and 'no_of_domains_with_a_delinquent_kerberos_account_password' in latest_per_domain.columns:
-                            if int(latest_per_domain['no_of_domains_with_a_delinquent_kerberos_account_password'].fillna(0).astype(int).sum()) > 0:
-                                krbtgt_flag = True
-
-                        # check SecurityAlerts text fields for krbtgt/kerberos
-                        if 'df_sec' in locals() and not df_sec.empty:
-                            txt_all = (df_sec.get('threat_model_name') .fillna('').astype(str).str.lower() + ' ' + df_sec.get('alert_category', '').fillna('').astype(str).str.lower() + ' ' + df_sec.get('asset', '').fillna('').astype(str).str.lower())
-                            if txt_all.str.contains('krbtgt|kerberos', case=False, na=False).any():
-                                krbtgt_flag = True
-
-                        if krbtgt_flag:
-                            response.setdefault('security', {})
-                            response['security']['krbtgt_reset_recommended'] = True
-
-                        # ITSM integration: check for close_reason or patterns
-                        itsm = False
-                        if 'df_sec' in locals() and not df_sec.empty and 'close_reason' in df_sec.columns:
-                            cr = df_sec['close_reason'].astype(str).fillna('')
-                            # heuristic: tickets often contain INC, SR-, # or numeric ticket ids
-                            if cr.str.contains('inc|sr-|#|ticket|jira|servicenow', case=False, na=False).any() or cr.str.strip().replace('','') != '':
-                                # presence of any non-empty close_reason indicates some integration/workflow
-                                if cr.str.strip().astype(bool).any():
-                                    itsm = True
-                        if itsm:
-                            response.setdefault('security', {})
-                            response['security']['itsm_integration'] = True
-
-                        # Acesso ao Ambiente ANTT: contar ocorrências nos alertas/asset/file_server_domain
-                        access_count = 0
-                        if 'df_sec' in locals() and not df_sec.empty:
-                            asset_cols = []
-                            for c in ['asset', 'file_server_domain', 'user_name']:
-                                if c in df_sec.columns:
-                                    asset_cols.append(df_sec[c].astype(str).fillna('').str.lower())
-                            if asset_cols:
-                                combined = asset_cols[0]
-                                for c in asset_cols[1:]:
-                                    combined = combined + ' ' + c
-                                access_count = int(combined.str.contains('antt', case=False, na=False).sum())
-                        if access_count > 0:
-                            response.setdefault('security', {})
-                            response['security']['access_antt'] = access_count
-
-                        # Agendamento de Reuniões "ANTT STEP": buscar menções em alertas (heurística)
-                        step_count = 0
-                        if 'df_sec' in locals() and not df_sec.empty:
-                            txt = (df_sec.get('threat_model_name') or pd.Series(['']*len(df_sec))).astype(str).str.lower()
-                            step_count = int(txt.str.contains('step|antt step|meeting|calendar', case=False, na=False).sum())
-                        if step_count > 0:
-                            response.setdefault('security', {})
-                            response['security']['antt_step_meetings'] = step_count
-                    except Exception:
-                        pass
-        except Exception: pass
-
-        conn.close()
-        return response
+
+def _build_section(name, builders, response, source, backend):
+    # Tempo de cada seção vai para /metrics (e para o Server-Timing da requisição)
+    with metrics.section(name, backend):
+        builders[name](response, source)
+
+
+def get_dashboard_data(backend=None, scope=None, sections=None):
+    """Dashboard calculado na hora; `sections` restringe às seções pedidas (ver sections_for)."""
+    response = _empty_response()
+
+    if not os.path.exists(DB_PATH):
+        return only_sections(response, sections)
+
+    try:
+        # Conexão de leitura da thread, reaproveitada entre cálculos
+        conn = db_connections.read_connection(DB_PATH)
+        name, make_source, builders = _backend(backend)
+        source = make_source(conn, scope)
+        for section in builders:
+            if sections is None or section in sections:
+                _build_section(section, builders, response, source, name)
+        return only_sections(response, sections)
 
     except Exception:
-        return response
\ No newline at end of file
+        return only_sections(response, sections)
+
+
+def compute_dashboard(db_path=None, scope=None, sections=None):
+    """Retorna (versão dos dados, resposta), lidos numa única transação: um é coerente com o outro."""
+    conn = db_connections.read_connection(db_path or DB_PATH)
+    try:
+        conn.execute('BEGIN')
+        version = read_data_version(conn)
+        response = _empty_response()
+        backend, make_source, builders = _backend()
+        source = make_source(conn, scope)
+        for section in builders:
+            if sections is None or section in sections:
+                _build_section(section, builders, response, source, backend)
+        return version, only_sections(response, sections)
+    finally:
+        # Encerra a transação de leitura; a conexão volta para o reuso da thread
+        conn.rollback()
+
+
+# ==============================================================================
+# SNAPSHOT MATERIALIZADO
+# ------------------------------------------------------------------------------
+# Mantém em memória a última resposta calculada, junto com a versão dos dados
+# (nº de linhas + geração de carga de cada tabela) usada em cada seção. Numa
+# requisição, só as seções pedidas cujas tabelas de origem mudaram são
+# recalculadas: uma tela que só mostra a segurança não paga pela governança.
+# ==============================================================================
+
+class DashboardSnapshot:
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pragma_version = None
+        self._data_version = None
+        self._sections = {}   # seção -> (versão das tabelas de origem, resposta parcial)
+        self._responses = {}  # seções pedidas -> resposta montada
+
+    @property
+    def data_version(self):
+        return self._data_version
+
+    def get(self, sections=None):
+        """Retorna a resposta do dashboard (só das seções pedidas, se informadas).
+
+        O dicionário é compartilhado: não o modifique.
+        """
+        sections = tuple(name for name in SECTION_BUILDERS if sections is None or name in sections)
+        with self._lock:
+            if not os.path.exists(self.db_path):
+                self._reset()
+                return only_sections(_empty_response(), sections)
+            try:
+                self._refresh(sections)
+            except Exception:
+                self._reset()
+                return get_dashboard_data(sections=sections)
+            if sections not in self._responses:
+                self._responses[sections] = self._merge(sections)
+            return self._responses[sections]
+
+    def invalidate(self):
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
+        self._pragma_version = None
+        self._data_version = None
+        self._sections = {}
+        self._responses = {}
+
+    def _refresh(self, sections):
+        if self._conn is None:
+            # Conexão própria: PRAGMA data_version é relativo à conexão que o consulta
+            self._conn = db_connections.connect(self.db_path, check_same_thread=False)
+
+        # PRAGMA data_version só muda quando outra conexão grava no banco:
+        # sem escrita desde a última checagem, nem contamos as linhas.
+        pragma_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._data_version is None or pragma_version != self._pragma_version:
+            self._pragma_version = pragma_version
+            self._data_version = read_data_version(self._conn)
+
+        stale = []
+        for name in sections:
+            key = tuple(self._data_version.get(t) for t in SECTION_SOURCES[name])
+            if name not in self._sections or self._sections[name][0] != key:
+                stale.append((name, key))
+        if not stale:
+            return
+
+        backend, make_source, builders = _backend()
+        source = make_source(self._conn)
+        for name, key in stale:
+            partial = _empty_response()
+            _build_section(name, builders, partial, source, backend)
+            self._sections[name] = (key, partial)
+        self._responses = {}
+
+    def _merge(self, sections):
+        response = only_sections(_empty_response(), sections)
+        for name in sections:
+            partial = self._sections[name][1]
+            for key in SECTION_KEYS[name]:
+                if key in partial:
+                    response[key] = partial[key]
+        # 'security' pode receber indicadores extras calculados na governança
+        if 'security' in sections and 'governance' in sections:
+            extras = {k: v for k, v in self._sections['governance'][1]['security'].items()
+                      if k in GOVERNANCE_SECURITY_KEYS}
+            if extras:
+                response['security'] = {**response['security'], **extras}
+        return response
+
+
+dashboard_snapshot = DashboardSnapshot()
+
+
+def get_dashboard_snapshot(sections=None):
+    return dashboard_snapshot.get(sections)
+
+
+# ==============================================================================
+# RECORTES (período / domínio / file server)
+# ------------------------------------------------------------------------------
+# Cada combinação de filtros (e de seções pedidas) é uma entrada própria de um
+# LRU limitado a SCOPE_CACHE_SIZE entradas, válida enquanto a versão dos dados
+# não muda. O snapshot acima continua atendendo o dashboard sem filtros.
+# ==============================================================================
+
+class ScopedDashboardCache:
+    def __init__(self, db_path=DB_PATH, size=SCOPE_CACHE_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # (scope.key(), seções) -> (versão dos dados, resposta)
+
+    def get(self, scope, version, sections=None):
+        """Resposta do recorte na versão `version` dos dados. O dicionário é compartilhado: não o modifique."""
+        key = (scope.key(), None if sections is None else tuple(sections))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+        if not os.path.exists(self.db_path):
+            return only_sections(_empty_response(), sections)
+        try:
+            computed_version, response = compute_dashboard(self.db_path, scope, sections)
+        except Exception:
+            return get_dashboard_data(scope=scope, sections=sections)
+        with self._lock:
+            self._entries[key] = (computed_version, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return response
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+scoped_dashboards = ScopedDashboardCache()
+
+
+def get_scoped_dashboard(scope, version, sections=None):
+    return scoped_dashboards.get(scope, version, sections)
@@ -0,0 +1,177 @@
+import pandas as pd
+
+import rollups
+from db_schema import normalize_date
+
+# ==============================================================================
+# RECORTE DO DASHBOARD (período, domínio, file server)
+# ------------------------------------------------------------------------------
+# /api/v1/dashboard_data?date_from=&date_to=&domain=&file_server= calcula o
+# dashboard só sobre as linhas do recorte. Cada tabela é filtrada pelo seu dia
+# (datas inclusivas, YYYY-MM-DD) e pelas colunas que identificam domínio/servidor:
+#   - ADMetrics: dia = date_iso; domain -> domain_name (file_server não se aplica);
+#   - FileServerMetrics: dia = date_iso; domain -> file_server_domain ou
+#     file_server (as mesmas chaves do mapa de vulnerabilidade); file_server ->
+#     file_server;
+#   - SecurityAlerts: dia = 'YYYY-MM-DD' do alert_time ISO; a coluna
+#     file_server_domain do Varonis traz o servidor ou o domínio, então
+#     file_server (se informado) ou domain -> file_server_domain.
+# Filtro cuja coluna não existe na tabela não casa com nenhuma linha.
+# As condições SQL usam parâmetros nomeados (:scope_domain, ...): os valores do
+# usuário nunca entram no texto da consulta, e a mesma condição pode aparecer
+# várias vezes numa consulta com um único dicionário de parâmetros.
+# O backend SQL aplica a condição no SQLite (índices de alert_time, de
+# (domain_name, date_iso), (file_server, date_iso) e (file_server_domain, ...)),
+# os rollups diários a aplicam nas suas colunas e o backend pandas, como máscara
+# sobre os DataFrames.
+# ==============================================================================
+
+
+def _next_day_prefix(day):
+    # Menor texto maior que qualquer 'YYYY-MM-DD...' do dia: '2025-01-31' -> '2025-01-32'
+    return day[:-1] + chr(ord(day[-1]) + 1)
+
+
+class DashboardScope:
+    """Filtros do dashboard; datas como texto 'YYYY-MM-DD' (None = sem limite)."""
+
+    __slots__ = ('date_from', 'date_to', 'domain', 'file_server')
+
+    def __init__(self, date_from=None, date_to=None, domain=None, file_server=None):
+        self.date_from = date_from or None
+        self.date_to = date_to or None
+        self.domain = domain or None
+        self.file_server = file_server or None
+
+    def __bool__(self):
+        return any(self.key())
+
+    def __repr__(self):
+        return 'DashboardScope({!r}, {!r}, {!r}, {!r})'.format(*self.key())
+
+    def key(self):
+        return (self.date_from, self.date_to, self.domain, self.file_server)
+
+    def _matches(self, table_name):
+        """[(colunas alternativas, filtro)] dos filtros de identificação da tabela ('domain'/'file_server')."""
+        if table_name == 'ADMetrics':
+            return [(('domain_name',), 'domain')] if self.domain else []
+        if table_name == 'FileServerMetrics':
+            matches = []
+            if self.domain:
+                matches.append((('file_server_domain', 'file_server'), 'domain'))
+            if self.file_server:
+                matches.append((('file_server',), 'file_server'))
+            return matches
+        if self.file_server or self.domain:
+            return [(('file_server_domain',), 'file_server' if self.file_server else 'domain')]
+        return []
+
+    def _dated(self):
+        return self.date_from is not None or self.date_to is not None
+
+    # --------------------------------------------------------------------------
+    # SQL
+    # --------------------------------------------------------------------------
+
+    def sql_condition(self, table_name, columns):
+        """(condição SQL sobre a tabela bruta, parâmetros); condição None se o recorte não a restringe."""
+        columns = set(columns)
+        conditions, params = [], {}
+        if self._dated():
+            if table_name == 'SecurityAlerts':
+                if 'alert_time' not in columns:
+                    return '0', {}
+                # Faixa direto em alert_time (ISO): usa o índice ix_securityalerts_alert_time
+                conditions.append(f"alert_time GLOB '{rollups.ALERT_TIME_GLOB}'")
+                if self.date_from:
+                    conditions.append('alert_time >= :scope_date_from')
+                    params['scope_date_from'] = self.date_from
+                if self.date_to:
+                    conditions.append('alert_time < :scope_date_to_next')
+                    params['scope_date_to_next'] = _next_day_prefix(self.date_to)
+            else:
+                if 'date_iso' in columns:
+                    day = 'date_iso'
+                elif 'date' in columns:
+                    day = 'antt_date_iso(date)'
+                else:
+                    return '0', {}
+                conditions.extend(self._day_range(day, params))
+        if not self._identify(table_name, columns, conditions, params):
+            return '0', {}
+        return (' AND '.join(conditions) if conditions else None), params
+
+    def rollup_condition(self, table_name, columns):
+        """(condição SQL sobre um rollup diário da tabela (colunas 'day' e grupos), parâmetros)."""
+        params = {}
+        conditions = self._day_range('day', params)
+        if not self._identify(table_name, set(columns), conditions, params):
+            return '0', {}
+        return (' AND '.join(conditions) if conditions else '1'), params
+
+    def _identify(self, table_name, columns, conditions, params):
+        # Acrescenta os filtros de domínio/servidor; False se falta a coluna de algum deles
+        for alternatives, name in self._matches(table_name):
+            present = [c for c in alternatives if c in columns]
+            if not present:
+                return False
+            match = ' OR '.join(f'"{c}" = :scope_{name}' for c in present)
+            conditions.append(f'({match})' if len(present) > 1 else match)
+            params[f'scope_{name}'] = getattr(self, name)
+        return True
+
+    def _day_range(self, day, params):
+        conditions = []
+        if self.date_from:
+            conditions.append(f'{day} >= :scope_date_from')
+            params['scope_date_from'] = self.date_from
+        if self.date_to:
+            conditions.append(f'{day} <= :scope_date_to')
+            params['scope_date_to'] = self.date_to
+        return conditions
+
+    # --------------------------------------------------------------------------
+    # pandas
+    # --------------------------------------------------------------------------
+
+    def frame_columns(self, table_name, columns):
+        """Colunas de `columns` (as existentes na tabela) que frame_mask() precisa ler."""
+        needed = set()
+        if self._dated():
+            needed.update(('alert_time',) if table_name == 'SecurityAlerts' else ('date_iso', 'date'))
+        for alternatives, _ in self._matches(table_name):
+            needed.update(alternatives)
+        return [c for c in columns if c in needed]
+
+    def frame_mask(self, table_name, df):
+        """Máscara booleana equivalente a sql_condition() sobre o DataFrame bruto."""
+        mask = pd.Series(True, index=df.index)
+        if self._dated():
+            if table_name == 'SecurityAlerts':
+                days = df['alert_time'].map(rollups.alert_day) if 'alert_time' in df.columns else None
+            elif 'date_iso' in df.columns:
+                days = df['date_iso']
+            elif 'date' in df.columns:
+                days = df['date'].map(normalize_date)
+            else:
+                days = None
+            if days is None:
+                return ~mask
+            valid = days.notna()
+            days = days.where(valid, '').astype(str)
+            mask &= valid
+            if self.date_from:
+                mask &= days >= self.date_from
+            if self.date_to:
+                mask &= days <= self.date_to
+        for alternatives, name in self._matches(table_name):
+            value = getattr(self, name)
+            present = [c for c in alternatives if c in df.columns]
+            if not present:
+                return mask & False
+            match = pd.Series(False, index=df.index)
+            for c in present:
+                match |= df[c] == value
+            mask &= match
+        return mask
@@ -0,0 +1,379 @@
+import json
+import sqlite3
+
+import pandas as pd
+
+import alert_rules
+import metrics
+import rollups
+from db_schema import register_functions
+
+# ==============================================================================
+# BACKEND SQL DO DASHBOARD
+# ------------------------------------------------------------------------------
+# Mesmas seções de dashboard_data_processor.py, mas com agrupamentos, seleção do
+# último snapshot e contagens feitos no SQLite, lendo só as colunas necessárias.
+# A memória passa a depender do nº de grupos (domínios, servidores, usuários),
+# não do nº de linhas. A saída JSON é a mesma do caminho pandas:
+#   - contagens "value_counts" vêm agregadas na ordem da primeira ocorrência e
+#     passam pelo mesmo sort do pandas, preservando a ordem dos empates;
+#   - o último snapshot de cada servidor/domínio é o da maior data ISO
+#     (date_iso; sem data válida fica por último, como NaT no pandas), com
+#     desempate pelo rowid, via ROW_NUMBER() sobre os índices (grupo, date_iso).
+# Com um recorte (dashboard_scope.py), as consultas leem cada tabela por
+# SqlSource.table(), que aplica o filtro do recorte sobre a tabela, e rodam
+# por SqlSource.execute(), que liga os valores do recorte (SqlSource.params).
+# ==============================================================================
+
+CLOSED_STATES = ('closed', 'resolved', 'dismissed', 'mitigated', 'false positive')
+
+ACTIVE_ALERT = "lower(CAST(COALESCE(status, 0) AS TEXT)) NOT IN ({})".format(
+    ', '.join(f"'{s}'" for s in CLOSED_STATES)
+)
+
+class SqlSource:
+    """Conexão + metadados compartilhados entre as seções de um mesmo cálculo."""
+
+    def __init__(self, conn, scope=None):
+        self.conn = conn
+        self.scope = scope
+        register_functions(conn)
+        self._columns = {}
+        self._tables = {}
+        # Parâmetros nomeados das condições do recorte (dashboard_scope.py)
+        self.params = {}
+        # Data interpretada do AD: coluna normalizada pela ingestão, se existir
+        try:
+            self.ad_date = 'date_iso' if self.has_column('ADMetrics', 'date_iso') else 'antt_date(date)'
+        except sqlite3.Error:
+            self.ad_date = 'antt_date(date)'
+        try:
+            self.fs_date = 'date_iso' if self.has_column('FileServerMetrics', 'date_iso') else 'antt_date_iso(date)'
+        except sqlite3.Error:
+            self.fs_date = 'antt_date_iso(date)'
+
+    def columns(self, table):
+        if table not in self._columns:
+            self._columns[table] = [r[1] for r in self.conn.execute(f'PRAGMA table_info("{table}")')]
+            if not self._columns[table]:
+                raise sqlite3.OperationalError(f"no such table: {table}")
+        return self._columns[table]
+
+    def has_column(self, table, col):
+        return col in self.columns(table)
+
+    def table(self, name):
+        """A tabela, ou uma subconsulta só com as linhas do recorte (com o mesmo rowid)."""
+        if name not in self._tables:
+            condition, params = self.scope.sql_condition(name, self.columns(name)) if self.scope else (None, {})
+            self.params.update(params)
+            self._tables[name] = f'(SELECT rowid AS rowid, * FROM {name} WHERE {condition})' if condition else name
+        return self._tables[name]
+
+    def execute(self, sql):
+        """Executa uma consulta montada com table(), com os parâmetros do recorte."""
+        return self.conn.execute(sql, self.params)
+
+    def latest_per_domain(self, cols):
+        """Último snapshot (pela data interpretada) de cada domínio, como DataFrame."""
+        self.columns('ADMetrics')
+        cols = [c for c in cols if self.has_column('ADMetrics', c)]
+        select = ', '.join(f'COALESCE("{c}", 0) AS "{c}"' for c in cols)
+        # datas inválidas (NaT) ficam no fim da ordenação do pandas, então "vencem"
+        sql = f"""
+            SELECT {select or 'NULL'} FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY COALESCE(domain_name, 0)
+                    ORDER BY ({self.ad_date} IS NULL) DESC, {self.ad_date} DESC, rowid DESC
+                ) AS rn
+                FROM {self.table('ADMetrics')}
+            ) WHERE rn = 1
+        """
+        return pd.DataFrame(self.execute(sql).fetchall(), columns=cols or ['_'])[cols]
+
+    def value_counts(self, table, expr, where='1'):
+        """Equivalente a df[col].value_counts() com a mesma ordem de empates do pandas."""
+        rows = self.execute(
+            f"SELECT {expr} AS k, COUNT(*) FROM {self.table(table)} WHERE {where} GROUP BY k ORDER BY MIN(rowid)"
+        ).fetchall()
+        return pd.Series([c for _, c in rows], index=[k for k, _ in rows], dtype='int64').sort_values(ascending=False)
+
+
+def _section_ad_health(response, source):
+    try:
+        conn = source.conn
+        if source.execute(f"SELECT COUNT(*) FROM {source.table('ADMetrics')}").fetchone()[0] == 0:
+            return
+        latest_per_domain = source.latest_per_domain([
+            'no_of_users', 'no_of_disabled_users', 'no_of_admin_accounts',
+            'no_of_disable_admin_accounts', 'no_of_service_accounts',
+        ])
+
+        def safe_sum(col):
+            return int(latest_per_domain[col].astype(float).sum()) if col in latest_per_domain.columns else 0
+
+        total_users = safe_sum('no_of_users')
+        disabled = safe_sum('no_of_disabled_users')
+        admins_active = max(0, safe_sum('no_of_admin_accounts') - safe_sum('no_of_disable_admin_accounts'))
+
+        response['ad_health']['latest'] = {
+            "users_total": total_users,
+            "users_disabled": disabled,
+            "admins_active": admins_active,
+            "disabled_pct": round((disabled/total_users*100), 1) if total_users > 0 else 0,
+            "service_accounts": safe_sum('no_of_service_accounts')
+        }
+
+        # Evolução: soma por data entre domínios (do rollup diário, se atualizado)
+        rows = rollups.ad_evolution(conn, source.scope)
+        if rows is None and source.has_column('ADMetrics', 'no_of_users') and source.has_column('ADMetrics', 'no_of_disabled_users'):
+            rows = source.execute(f"""
+                SELECT d, SUM(COALESCE(no_of_users, 0)), SUM(COALESCE(no_of_disabled_users, 0))
+                FROM (SELECT {source.ad_date} AS d, no_of_users, no_of_disabled_users FROM {source.table('ADMetrics')})
+                WHERE d IS NOT NULL GROUP BY d ORDER BY d
+            """).fetchall()
+        if rows is not None:
+            dates = [d[:10] for d, _, _ in rows]
+            users = [int(u) for _, u, _ in rows]
+            disabled_series = [int(x) for _, _, x in rows]
+        else:
+            # mesmo fallback do pandas: série crua, na ordem das datas
+            cols = [c for c in ('no_of_users', 'no_of_disabled_users') if source.has_column('ADMetrics', c)]
+            select = ''.join(f', COALESCE({c}, 0)' for c in cols)
+            rows = source.execute(
+                f"SELECT date{select} FROM {source.table('ADMetrics')} ORDER BY ({source.ad_date} IS NULL), {source.ad_date}, rowid"
+            ).fetchall()
+            series = {c: [int(r[i + 1]) for r in rows] for i, c in enumerate(cols)}
+            dates = [r[0] for r in rows]
+            users = series.get('no_of_users', [])
+            disabled_series = series.get('no_of_disabled_users', [])
+
+        response['ad_health']['evolution'] = {
+            "dates": dates,
+            "users": users,
+            "disabled": disabled_series
+        }
+    except Exception:
+        metrics.section_failed('ad_health', 'sql')
+
+
+def _section_security(response, source):
+    try:
+        conn = source.conn
+        if source.execute(f"SELECT COUNT(*) FROM {source.table('SecurityAlerts')}").fetchone()[0] == 0:
+            return
+
+        total, critical = source.execute(f"""
+            SELECT COUNT(*), COALESCE(SUM(lower(CAST(COALESCE(alert_severity, 0) AS TEXT)) = 'high'), 0)
+            FROM {source.table('SecurityAlerts')} WHERE {ACTIVE_ALERT}
+        """).fetchone()
+        response['security']['total_alerts'] = int(total)
+        response['security']['critical_open'] = int(critical)
+
+        # Timeline: dia (YYYY-MM-DD) de cada alerta ativo com alert_time ISO válido
+        # (do rollup diário, se atualizado)
+        try:
+            rows = rollups.alert_timeline(conn, ACTIVE_ALERT, source.scope)
+            if rows is None:
+                rows = source.execute(f"""
+                    SELECT substr(alert_time, 1, 10) AS dia, COUNT(*) FROM {source.table('SecurityAlerts')}
+                    WHERE {ACTIVE_ALERT} AND alert_time GLOB '{rollups.ALERT_TIME_GLOB}'
+                    GROUP BY dia ORDER BY dia
+                """).fetchall()
+            response['security']['timeline'] = {"labels": [r[0] for r in rows], "data": [r[1] for r in rows]}
+        except Exception:
+            response['security']['timeline'] = {"labels": [], "data": []}
+
+        def counts(col, n=None):
+            if not source.has_column('SecurityAlerts', col):
+                return {}
+            vc = source.value_counts('SecurityAlerts', f"COALESCE({col}, 0)", ACTIVE_ALERT)
+            return (vc.head(n) if n else vc).to_dict()
+
+        response['security']['top_users'] = counts('user_name', 5)
+        response['security']['top_threats'] = counts('threat_model_name', 5)
+        response['security']['severity_dist'] = counts('alert_severity')
+
+        # Exclusões, ferramentas administrativas e ransomware entre os alertas ativos:
+        # COUNT pelas flags da ingestão (alert_rules.py), com índice parcial por flag
+        for key, flag in alert_rules.SECURITY_COUNTS.items():
+            if source.has_column('SecurityAlerts', flag):
+                response['security'][key] = _flag_count(source, flag, ACTIVE_ALERT)
+    except Exception:
+        metrics.section_failed('security', 'sql')
+
+
+def _latest_fs_rowids(source):
+    # Último snapshot de cada servidor, na ordem cronológica desses snapshots
+    # (mesma seleção e ordem de _latest_rows() no caminho pandas)
+    day = source.fs_date
+    return [r[0] for r in source.execute(f"""
+        SELECT rowid FROM (
+            SELECT rowid, {day} AS day, ROW_NUMBER() OVER (
+                PARTITION BY COALESCE(file_server, 0)
+                ORDER BY ({day} IS NULL) DESC, {day} DESC, rowid DESC
+            ) AS rn
+            FROM {source.table('FileServerMetrics')}
+        ) WHERE rn = 1 ORDER BY (day IS NULL), day, rowid
+    """)]
+
+
+def _section_governance(response, source):
+    try:
+        conn = source.conn
+        if source.execute(f"SELECT COUNT(*) FROM {source.table('FileServerMetrics')}").fetchone()[0] == 0:
+            return
+
+        rowids = _latest_fs_rowids(source)
+        wanted = ['file_server', 'file_server_domain', 'no_of_permission_entries', 'size_of_all_files_and_folders',
+                  'size_of_folders_with_stale_data', 'no_of_folders_with_unresolved_sids',
+                  'no_of_events', 'no_of_events_on_sensitive_files', 'no_of_files_with_hits_selected_rule']
+        cols = [c for c in wanted if source.has_column('FileServerMetrics', c)]
+        rows = conn.execute(
+            "SELECT {} FROM json_each(?) j JOIN FileServerMetrics f ON f.rowid = j.value ORDER BY j.key".format(
+                ', '.join(f'COALESCE(f."{c}", 0)' for c in cols)),
+            (json.dumps(rowids),)
+        ).fetchall()
+        latest_fs = pd.DataFrame(rows, columns=cols)
+
+        tot = latest_fs['size_of_all_files_and_folders'].sum()
+        stale = latest_fs['size_of_folders_with_stale_data'].sum()
+        sids = latest_fs['no_of_folders_with_unresolved_sids'].sum()
+
+        response['governance']['storage'] = {
+            "total_tb": round(tot/1024, 2),
+            "stale_tb": round(stale/1024, 2),
+            "active_tb": round((tot-stale)/1024, 2),
+            "stale_percent": round((stale/tot*100), 1) if tot > 0 else 0
+        }
+        response['governance']['risks']['unresolved_sids'] = int(sids)
+
+        # Exposição de dados por servidor (heurística)
+        servers = []
+        for row in latest_fs.to_dict('records'):
+            server = str(row.get('file_server') or row.get('file_server_domain') or 'unknown')
+            perms = int(row.get('no_of_permission_entries', 0) or 0)
+            size = float(row.get('size_of_all_files_and_folders', 0) or 0)
+            score = min(100, int((perms / 1000.0) * 50 + (size / 1000.0) * 50))
+            servers.append({"server": server, "permission_entries": perms, "size_gb": size, "exposure_score": score})
+
+        exp_score = int(sum(s.get('exposure_score', 0) for s in servers) / len(servers)) if servers else 0
+        response['data_exposure'] = {"exposure_score": exp_score, "servers": servers}
+
+        # Mapa de vulnerabilidade do AD: último snapshot (pela data ISO) de cada
+        # domínio, com a soma histórica de SIDs não resolvidos do servidor homônimo
+        with metrics.section('vulnerability_map', 'sql'):
+            try:
+                # Soma de SIDs por chave (file_server e, quando diferente, file_server_domain)
+                # agregada uma vez e ligada aos domínios, em vez de uma subconsulta por domínio
+                fs_table = source.table('FileServerMetrics')
+                keys = [f'SELECT file_server AS key, no_of_folders_with_unresolved_sids AS sids FROM {fs_table}']
+                if source.has_column('FileServerMetrics', 'file_server_domain'):
+                    keys.append(f'SELECT file_server_domain, no_of_folders_with_unresolved_sids FROM {fs_table} '
+                                'WHERE file_server_domain IS NOT file_server')
+                ad_cols = {c: (f'COALESCE(a.{c}, 0)' if source.has_column('ADMetrics', c) else '0')
+                           for c in ('no_of_users', 'no_of_disabled_users', 'no_of_admin_accounts')}
+                rows = source.execute(f"""
+                    WITH unresolved AS (
+                        SELECT key, SUM(sids) AS sids FROM ({' UNION ALL '.join(keys)}) GROUP BY key
+                    )
+                    SELECT a.domain_name, {ad_cols['no_of_users']}, {ad_cols['no_of_disabled_users']},
+                           {ad_cols['no_of_admin_accounts']}, COALESCE(u.sids, 0)
+                    FROM (
+                        SELECT *, ROW_NUMBER() OVER (
+                            PARTITION BY COALESCE(domain_name, 0)
+                            ORDER BY ({source.ad_date} IS NULL) DESC, {source.ad_date} DESC, rowid DESC
+                        ) AS rn FROM {source.table('ADMetrics')}
+                    ) a
+                    LEFT JOIN unresolved u ON u.key = a.domain_name
+                    WHERE a.rn = 1 ORDER BY COALESCE(a.domain_name, 0)
+                """).fetchall()
+
+                vuln_list = []
+                for domain, users_dom, disabled_dom, admins_dom, unresolved in rows:
+                    users_dom, disabled_dom, admins_dom = int(users_dom or 0), int(disabled_dom or 0), int(admins_dom or 0)
+                    unresolved = int(unresolved)
+                    disabled_pct = (disabled_dom / users_dom * 100) if users_dom>0 else 0
+                    score = min(100, int(unresolved * 2 + disabled_pct * 0.6 + (admins_dom / users_dom * 100 if users_dom>0 else 0) * 0.8))
+                    vuln_list.append({"domain": domain, "vuln_score": score, "disabled_pct": round(disabled_pct,1), "admins": admins_dom, "unresolved_sids": unresolved})
+
+                response['ad_vulnerability_map'] = sorted(vuln_list, key=lambda x: x['vuln_score'], reverse=True)
+            except Exception:
+                metrics.section_failed('vulnerability_map', 'sql')
+                response['ad_vulnerability_map'] = []
+                _extra_checks(response, source, latest_fs)
+    except Exception:
+        metrics.section_failed('governance', 'sql')
+
+
+def _extra_checks(response, source, latest_fs):
+    # Mesmas verificações extras do caminho pandas (Varonis / AD / alertas),
+    # executadas nas mesmas condições.
+    try:
+        varonis_events = 0
+        for c in ('no_of_events', 'no_of_events_on_sensitive_files', 'no_of_files_with_hits_selected_rule'):
+            if c in latest_fs.columns:
+                varonis_events += int(latest_fs[c].sum())
+        if varonis_events > 0:
+            response['varonis'] = {'events': int(varonis_events), 'remediation_needed': varonis_events > 0}
+    except Exception:
+        pass
+
+    def ad_latest_sum(col):
+        latest = source.latest_per_domain([col])
+        return int(latest[col].astype(int).sum()) if col in latest.columns else None
+
+    try:
+        vuln = {}
+        if source.execute(f"SELECT COUNT(*) FROM {source.table('ADMetrics')}").fetchone()[0]:
+            for col, key in (('no_of_enabled_but_stale_users', 'enable_but_stale'), ('no_of_executive_accounts', 'executive_accounts')):
+                total = ad_latest_sum(col)
+                if total is not None:
+                    vuln[key] = total
+        if vuln:
+            response['vulnerabilities'] = vuln
+    except Exception:
+        pass
+
+    try:
+        krbtgt_flag = False
+        if source.execute(f"SELECT COUNT(*) FROM {source.table('ADMetrics')}").fetchone()[0]:
+            if (ad_latest_sum('no_of_domains_with_a_delinquent_kerberos_account_password') or 0) > 0:
+                krbtgt_flag = True
+
+        if _flag_count(source, 'flag_kerberos'):
+            krbtgt_flag = True
+        if krbtgt_flag:
+            response['security']['krbtgt_reset_recommended'] = True
+
+        if _flag_count(source, 'flag_itsm_ticket'):
+            response['security']['itsm_integration'] = True
+
+        access_count = _flag_count(source, 'flag_antt_access')
+        if access_count > 0:
+            response['security']['access_antt'] = access_count
+
+        step_count = _flag_count(source, 'flag_step_meeting')
+        if step_count > 0:
+            response['security']['antt_step_meetings'] = step_count
+    except Exception:
+        pass
+
+
+def _flag_count(source, flag, where=None):
+    """Nº de alertas com a flag da ingestão (0 sem a tabela ou sem a coluna)."""
+    try:
+        if not source.has_column('SecurityAlerts', flag):
+            return 0
+    except sqlite3.Error:
+        return 0
+    condition = f' AND {where}' if where else ''
+    return int(source.execute(
+        f"SELECT COUNT(*) FROM {source.table('SecurityAlerts')} WHERE {flag} = 1{condition}").fetchone()[0])
+
+
+SECTION_BUILDERS = {
+    'ad_health': _section_ad_health,
+    'security': _section_security,
+    'governance': _section_governance,
+}
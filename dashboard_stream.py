@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# ==============================================================================
+# ATUALIZAÇÕES DO DASHBOARD AO VIVO (Server-Sent Events)
+# ------------------------------------------------------------------------------
+# Em vez de cada tela aberta buscar /api/v1/dashboard_data num intervalo fixo,
+# o dashboard assina /api/v1/dashboard_data/stream. Uma única thread por
+# processo acompanha a versão dos dados (um stat do arquivo do banco a cada
+# DASHBOARD_STREAM_INTERVAL segundos); quando uma carga publica dados novos,
+# ela obtém o dashboard uma vez (resultado publicado ou snapshot) e monta uma
+# vez os dois eventos possíveis:
+#   - completo: {"version", "full": true, "sections": {...todas...}}
+#   - diferença: {"version", "base", "sections": {...só as que mudaram...}, "removed": [...]}
+# Cada assinante recebe a diferença se já tinha a versão "base" (inclusive ao
+# reconectar com Last-Event-ID) e o evento completo nos demais casos. Assim, N
+# telas abertas custam uma agregação por mudança dos dados, não N por intervalo.
+#
+# Cada conexão ocupa uma thread do servidor enquanto está aberta: com gunicorn,
+# use workers com threads (-k gthread --threads N) ou gevent. Conexões são
+# encerradas após DASHBOARD_STREAM_MAX_SECONDS; o EventSource do navegador
+# reconecta sozinho, enviando o Last-Event-ID.
+# ==============================================================================
+
+POLL_INTERVAL = float(os.environ.get('DASHBOARD_STREAM_INTERVAL', 2))
+HEARTBEAT_SECONDS = float(os.environ.get('DASHBOARD_STREAM_HEARTBEAT', 15))
+MAX_STREAM_SECONDS = float(os.environ.get('DASHBOARD_STREAM_MAX_SECONDS', 300))
+RETRY_MS = 5000
+EVENT_NAME = 'dashboard'
+
+
+def version_id(version):
+    """Identificador curto de uma versão dos dados ({tabela: (linhas, geração)})."""
+    return hashlib.sha1(json.dumps(version, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+class DashboardEvent:
+    __slots__ = ('id', 'base', 'data', 'full', 'delta')
+
+    def __init__(self, event_id, data, previous=None):
+        self.id = event_id
+        self.data = data
+        self.base = previous.id if previous else None
+        self.full = json.dumps({'version': event_id, 'full': True, 'sections': data}, ensure_ascii=False)
+        self.delta = None
+        if previous is not None:
+            changed = {k: v for k, v in data.items() if previous.data.get(k) != v}
+            removed = [k for k in previous.data if k not in data]
+            self.delta = json.dumps({'version': event_id, 'base': previous.id, 'sections': changed,
+                                     'removed': removed}, ensure_ascii=False)
+
+    def payload_for(self, last_id):
+        return self.delta if self.delta is not None and last_id == self.base else self.full
+
+
+def format_event(event_id, data, event=EVENT_NAME):
+    # 'data' é uma linha JSON (json.dumps não gera quebras de linha)
+    return f'id: {event_id}\nevent: {event}\ndata: {data}\n\n'
+
+
+class DashboardFeed:
+    """Versão atual do dashboard, compartilhada entre os assinantes do processo.
+
+    read_version() devolve a versão dos dados (barato: consultado a cada
+    intervalo); read_data(version) devolve o dashboard dessa versão (só é
+    chamado quando ela muda).
+    """
+
+    def __init__(self, read_version, read_data, interval=POLL_INTERVAL):
+        self.read_version = read_version
+        self.read_data = read_data
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._refresh_lock = threading.Lock()
+        self._event = None
+        self._subscribers = 0
+        self._watcher = None
+
+    @property
+    def subscribers(self):
+        return self._subscribers
+
+    def refresh(self):
+        """Publica um evento se a versão dos dados mudou. Retorna o evento atual."""
+        with self._refresh_lock:
+            version = self.read_version()
+            event_id = version_id(version)
+            current = self._event
+            if current is not None and current.id == event_id:
+                return current
+            event = DashboardEvent(event_id, self.read_data(version), current)
+            with self._cond:
+                self._event = event
+                self._cond.notify_all()
+            return event
+
+    def _watch(self):
+        while True:
+            with self._cond:
+                if not self._subscribers:
+                    self._watcher = None
+                    return
+            try:
+                self.refresh()
+            except Exception as e:
+                # Banco em manutenção/ocupado: tenta de novo no próximo intervalo
+                print(f"⚠️ Falha ao atualizar o dashboard ao vivo: {e}")
+            time.sleep(self.interval)
+
+    def _subscribe(self):
+        with self._cond:
+            self._subscribers += 1
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, name='dashboard-feed', daemon=True)
+                self._watcher.start()
+
+    def _unsubscribe(self):
+        with self._cond:
+            self._subscribers -= 1
+
+    def stream(self, last_event_id=None, heartbeat=HEARTBEAT_SECONDS, max_seconds=MAX_STREAM_SECONDS):
+        """Gerador do corpo text/event-stream de um assinante."""
+        self._subscribe()
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            sent = last_event_id or None
+            event = self._event or self.refresh()
+            deadline = time.monotonic() + max_seconds
+            while True:
+                if event is not None and event.id != sent:
+                    yield format_event(event.id, event.payload_for(sent))
+                    sent = event.id
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                with self._cond:
+                    if self._event is event:
+                        self._cond.wait(min(heartbeat, remaining))
+                    changed = self._event is not event
+                    event = self._event
+                if not changed:
+                    # Comentário SSE: mantém a conexão viva em proxies
+                    yield ': ping\n\n'
+        finally:
+            self._unsubscribe()
@@ -0,0 +1,195 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from celery import Celery
+from celery.result import EagerResult
+
+import columnar_cache
+import db_connections
+from alert_rules import ALERTS_TABLE, retag_alerts
+from dashboard_data_processor import DB_PATH, compute_dashboard
+
+# ==============================================================================
+# RECÁLCULO DO DASHBOARD EM SEGUNDO PLANO (Celery)
+# ------------------------------------------------------------------------------
+# Ao fim de cada carga, process_data.py dispara a task 'dashboard.recompute',
+# que calcula o dashboard e publica o resultado (com a versão dos dados usada)
+# num "result store". A API só lê o último resultado publicado.
+#
+#   - CELERY_BROKER_URL não definido: a task roda no próprio processo da
+#     ingestão (modo eager), sem broker nem worker.
+#   - CELERY_BROKER_URL=filesystem:// : fila em disco (.celery/queue), sem
+#     Redis. Worker: celery -A dashboard_tasks worker -P solo
+#   - CELERY_BROKER_URL=redis://... : Redis como broker.
+#
+# A task 'alerts.retag' reclassifica os alertas quando as regras de
+# alert_rules.py mudam e, se algo mudou, recalcula o dashboard em seguida.
+#
+# Result store: DASHBOARD_RESULT_STORE=redis://... publica no Redis; por padrão,
+# arquivo JSON (dashboard_result.json) ao lado do banco.
+# ==============================================================================
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+BROKER_URL = os.environ.get('CELERY_BROKER_URL')
+RESULT_STORE_URL = os.environ.get('DASHBOARD_RESULT_STORE')
+QUEUE_DIR = os.path.join(BASE_DIR, '.celery', 'queue')
+CONTROL_DIR = os.path.join(BASE_DIR, '.celery', 'control')
+RESULT_FILE_NAME = 'dashboard_result.json'
+RESULT_REDIS_KEY = 'antt:dashboard:latest'
+
+celery_app = Celery('antt_dashboard', broker=BROKER_URL or 'memory://')
+celery_app.conf.update(
+    task_always_eager=not BROKER_URL,
+    task_ignore_result=True,
+)
+if BROKER_URL == 'filesystem://':
+    os.makedirs(QUEUE_DIR, exist_ok=True)
+    os.makedirs(CONTROL_DIR, exist_ok=True)
+    celery_app.conf.broker_transport_options = {
+        'data_folder_in': QUEUE_DIR,
+        'data_folder_out': QUEUE_DIR,
+        # Sem isto, o kombu cria a pasta de controle 'control/' no diretório atual
+        'control_folder': CONTROL_DIR,
+        'store_processed': False,
+    }
+
+
+def _version_json(version):
+    # {tabela: (linhas, geração)} no formato em que volta do JSON
+    return {table: list(value) for table, value in version.items()}
+
+
+class FileResultStore:
+    """Último resultado publicado num arquivo JSON (troca atômica; leitura memoizada por mtime)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stat = None
+        self._payload = None
+
+    def publish(self, payload):
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def latest(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        with self._lock:
+            if (st.st_mtime_ns, st.st_size) != self._stat:
+                try:
+                    with open(self.path, encoding='utf-8') as f:
+                        self._payload = json.load(f)
+                except (OSError, ValueError):
+                    return None
+                self._stat = (st.st_mtime_ns, st.st_size)
+            return self._payload
+
+
+class RedisResultStore:
+    def __init__(self, url, key=RESULT_REDIS_KEY):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+
+    def publish(self, payload):
+        self.client.set(self.key, json.dumps(payload, ensure_ascii=False))
+
+    def latest(self):
+        raw = self.client.get(self.key)
+        return json.loads(raw) if raw else None
+
+
+def get_result_store(db_path=DB_PATH):
+    if RESULT_STORE_URL and RESULT_STORE_URL.startswith('redis'):
+        return RedisResultStore(RESULT_STORE_URL)
+    return FileResultStore(os.path.join(os.path.dirname(os.path.abspath(db_path)), RESULT_FILE_NAME))
+
+
+def published_for(payload, version):
+    """Dados do resultado publicado, se ele foi calculado sobre esta versão dos dados; senão None."""
+    if payload and payload.get('data_version') == _version_json(version):
+        return payload.get('data')
+    return None
+
+
+@celery_app.task(name='dashboard.recompute')
+def recompute_dashboard(db_path=DB_PATH):
+    if not os.path.exists(db_path):
+        return None
+    version, data = compute_dashboard(db_path)
+    payload = {
+        'data_version': _version_json(version),
+        'computed_at': datetime.now().isoformat(timespec='seconds'),
+        'data': data,
+    }
+    get_result_store(db_path).publish(payload)
+    return payload['computed_at']
+
+
+def _eager_error(result):
+    # Sem broker a task já rodou no .delay(): a exceção fica guardada no EagerResult
+    if isinstance(result, EagerResult) and result.failed():
+        return result.result
+    return None
+
+
+def trigger_dashboard_recompute(db_path=DB_PATH):
+    """Enfileira o recálculo (ou o executa aqui, sem broker). Retorna True se foi disparado (e, aqui, concluído)."""
+    try:
+        result = recompute_dashboard.delay(db_path)
+    except Exception as e:
+        # Broker fora do ar não deve falhar a carga: recalcula no próprio processo
+        print(f"⚠️ Não foi possível enfileirar o recálculo do dashboard ({e}); recalculando agora.")
+        try:
+            recompute_dashboard(db_path)
+            return True
+        except (sqlite3.Error, OSError) as e:
+            print(f"Erro ao recalcular o dashboard: {e}")
+            return False
+    error = _eager_error(result)
+    if error is not None:
+        print(f"Erro ao recalcular o dashboard: {error}")
+        return False
+    return True
+
+
+@celery_app.task(name='alerts.retag')
+def retag_alerts_task(db_path=DB_PATH, force=False):
+    rows = retag_alerts(db_path, force=force)
+    if rows is not None:
+        print(f"✅ {rows} alertas reclassificados.")
+        if columnar_cache.available():
+            conn = db_connections.connect(db_path)
+            try:
+                columnar_cache.write_table(conn, db_path, ALERTS_TABLE)
+            finally:
+                conn.close()
+        recompute_dashboard(db_path)
+    return rows
+
+
+def trigger_alert_retag(db_path=DB_PATH, force=False):
+    """Enfileira a reclassificação dos alertas (ou a executa aqui, sem broker). Retorna True se foi disparada (e, aqui, concluída)."""
+    try:
+        result = retag_alerts_task.delay(db_path, force)
+    except Exception as e:
+        print(f"⚠️ Não foi possível enfileirar a reclassificação dos alertas ({e}); reclassificando agora.")
+        try:
+            retag_alerts_task(db_path, force)
+            return True
+        except (sqlite3.Error, OSError, ValueError) as e:
+            print(f"Erro ao reclassificar os alertas: {e}")
+            return False
+    error = _eager_error(result)
+    if error is not None:
+        print(f"Erro ao reclassificar os alertas: {error}")
+        return False
+    return True
@@ -0,0 +1,132 @@
+import os
+import threading
+from datetime import datetime
+
+from db_connections import read_connection
+
+# ==============================================================================
+# Versão dos dados carregados no SQLite
+# ------------------------------------------------------------------------------
+# A ingestão (process_data.py) incrementa um contador de geração por tabela a
+# cada carga. Os consumidores (snapshot do dashboard, caches da API) usam o par
+# (nº de linhas, geração) de cada tabela como "versão" dos dados: se nada mudou,
+# nada precisa ser recalculado.
+# ==============================================================================
+
+VERSION_TABLE = 'DataVersion'
+LOAD_HISTORY_TABLE = 'LoadHistory'
+TRACKED_TABLES = ('ADMetrics', 'SecurityAlerts', 'FileServerMetrics')
+
+
+def ensure_version_table(conn):
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+        "table_name TEXT PRIMARY KEY, "
+        "generation INTEGER NOT NULL DEFAULT 0, "
+        "loaded_at TEXT)"
+    )
+
+
+def bump_generation(conn, table_name):
+    """Registra uma nova carga da tabela. Deve rodar na mesma transação da carga."""
+    ensure_version_table(conn)
+    conn.execute(
+        f"INSERT INTO {VERSION_TABLE} (table_name, generation, loaded_at) VALUES (?, 1, ?) "
+        "ON CONFLICT(table_name) DO UPDATE SET generation = generation + 1, loaded_at = excluded.loaded_at",
+        (table_name, datetime.now().isoformat(timespec='seconds'))
+    )
+
+
+def read_data_version(conn, tables=TRACKED_TABLES):
+    """Retorna {tabela: (nº de linhas, geração)}. Tabelas ausentes viram (None, 0)."""
+    existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    generations = {}
+    if VERSION_TABLE in existing:
+        generations = dict(conn.execute(f"SELECT table_name, generation FROM {VERSION_TABLE}").fetchall())
+
+    version = {}
+    for t in tables:
+        rows = conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] if t in existing else None
+        version[t] = (rows, generations.get(t, 0))
+    return version
+
+
+# ------------------------------------------------------------------------------
+# Histórico de cargas e marca d'água (high-water mark) por tabela
+# ------------------------------------------------------------------------------
+
+def ensure_load_history_table(conn):
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {LOAD_HISTORY_TABLE} ("
+        "id INTEGER PRIMARY KEY, table_name TEXT NOT NULL, source TEXT, mode TEXT, "
+        "rows_read INTEGER, rows_inserted INTEGER, rows_updated INTEGER, "
+        "high_water_mark TEXT, loaded_at TEXT)"
+    )
+
+
+def record_load(conn, table_name, source, mode, rows_read, rows_inserted, rows_updated, high_water_mark):
+    ensure_load_history_table(conn)
+    conn.execute(
+        f"INSERT INTO {LOAD_HISTORY_TABLE} (table_name, source, mode, rows_read, rows_inserted, "
+        "rows_updated, high_water_mark, loaded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (table_name, source, mode, rows_read, rows_inserted, rows_updated, high_water_mark,
+         datetime.now().isoformat(timespec='seconds'))
+    )
+
+
+def read_high_water_mark(conn, table_name):
+    """Maior marca d'água carregada desde a última carga completa (None se não houver)."""
+    ensure_load_history_table(conn)
+    return conn.execute(
+        f"SELECT MAX(high_water_mark) FROM {LOAD_HISTORY_TABLE} WHERE table_name = ? AND id >= "
+        f"COALESCE((SELECT MAX(id) FROM {LOAD_HISTORY_TABLE} WHERE table_name = ? AND mode = 'full'), 0)",
+        (table_name, table_name)
+    ).fetchone()[0]
+
+
+# ------------------------------------------------------------------------------
+# Versão em memória para validadores HTTP (ETag / Last-Modified)
+# ------------------------------------------------------------------------------
+
+def read_loaded_at(conn):
+    """Retorna {tabela: loaded_at (ISO, horário local)} da última carga de cada tabela."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (VERSION_TABLE,)).fetchone():
+        return {}
+    return dict(conn.execute(f"SELECT table_name, loaded_at FROM {VERSION_TABLE}").fetchall())
+
+
+class DataVersionTracker:
+    """Mantém a versão dos dados em memória e só consulta o banco quando os arquivos mudam.
+
+    A "assinatura" é o mtime/tamanho do arquivo do banco e do -wal: toda escrita
+    (carga, migração) altera um deles. Enquanto ela não muda, get() é só um stat.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._signature = None
+        self._version = {}
+        self._loaded_at = {}
+
+    def _file_signature(self):
+        signature = []
+        for path in (self.db_path, self.db_path + '-wal'):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def get(self):
+        """Retorna ({tabela: (linhas, geração)}, {tabela: loaded_at})."""
+        signature = self._file_signature()
+        with self._lock:
+            if signature != self._signature:
+                version, loaded_at = {}, {}
+                if signature[0] is not None:
+                    conn = read_connection(self.db_path)
+                    version, loaded_at = read_data_version(conn), read_loaded_at(conn)
+                self._signature, self._version, self._loaded_at = signature, version, loaded_at
+            return self._version, self._loaded_at
@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import threading
+
+import metrics
+
+# ==============================================================================
+# CONEXÕES SQLITE AJUSTADAS (API, dashboard e ingestão)
+# ------------------------------------------------------------------------------
+# Todas as conexões ao banco passam por aqui:
+#   - journal_mode=WAL (persistente no arquivo): leitores continuam lendo
+#     enquanto a ingestão grava, e a gravação não espera os leitores;
+#   - busy_timeout: espera um lock em vez de falhar na hora;
+#   - query_only nas conexões de leitura: a API e o dashboard não gravam;
+#   - conexões de leitura reaproveitadas por thread (uma por thread e por
+#     banco), em vez de uma conexão nova a cada cálculo.
+# mmap_size, cache_size e temp_store são ajustáveis pelo ambiente
+# (SQLITE_MMAP_SIZE em bytes, SQLITE_CACHE_SIZE_KIB, SQLITE_TEMP_STORE=MEMORY),
+# mas ficam nos padrões do SQLite: com o banco no cache do sistema operacional,
+# as consultas do dashboard (benchmarks/bench_api.py, 10^5 linhas) ficaram de
+# 5% a 35% mais lentas com cada um deles. Valem para bancos maiores que a
+# memória livre ou discos lentos.
+# ==============================================================================
+
+MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 0)
+CACHE_SIZE_KIB = int(os.environ.get('SQLITE_CACHE_SIZE_KIB') or 0)
+TEMP_STORE = os.environ.get('SQLITE_TEMP_STORE', '').upper()
+BUSY_TIMEOUT_MS = 5000
+
+_wal_checked = set()
+_wal_lock = threading.Lock()
+_local = threading.local()
+
+
+def configure(conn, read_only=True):
+    """Aplica os PRAGMAs a uma conexão (sqlite3 ou DBAPI do SQLAlchemy)."""
+    if MMAP_SIZE:
+        conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+    if CACHE_SIZE_KIB:
+        conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KIB}')
+    if TEMP_STORE in ('DEFAULT', 'FILE', 'MEMORY'):
+        conn.execute(f'PRAGMA temp_store = {TEMP_STORE}')
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    if read_only:
+        conn.execute('PRAGMA query_only = ON')
+    return conn
+
+
+def enable_wal(db_path):
+    """Coloca o banco em modo WAL (uma vez por processo). Retorna False se não foi possível."""
+    db_path = os.path.abspath(db_path)
+    with _wal_lock:
+        if db_path in _wal_checked:
+            return True
+        if not os.path.exists(db_path):
+            return False
+        try:
+            conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+            try:
+                mode = conn.execute('PRAGMA journal_mode = WAL').fetchone()[0]
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            # Banco somente leitura ou ocupado: segue no modo atual
+            return False
+        _wal_checked.add(db_path)
+        return mode == 'wal'
+
+
+def connect(db_path, read_only=True, **kwargs):
+    """Nova conexão ajustada, com as consultas contabilizadas nas métricas."""
+    if read_only:
+        enable_wal(db_path)
+    return configure(metrics.connect(db_path, **kwargs), read_only)
+
+
+def connect_for_write(db_path, **kwargs):
+    """Conexão de gravação (ingestão/migração): WAL, synchronous=NORMAL e os mesmos ajustes."""
+    conn = configure(sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, **kwargs), read_only=False)
+    conn.execute('PRAGMA journal_mode = WAL')
+    # Em WAL, NORMAL só sincroniza nos checkpoints; um commit continua atômico
+    conn.execute('PRAGMA synchronous = NORMAL')
+    return conn
+
+
+def read_connection(db_path):
+    """Conexão de leitura da thread atual para o banco (reaberta se o arquivo foi trocado)."""
+    db_path = os.path.abspath(db_path)
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    st = os.stat(db_path)
+    identity = (st.st_dev, st.st_ino)
+    cached = connections.get(db_path)
+    if cached is not None:
+        conn, cached_identity = cached
+        if cached_identity == identity:
+            return conn
+        conn.close()
+    conn = connect(db_path)
+    connections[db_path] = (conn, identity)
+    return conn
+
+
+def configure_engine(engine, read_only=True):
+    """Aplica configure() a cada conexão nova do pool de um Engine do SQLAlchemy."""
+    from sqlalchemy import event
+
+    if engine.url.database:
+        enable_wal(engine.url.database)
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_conn, connection_record):
+        configure(dbapi_conn, read_only)
@@ -0,0 +1,307 @@
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+import alert_rules
+import alert_search
+import rollups
+from data_version import TRACKED_TABLES, bump_generation
+from db_connections import connect_for_write
+
+# ==============================================================================
+# ESQUEMA DO BANCO SQLITE
+# ------------------------------------------------------------------------------
+# Todas as tabelas de dados têm 'id INTEGER PRIMARY KEY' (usado pelos modelos
+# da API), colunas de data normalizadas e índices para os filtros, ordenações e
+# "último snapshot por grupo" da API e do dashboard:
+#   - ADMetrics / FileServerMetrics: 'date' (ex: 01.jan.2024) -> 'date_iso' (YYYY-MM-DD)
+#   - SecurityAlerts: 'alert_time' em ISO 8601 canônico + 'alert_epoch' (segundos)
+#     + colunas flag_* da classificação dos alertas (alert_rules.py)
+# e, a partir da v2, rollups diários de cada tabela (rollups.py). A v3 indexa
+# file_server_domain (filtros de domínio do dashboard, dashboard_scope.py) e
+# recria os rollups de alertas, agora agrupados também por file_server_domain.
+# A v4 cria o índice de busca textual dos alertas (FTS5, alert_search.py).
+# A ingestão cria as tabelas já neste formato (e marca o banco com
+# SCHEMA_VERSION); upgrade_database() migra um antt_data.db antigo no lugar.
+# Ela roda na inicialização da API e da ingestão, ou manualmente:
+# python db_schema.py [caminho do banco].
+# ==============================================================================
+
+SCHEMA_VERSION = 4
+
+TABLE_INDEXES = {
+    'ADMetrics': {
+        'ix_admetrics_domain_date': ('domain_name', 'date_iso'),
+    },
+    'FileServerMetrics': {
+        'ix_fileservermetrics_server_date': ('file_server', 'date_iso'),
+        'ix_fileservermetrics_domain_date': ('file_server_domain', 'date_iso'),
+    },
+    'SecurityAlerts': {
+        'ix_securityalerts_status_severity': ('status', 'alert_severity'),
+        'ix_securityalerts_alert_time': ('alert_time',),
+        'ix_securityalerts_domain_time': ('file_server_domain', 'alert_time'),
+    },
+}
+
+# Chave natural de cada tabela: cargas incrementais fazem upsert por ela
+TABLE_KEYS = {
+    'SecurityAlerts': ('alert_id',),
+    'FileServerMetrics': ('date', 'file_server'),
+    'ADMetrics': ('date', 'domain_name'),
+}
+
+# Coluna usada como marca d'água (high-water mark) das cargas
+HIGH_WATER_COLUMNS = {
+    'SecurityAlerts': 'alert_time',
+    'FileServerMetrics': 'date_iso',
+    'ADMetrics': 'date_iso',
+}
+
+_DATE_FORMATS = ('%d.%b.%Y', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%d/%m/%Y')
+
+
+def parse_date(value):
+    """Equivalente a pd.to_datetime(..., dayfirst=True, errors='coerce') para um valor.
+
+    Retorna 'YYYY-MM-DD HH:MM:SS' (ordenável como texto) ou None.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            continue
+    try:
+        return pd.to_datetime(value, dayfirst=True).strftime('%Y-%m-%d %H:%M:%S')
+    except Exception:
+        return None
+
+
+def normalize_date(value):
+    parsed = parse_date(value)
+    return parsed[:10] if parsed else None
+
+
+def normalize_alert_time(value):
+    parsed = parse_date(value)
+    return parsed.replace(' ', 'T') if parsed else value
+
+
+def alert_epoch(value):
+    parsed = parse_date(value)
+    if not parsed:
+        return None
+    return int((datetime.strptime(parsed, '%Y-%m-%d %H:%M:%S') - datetime(1970, 1, 1)).total_seconds())
+
+
+def register_functions(conn):
+    conn.create_function('antt_date', 1, parse_date, deterministic=True)
+    conn.create_function('antt_date_iso', 1, normalize_date, deterministic=True)
+    conn.create_function('antt_alert_time', 1, normalize_alert_time, deterministic=True)
+    conn.create_function('antt_alert_epoch', 1, alert_epoch, deterministic=True)
+
+
+def _map_unique(series, func):
+    # Poucas datas distintas por carga: converte cada valor uma única vez
+    mapping = {v: func(v) for v in series.dropna().unique()}
+    return series.map(mapping)
+
+
+def normalize_frame(df, table_name):
+    """Acrescenta/normaliza as colunas de data (e as flags dos alertas) de um DataFrame recém-lido do CSV."""
+    if table_name in ('ADMetrics', 'FileServerMetrics') and 'date' in df.columns:
+        df['date_iso'] = _map_unique(df['date'], normalize_date)
+    if table_name == 'SecurityAlerts' and 'alert_time' in df.columns:
+        df['alert_time'] = _map_unique(df['alert_time'], normalize_alert_time)
+        df['alert_epoch'] = _map_unique(df['alert_time'], alert_epoch).astype('Int64')
+    if table_name == 'SecurityAlerts':
+        alert_rules.tag_frame(df)
+    return df
+
+
+def _sqlite_type(dtype):
+    # Mesmo mapeamento que o pandas usa em to_sql() para o sqlite3
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'TIMESTAMP'
+    return 'TEXT'
+
+
+def create_table(conn, table_name, df):
+    """(Re)cria a tabela com 'id INTEGER PRIMARY KEY' e as colunas tipadas do DataFrame."""
+    columns = ', '.join(f'"{c}" {_sqlite_type(t)}' for c, t in df.dtypes.items() if c != 'id')
+    conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+    conn.execute(f'CREATE TABLE "{table_name}" (id INTEGER PRIMARY KEY, {columns})')
+    # Tabela já no esquema atual: um banco novo não precisa passar pela migração
+    # (a ingestão migra as tabelas antigas antes da carga, _run_load)
+    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+
+def insert_frame(conn, table_name, df):
+    columns = [c for c in df.columns if c != 'id']
+    placeholders = ', '.join('?' for _ in columns)
+    names = ', '.join(f'"{c}"' for c in columns)
+    values = df[columns].astype(object).where(df[columns].notna(), None)
+    conn.executemany(
+        f'INSERT INTO "{table_name}" ({names}) VALUES ({placeholders})',
+        values.itertuples(index=False, name=None)
+    )
+
+
+def add_missing_columns(conn, table_name, df):
+    """Acrescenta à tabela as colunas novas do DataFrame (exports podem ganhar colunas)."""
+    existing = set(table_columns(conn, table_name))
+    for c, t in df.dtypes.items():
+        if c not in existing and c != 'id':
+            conn.execute(f'ALTER TABLE "{table_name}" ADD COLUMN "{c}" {_sqlite_type(t)}')
+
+
+def ensure_unique_key(conn, table_name):
+    """Garante o índice único da chave natural, removendo duplicatas antigas (fica a de maior id)."""
+    keys = TABLE_KEYS[table_name]
+    cols = ', '.join(keys)
+    not_null = ' AND '.join(f'{k} IS NOT NULL' for k in keys)
+    name = f'ux_{table_name.lower()}_key'
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", (name,)).fetchone():
+        return
+    conn.execute(
+        f'DELETE FROM "{table_name}" WHERE {not_null} AND id NOT IN '
+        f'(SELECT MAX(id) FROM "{table_name}" WHERE {not_null} GROUP BY {cols})'
+    )
+    conn.execute(f'CREATE UNIQUE INDEX {name} ON "{table_name}" ({cols})')
+
+
+def upsert_frame(conn, table_name, df):
+    """Insere ou atualiza pela chave natural; linhas idênticas às gravadas não são reescritas.
+
+    Retorna o nº de linhas inseridas ou atualizadas (sem as escritas dos gatilhos, ex: alert_search.py).
+    """
+    keys = TABLE_KEYS[table_name]
+    columns = [c for c in df.columns if c != 'id']
+    updates = [c for c in columns if c not in keys]
+    names = ', '.join(f'"{c}"' for c in columns)
+    placeholders = ', '.join('?' for _ in columns)
+    sql = f'INSERT INTO "{table_name}" ({names}) VALUES ({placeholders}) ON CONFLICT ({", ".join(keys)}) '
+    if updates:
+        set_clause = ', '.join(f'"{c}" = excluded."{c}"' for c in updates)
+        changed = ' OR '.join(f'"{table_name}"."{c}" IS NOT excluded."{c}"' for c in updates)
+        sql += f'DO UPDATE SET {set_clause} WHERE {changed}'
+    else:
+        sql += 'DO NOTHING'
+    values = df[columns].astype(object).where(df[columns].notna(), None)
+    return conn.executemany(sql, values.itertuples(index=False, name=None)).rowcount
+
+
+def high_water_mark(df, table_name):
+    col = HIGH_WATER_COLUMNS.get(table_name)
+    if col not in df.columns or df[col].dropna().empty:
+        return None
+    return str(df[col].dropna().max())
+
+
+def table_columns(conn, table_name):
+    return [r[1] for r in conn.execute(f'PRAGMA table_info("{table_name}")')]
+
+
+def create_indexes(conn, table_name):
+    columns = set(table_columns(conn, table_name))
+    for name, cols in TABLE_INDEXES.get(table_name, {}).items():
+        if columns.issuperset(cols):
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON "{table_name}" ({", ".join(cols)})')
+    if table_name == 'SecurityAlerts':
+        alert_rules.ensure_flag_indexes(conn)
+
+
+# ==============================================================================
+# MIGRAÇÃO DE BANCOS EXISTENTES
+# ==============================================================================
+
+def _add_primary_key(conn, table_name):
+    # Reconstrói a tabela com 'id' = rowid original, preservando tipos declarados
+    info = conn.execute(f'PRAGMA table_info("{table_name}")').fetchall()
+    columns = ', '.join(f'"{c[1]}" {c[2]}'.rstrip() for c in info)
+    names = ', '.join(f'"{c[1]}"' for c in info)
+    tmp = f'_{table_name}_old'
+    conn.execute(f'ALTER TABLE "{table_name}" RENAME TO "{tmp}"')
+    conn.execute(f'CREATE TABLE "{table_name}" (id INTEGER PRIMARY KEY, {columns})')
+    conn.execute(f'INSERT INTO "{table_name}" (id, {names}) SELECT rowid, {names} FROM "{tmp}"')
+    conn.execute(f'DROP TABLE "{tmp}"')
+
+
+def upgrade_table(conn, table_name):
+    """Aplica à tabela só os passos de migração que faltam. Retorna True se alterou dados."""
+    columns = table_columns(conn, table_name)
+    if not columns:
+        return False
+    changed = False
+
+    if 'id' not in columns:
+        _add_primary_key(conn, table_name)
+        changed = True
+
+    if table_name in ('ADMetrics', 'FileServerMetrics') and 'date' in columns and 'date_iso' not in columns:
+        conn.execute(f'ALTER TABLE "{table_name}" ADD COLUMN date_iso TEXT')
+        conn.execute(f'UPDATE "{table_name}" SET date_iso = antt_date_iso(date)')
+        changed = True
+
+    if table_name == 'SecurityAlerts' and 'alert_time' in columns and 'alert_epoch' not in columns:
+        conn.execute('ALTER TABLE SecurityAlerts ADD COLUMN alert_epoch INTEGER')
+        conn.execute('UPDATE SecurityAlerts SET alert_time = antt_alert_time(alert_time)')
+        conn.execute('UPDATE SecurityAlerts SET alert_epoch = antt_alert_epoch(alert_time)')
+        changed = True
+
+    create_indexes(conn, table_name)
+    return changed
+
+
+def upgrade_database(db_path):
+    """Leva o banco à versão SCHEMA_VERSION (idempotente). Retorna True se migrou algo."""
+    if not os.path.exists(db_path):
+        return False
+    # isolation_level=None: controlamos a transação, que também cobre os DDLs
+    conn = connect_for_write(db_path, isolation_level=None)
+    try:
+        current = conn.execute('PRAGMA user_version').fetchone()[0]
+        if current >= SCHEMA_VERSION:
+            return False
+        register_functions(conn)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+                # Outro processo (ex: outro worker da API) migrou enquanto esperávamos o lock
+                conn.execute('ROLLBACK')
+                return False
+            for table_name in TRACKED_TABLES:
+                if upgrade_table(conn, table_name):
+                    bump_generation(conn, table_name)
+                # v2/v3: rollups diários (rollups.py) a partir da tabela já migrada
+                rollups.update(conn, table_name)
+                if table_name == 'SecurityAlerts':
+                    # Colunas flag_* com as regras atuais (alert_rules.py) e, v4, índice de busca textual
+                    alert_rules.retag(conn)
+                    alert_search.update(conn)
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('ANALYZE')
+        return True
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.abspath(os.path.dirname(__file__)), 'antt_data.db')
+    if upgrade_database(path):
+        print(f"✅ Banco migrado para o esquema v{SCHEMA_VERSION}: {path}")
+    else:
+        print(f"Banco já está no esquema v{SCHEMA_VERSION} (ou não existe): {path}")
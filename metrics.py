@@ -0,0 +1,238 @@
+import contextvars
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# ==============================================================================
+# INSTRUMENTAÇÃO (métricas no formato Prometheus + tempos por requisição)
+# ------------------------------------------------------------------------------
+# Histogramas e contadores em memória, por processo (com vários workers do
+# gunicorn, cada um expõe os seus), servidos em /metrics no formato texto do
+# Prometheus. Durante uma requisição, os tempos de cada etapa (consultas ao
+# banco, seções do dashboard) também vão para um RequestTimings, de onde sai
+# o cabeçalho Server-Timing opcional.
+# ==============================================================================
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f'{self.name}_total{_format_labels(self.labels, key)} {_format_value(value)}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}   # rótulos -> [contagem por bucket..., +Inf], soma
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = ('le', _format_value(bound))
+                yield f'{self.name}_bucket{_format_labels(self.labels, key, [le])} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}'
+            yield f'{self.name}_count{_format_labels(self.labels, key)} {cumulative}'
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.register(Histogram(
+    'antt_http_request_duration_seconds', 'Tempo de resposta das requisições HTTP.',
+    ('endpoint', 'method', 'status')))
+REQUEST_QUERIES = registry.register(Histogram(
+    'antt_http_request_db_queries', 'Consultas ao banco por requisição HTTP.',
+    ('endpoint',), COUNT_BUCKETS))
+QUERY_DURATION = registry.register(Histogram(
+    'antt_db_query_duration_seconds', 'Tempo de execução das consultas ao banco.',
+    ('endpoint',), QUERY_BUCKETS))
+SECTION_DURATION = registry.register(Histogram(
+    'antt_dashboard_section_duration_seconds', 'Tempo de cálculo de cada seção do dashboard.',
+    ('section', 'backend')))
+SECTION_ERRORS = registry.register(Counter(
+    'antt_dashboard_section_errors', 'Seções do dashboard que falharam (a resposta mantém os valores padrão).',
+    ('section', 'backend')))
+
+
+# ==============================================================================
+# TEMPOS DA REQUISIÇÃO ATUAL
+# ==============================================================================
+
+class RequestTimings:
+    __slots__ = ('endpoint', 'started', 'stages', 'queries', 'query_seconds')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = {}    # etapa -> segundos (somados, se repetida)
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self):
+        """Valor do cabeçalho Server-Timing (durações em ms)."""
+        total = (time.perf_counter() - self.started) * 1000
+        entries = [f'db;desc="{self.queries} consultas";dur={self.query_seconds * 1000:.2f}']
+        entries += [f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.stages.items()]
+        entries.append(f'total;dur={total:.2f}')
+        return ', '.join(entries)
+
+
+_current = contextvars.ContextVar('antt_request_timings', default=None)
+
+
+def start_request(endpoint):
+    timings = RequestTimings(endpoint)
+    _current.set(timings)
+    return timings
+
+
+def finish_request(method, status):
+    """Registra a requisição atual nos histogramas e a encerra. Retorna os seus RequestTimings."""
+    timings = _current.get()
+    if timings is None:
+        return None
+    _current.set(None)
+    REQUEST_DURATION.observe(time.perf_counter() - timings.started,
+                             endpoint=timings.endpoint, method=method, status=status)
+    REQUEST_QUERIES.observe(timings.queries, endpoint=timings.endpoint)
+    return timings
+
+
+def record_query(seconds):
+    timings = _current.get()
+    if timings is not None:
+        timings.queries += 1
+        timings.query_seconds += seconds
+    QUERY_DURATION.observe(seconds, endpoint=timings.endpoint if timings else 'background')
+
+
+@contextmanager
+def section(name, backend):
+    """Mede uma seção do dashboard (histograma + Server-Timing da requisição atual)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        SECTION_DURATION.observe(seconds, section=name, backend=backend)
+        timings = _current.get()
+        if timings is not None:
+            timings.add_stage(f'section-{name}', seconds)
+
+
+def section_failed(name, backend):
+    SECTION_ERRORS.inc(section=name, backend=backend)
+
+
+# ==============================================================================
+# CONEXÕES SQLITE INSTRUMENTADAS (consultas fora do SQLAlchemy)
+# ------------------------------------------------------------------------------
+# Mede o execute() (no SQLite, o passo até a primeira linha: ordenações e
+# agrupamentos inclusos), como os eventos de cursor do SQLAlchemy na API.
+# ==============================================================================
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(time.perf_counter() - started)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connect(database, **kwargs):
+    """sqlite3.connect() com as consultas contabilizadas nas métricas."""
+    return sqlite3.connect(database, factory=InstrumentedConnection, **kwargs)
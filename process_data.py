@@ -1,6 +1,27 @@
+import argparse
+import codecs
+import fnmatch
+import glob
+import io
 import pandas as pd
-import sqlite3
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+
+import alert_rules
+import alert_search
+import columnar_cache
+import db_connections
+import rollups
+from dashboard_tasks import trigger_dashboard_recompute
+from data_version import TRACKED_TABLES, bump_generation, read_data_version, read_high_water_mark, record_load
+from db_schema import (
+    TABLE_KEYS, add_missing_columns, create_indexes, create_table, ensure_unique_key,
+    high_water_mark, insert_frame, normalize_frame, table_columns, upgrade_database, upsert_frame,
+)
 
 # Definir o nome do banco de dados
 DB_NAME = 'antt_data.db'
@@ -16,6 +37,23 @@ file_to_table = {
     'ANTT-14d01.csv': 'ADMetrics'
 }
 
+# Padrões de nome dos exports, para cargas de diretórios/globs (ex: vários meses)
+EXPORT_PATTERNS = (
+    ('ANTT-14a01*.csv', 'FileServerMetrics'),
+    ('Alerts_*.csv', 'SecurityAlerts'),
+    ('ANTT-14d01*.csv', 'ADMetrics'),
+)
+
+# Leitura em blocos: memória de pico limitada pelo tamanho do bloco, não do arquivo
+CHUNK_SIZE = 50_000
+ENCODING_SAMPLE_BYTES = 1024 * 1024
+# Tamanho das faixas de bytes lidas por cada processo na carga paralela
+PARALLEL_CHUNK_BYTES = 16 * 1024 * 1024
+
+# Tabelas de snapshots periódicos: linhas anteriores à marca d'água já foram
+# carregadas e não mudam, então a carga incremental as ignora
+SNAPSHOT_TABLES = ('FileServerMetrics', 'ADMetrics')
+
 def clean_column_name(col):
     # Remove caracteres especiais e substitui espaços por underscores
     col = col.replace('﻿', '').strip()
@@ -26,59 +64,408 @@ def clean_column_name(col):
     # Converte para minúsculas
     return col.lower()
 
-def process_csv_to_sqlite(file_path, table_name):
-    print(f"Processando {file_path} para a tabela {table_name}...")
+def detect_encoding(file_path, sample_bytes=ENCODING_SAMPLE_BYTES):
+    """Detecta o encoding uma única vez, a partir do início do arquivo (UTF-8 ou latin1)."""
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_bytes)
+    try:
+        # final=False: um caractere multibyte cortado no fim da amostra não é erro
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin1'
+
+def read_export_chunks(file_path, table_name, encoding, chunk_size=CHUNK_SIZE):
+    """Lê o CSV em blocos de `chunk_size` linhas, já com colunas limpas e datas normalizadas."""
+    columns = None
+    for chunk in pd.read_csv(file_path, encoding=encoding, chunksize=chunk_size):
+        # Limpar nomes das colunas (calculados uma vez, no primeiro bloco)
+        if columns is None:
+            columns = [clean_column_name(col) for col in chunk.columns]
+        chunk.columns = columns
+        # Datas normalizadas (date_iso / alert_time ISO + alert_epoch)
+        yield normalize_frame(chunk, table_name)
+
+def connect_for_load(db_path):
+    # WAL: leitores (API/dashboard) continuam lendo enquanto a carga grava.
+    # isolation_level=None: a transação é controlada explicitamente (inclui os DDLs)
+    return db_connections.connect_for_write(db_path, isolation_level=None)
+
+def _load_chunks(conn, chunks, file_path, table_name, incremental):
+    stats = {'rows_read': 0, 'rows_loaded': 0, 'inserted': 0, 'updated': 0, 'hwm': None}
+    keys = list(TABLE_KEYS[table_name])
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        hwm = None
+        table_ready = False
+        rows_before = changed = 0
+        # Dias tocados pela carga incremental (None: o rollup diário é recriado inteiro)
+        dirty = None
+        for chunk in chunks:
+            stats['rows_read'] += len(chunk)
+
+            if not table_ready:
+                if incremental and table_columns(conn, table_name):
+                    add_missing_columns(conn, table_name, chunk)
+                elif chunk.empty and table_columns(conn, table_name):
+                    # Export só com o cabeçalho: sem linhas não há tipos a inferir, então a
+                    # tabela mantém o esquema (tipado) da carga anterior e só é esvaziada
+                    add_missing_columns(conn, table_name, chunk)
+                    conn.execute(f'DELETE FROM "{table_name}"')
+                else:
+                    # Recria a tabela (esquema limpo, com 'id' e tipos inferidos do primeiro bloco)
+                    create_table(conn, table_name, chunk)
+                if incremental:
+                    ensure_unique_key(conn, table_name)
+                    hwm = read_high_water_mark(conn, table_name)
+                    rows_before = conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+                    if rollups.is_current(conn, table_name):
+                        dirty = set()
+                table_ready = True
+
+            if incremental:
+                # Sem chave não há como deduplicar: linhas com chave vazia são descartadas
+                chunk = chunk[chunk[keys].notna().all(axis=1)]
+                # (bloco vazio de um arquivo só com cabeçalho: date_iso sem tipo de texto, nada a filtrar)
+                if hwm and table_name in SNAPSHOT_TABLES and 'date_iso' in chunk.columns and not chunk.empty:
+                    chunk = chunk[~(chunk['date_iso'] < hwm)]
+                if dirty is not None:
+                    dirty |= rollups.affected_days(conn, table_name, chunk)
+                changed += upsert_frame(conn, table_name, chunk)
+            else:
+                insert_frame(conn, table_name, chunk)
+            stats['rows_loaded'] += len(chunk)
+            stats['hwm'] = max(filter(None, [stats['hwm'], high_water_mark(chunk, table_name)]), default=None)
+
+        if not table_ready:
+            # Nenhum bloco (nem o vazio de um arquivo só com cabeçalho): a tabela fica como está
+            conn.execute("ROLLBACK")
+            return stats
+
+        if incremental:
+            stats['inserted'] = conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0] - rows_before
+            stats['updated'] = changed - stats['inserted']
+            stats['hwm'] = max(filter(None, [hwm, stats['hwm']]), default=None)
+        else:
+            create_indexes(conn, table_name)
+            stats['inserted'] = stats['rows_loaded']
+            if table_name == 'SecurityAlerts':
+                # Tabela inteira classificada agora, com as regras atuais
+                alert_rules.record_rules(conn)
+
+        if stats['inserted'] or stats['updated']:
+            # Nova geração de carga: invalida o snapshot do dashboard
+            bump_generation(conn, table_name)
+        rollups.update(conn, table_name, dirty)
+        if table_name == 'SecurityAlerts':
+            # Índice de busca textual: reconstruído na carga completa; na incremental os gatilhos já o mantiveram
+            alert_search.update(conn, full=not incremental)
+        record_load(conn, table_name, os.path.basename(file_path), 'incremental' if incremental else 'full',
+                    stats['rows_read'], stats['inserted'], stats['updated'], stats['hwm'])
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return stats
+
+def _run_load(file_path, table_name, incremental, load):
+    # Moldura comum às cargas: conexão, mensagens, esquema e vazão. load(conn) grava e retorna as estatísticas
+    if incremental:
+        print(f"Carga incremental de {file_path} para a tabela {table_name}...")
+    else:
+        print(f"Processando {file_path} para a tabela {table_name}...")
     try:
-        # Tenta ler o CSV com diferentes encodings
+        started = time.perf_counter()
+        db_path = os.path.join(PROJECT_DIR, DB_NAME)
+        # Banco antigo: migra antes da carga (create_table marca o banco com a versão atual)
+        upgrade_database(db_path)
+        conn = connect_for_load(db_path)
         try:
-            df = pd.read_csv(file_path, encoding='utf-8')
-        except UnicodeDecodeError:
-            df = pd.read_csv(file_path, encoding='latin1')
-        
-        # Limpar nomes das colunas
-        df.columns = [clean_column_name(col) for col in df.columns]
-        
-        # Conectar ao banco de dados
-        conn = sqlite3.connect(os.path.join(PROJECT_DIR, DB_NAME))
-        
-        # Inserir dados no SQLite. 'if_exists='replace'' para garantir um esquema limpo
-        # Usamos 'dtype' para tentar inferir os tipos de dados do SQLite
-        df.to_sql(table_name, conn, if_exists='replace', index=False)
-        
-        # Obter o esquema da tabela para verificação
-        cursor = conn.execute(f"PRAGMA table_info({table_name})")
-        schema = cursor.fetchall()
-        print(f"Esquema da tabela {table_name}:")
-        for col in schema:
-            print(f"  {col[1]} ({col[2]})")
-            
-        conn.close()
-        print(f"Processamento de {file_path} concluído.")
+            stats = load(conn)
+
+            if not incremental:
+                # Obter o esquema da tabela para verificação
+                cursor = conn.execute(f"PRAGMA table_info({table_name})")
+                schema = cursor.fetchall()
+                print(f"Esquema da tabela {table_name}:")
+                for col in schema:
+                    print(f"  {col[1]} ({col[2]})")
+        finally:
+            conn.close()
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        if not stats['rows_read']:
+            print(f"⚠️ {file_path} não tem linhas de dados: tabela {table_name} "
+                  f"{'mantida como estava' if incremental else 'vazia'}.")
+        if incremental:
+            print(f"  {stats['rows_read']} linhas lidas, {stats['rows_loaded']} a partir da marca d'água: "
+                  f"{stats['inserted']} novas, {stats['updated']} atualizadas.")
+        print(f"Processamento de {file_path} concluído: {stats['rows_read']} linhas em {elapsed:.2f}s "
+              f"({stats['rows_read'] / elapsed:,.0f} linhas/s).")
         return True
     except Exception as e:
         print(f"Erro ao processar {file_path}: {e}")
         return False
 
-def main():
+def load_csv(file_path, table_name, incremental=False, chunk_size=CHUNK_SIZE):
+    """Carrega um CSV em blocos, numa única transação (memória limitada pelo tamanho do bloco).
+
+    Carga completa recria a tabela; a incremental faz upsert pela chave natural
+    da tabela (TABLE_KEYS), sem apagar o histórico.
+    """
+    def load(conn):
+        encoding = detect_encoding(file_path)
+        try:
+            chunks = read_export_chunks(file_path, table_name, encoding, chunk_size)
+            return _load_chunks(conn, chunks, file_path, table_name, incremental)
+        except UnicodeDecodeError:
+            # A amostra era UTF-8 válido, mas o restante do arquivo não
+            chunks = read_export_chunks(file_path, table_name, 'latin1', chunk_size)
+            return _load_chunks(conn, chunks, file_path, table_name, incremental)
+
+    return _run_load(file_path, table_name, incremental, load)
+
+def process_csv_to_sqlite(file_path, table_name):
+    return load_csv(file_path, table_name)
+
+def append_csv_to_sqlite(file_path, table_name):
+    return load_csv(file_path, table_name, incremental=True)
+
+# ==============================================================================
+# CARGA PARALELA
+# ------------------------------------------------------------------------------
+# Os processos do pool leem, decodificam e normalizam faixas de bytes dos CSVs
+# (vários arquivos e vários trechos de um arquivo grande ao mesmo tempo). Só o
+# processo principal escreve no SQLite: consome os blocos na ordem original do
+# arquivo, numa transação por arquivo, sem disputa pelo lock do banco.
+# Opcional (--workers N): os blocos são faixas de PARALLEL_CHUNK_BYTES, não de
+# --chunk-size linhas. O encoding é detectado uma vez por arquivo e vale para
+# todas as faixas; se alguma não decodifica, o arquivo inteiro é relido em
+# latin1 (como na carga sequencial), nunca com encodings misturados.
+# ==============================================================================
+
+def table_for_file(file_path):
+    name = os.path.basename(file_path)
+    for pattern, table_name in EXPORT_PATTERNS:
+        if fnmatch.fnmatch(name, pattern):
+            return table_name
+    return None
+
+def collect_exports(sources):
+    """Expande arquivos, diretórios e globs em [(caminho, tabela)], em ordem de nome."""
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            found = glob.glob(os.path.join(source, '*.csv'))
+        elif any(c in source for c in '*?['):
+            found = glob.glob(source)
+        else:
+            found = [source]
+        paths.extend(sorted(found))
+    return [(path, table_for_file(path)) for path in dict.fromkeys(paths)]
+
+def split_ranges(file_path, chunk_bytes=PARALLEL_CHUNK_BYTES):
+    """Divide o CSV em faixas de ~chunk_bytes que terminam em fim de registro.
+
+    Retorna (fim do cabeçalho, [(início, fim), ...]). Um '\n' só encerra um
+    registro se o número de aspas antes dele for par (campos entre aspas podem
+    conter quebras de linha; aspas escapadas vêm em pares).
+    """
+    ranges = []
+    start = header_end = None
+    offset = quotes = next_cut = 0
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            i = 0
+            while True:
+                nl = block.find(b'\n', max(i, next_cut - offset))
+                if nl < 0:
+                    break
+                quotes += block.count(b'"', i, nl)
+                i = nl + 1
+                if quotes % 2:
+                    continue
+                cut = offset + i
+                if start is None:
+                    header_end = cut
+                else:
+                    ranges.append((start, cut))
+                start = cut
+                next_cut = cut + chunk_bytes
+            quotes += block.count(b'"', i)
+            offset += len(block)
+    if header_end is None:
+        # Só o cabeçalho, sem quebra de linha
+        return offset, []
+    if start < offset:
+        ranges.append((start, offset))
+    return header_end, ranges
+
+def read_columns(file_path, encoding):
+    return [clean_column_name(col) for col in pd.read_csv(file_path, encoding=encoding, nrows=0).columns]
+
+def _parse_range(index, file_path, table_name, encoding, columns, start, end):
+    # Executa no pool: retorna (índice do arquivo, DataFrame normalizado ou a exceção)
+    try:
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        # Sem fallback por faixa: o UnicodeDecodeError volta ao escritor, que relê o arquivo todo
+        text = data.decode(encoding)
+        if text.strip():
+            df = pd.read_csv(io.StringIO(text), header=None, names=columns)
+        else:
+            df = pd.DataFrame(columns=columns)
+        return index, normalize_frame(df, table_name)
+    except Exception as e:
+        return index, e
+
+def _ordered_results(executor, tasks, window):
+    # Mantém no máximo `window` blocos em voo: a memória fica limitada mesmo se a escrita for mais lenta
+    pending = deque()
+    for task in tasks:
+        pending.append(executor.submit(_parse_range, *task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def _raise_errors(items):
+    for _, result in items:
+        if isinstance(result, Exception):
+            raise result
+        yield result
+
+def load_parallel(jobs, workers, chunk_bytes=PARALLEL_CHUNK_BYTES, chunk_size=CHUNK_SIZE):
+    """Carrega [(caminho, tabela, incremental)] com `workers` processos de leitura e um único escritor.
+
+    chunk_size só vale para a releitura sequencial em latin1 de um arquivo cuja
+    amostra parecia UTF-8 mas que tem bytes inválidos adiante.
+    """
+    tasks, failed = [], {}
+    for index, (file_path, table_name, _) in enumerate(jobs):
+        try:
+            encoding = detect_encoding(file_path)
+            columns = read_columns(file_path, encoding)
+            header_end, ranges = split_ranges(file_path, chunk_bytes)
+        except Exception as e:
+            failed[index] = e
+            continue
+        # Arquivo só com cabeçalho ainda gera um bloco (vazio) para a tabela ser criada
+        for start, end in ranges or [(header_end, header_end)]:
+            tasks.append((index, file_path, table_name, encoding, columns, start, end))
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        groups = groupby(_ordered_results(executor, tasks, workers * 2), key=itemgetter(0))
+        for index, (file_path, table_name, incremental) in enumerate(jobs):
+            if index in failed:
+                print(f"Erro ao processar {file_path}: {failed[index]}")
+                results.append(False)
+                continue
+            _, items = next(groups)
+
+            def load(conn):
+                try:
+                    return _load_chunks(conn, _raise_errors(items), file_path, table_name, incremental)
+                except UnicodeDecodeError:
+                    # A transação do arquivo foi desfeita: relê tudo em latin1
+                    chunks = read_export_chunks(file_path, table_name, 'latin1', chunk_size)
+                    return _load_chunks(conn, chunks, file_path, table_name, incremental)
+
+            results.append(_run_load(file_path, table_name, incremental, load))
+    return results
+
+def data_version(db_path):
+    """{tabela: (nº de linhas, geração)} do banco ({} se ele ainda não existe)."""
+    if not os.path.exists(db_path):
+        return {}
+    conn = db_connections.connect(db_path)
+    try:
+        return read_data_version(conn)
+    finally:
+        conn.close()
+
+def main(incremental=False, chunk_size=CHUNK_SIZE, sources=None, workers=1):
     # Criar o diretório do projeto se não existir
     if not os.path.exists(PROJECT_DIR):
         os.makedirs(PROJECT_DIR)
-        
+
+    db_path = os.path.join(PROJECT_DIR, DB_NAME)
+    # Versão dos dados antes da migração/reclassificação/cargas: só o que mudou é republicado
+    version_before = data_version(db_path)
+    # Migra tabelas de cargas antigas para o esquema atual (id, datas normalizadas, índices)
+    upgrade_database(db_path)
+    # Regras de classificação dos alertas mudaram: reclassifica antes das cargas incrementais
+    retagged = alert_rules.retag_alerts(db_path)
+    if retagged is not None:
+        print(f"✅ {retagged} alertas reclassificados com as regras atuais.")
+
+    if sources:
+        exports = collect_exports(sources)
+    else:
+        exports = [(os.path.join(UPLOAD_DIR, file_name), table_name) for file_name, table_name in file_to_table.items()]
+
     all_successful = True
-    for file_name, table_name in file_to_table.items():
-        file_path = os.path.join(UPLOAD_DIR, file_name)
+    jobs, loaded = [], set()
+    for file_path, table_name in exports:
         if not os.path.exists(file_path):
             print(f"Arquivo não encontrado: {file_path}")
             all_successful = False
             continue
-        
-        if not process_csv_to_sqlite(file_path, table_name):
-            all_successful = False
-            
+        if table_name is None:
+            print(f"Arquivo ignorado (nome não corresponde a nenhum export conhecido): {file_path}")
+            continue
+        # Vários exports da mesma tabela (ex: meses acumulados): só o primeiro recria a tabela
+        jobs.append((file_path, table_name, incremental or table_name in loaded))
+        loaded.add(table_name)
+
+    if workers > 1 and jobs:
+        results = load_parallel(jobs, workers, chunk_size=chunk_size)
+    else:
+        results = [load_csv(path, table, incremental=inc, chunk_size=chunk_size) for path, table, inc in jobs]
+    if not all(results):
+        all_successful = False
+
+    # Tabelas com nova geração (carga com linhas novas/alteradas, migração ou
+    # reclassificação): recarga idêntica não regrava o cache nem recalcula o dashboard
+    version_after = data_version(db_path)
+    changed = {t for t in TRACKED_TABLES if version_after.get(t) != version_before.get(t)}
+    if loaded and not changed:
+        print("Nenhuma tabela mudou: cache colunar e dashboard mantidos.")
+
+    # Cache colunar (Arrow) das tabelas que mudaram, para leituras analíticas
+    if changed and columnar_cache.available():
+        conn = db_connections.connect(db_path)
+        try:
+            for table_name in sorted(changed):
+                if columnar_cache.write_table(conn, db_path, table_name):
+                    print(f"Cache colunar atualizado: {columnar_cache.cache_path(db_path, table_name)}")
+                else:
+                    print(f"Cache colunar de {table_name} não gerado (as leituras usarão o SQLite).")
+        finally:
+            conn.close()
+
+    # Recalcula e publica o dashboard (worker Celery, ou aqui mesmo sem broker)
+    if changed and trigger_dashboard_recompute(db_path):
+        print("Recálculo do dashboard disparado.")
+
     if all_successful:
         print("Todos os arquivos CSV foram processados e o banco de dados foi criado com sucesso.")
     else:
         print("Ocorreram erros durante o processamento dos arquivos CSV.")
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Carrega os CSVs exportados no banco SQLite.")
+    parser.add_argument('sources', nargs='*',
+                        help=f"Arquivos, diretórios ou globs de exports (padrão: os arquivos de {UPLOAD_DIR})")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Faz upsert pela chave natural (Alert ID, data + servidor/domínio) em vez de recriar as tabelas")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f"Linhas por bloco de leitura/inserção na carga sequencial (padrão: {CHUNK_SIZE})")
+    parser.add_argument('--workers', type=int, nargs='?', default=1, const=0,
+                        help="Processos de leitura em paralelo (padrão: 1 = carga sequencial; --workers sem valor: "
+                             "nº de CPUs). A carga paralela lê faixas de bytes e ignora --chunk-size")
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+    main(incremental=args.incremental, chunk_size=args.chunk_size, sources=args.sources, workers=workers)
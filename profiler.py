@@ -0,0 +1,162 @@
+import cProfile
+import hmac
+import os
+import pstats
+import re
+import threading
+import time
+from datetime import datetime
+
+# ==============================================================================
+# PROFILER DE REQUISIÇÕES (opcional)
+# ------------------------------------------------------------------------------
+# Captura um perfil cProfile de requisições individuais, para investigar em
+# produção uma carga lenta que não se reproduz com o banco de exemplo:
+#   - PROFILE_TOKEN=<segredo>: qualquer rota com ?profile=<segredo> (ou o
+#     cabeçalho X-Profile-Token) é perfilada;
+#   - PROFILE_REQUESTS=/api/v1/dashboard_data,...: prefixos de rota sempre
+#     perfilados.
+# Cada perfil vira um arquivo .prof (pstats) em PROFILE_DIR, num anel com os
+# PROFILE_KEEP mais recentes; a resposta perfilada traz o nome no cabeçalho
+# X-Profile-Id. Com o token, /profiles lista os perfis e /profiles/<nome>
+# baixa o .prof ou, com ?format=speedscope, o JSON para https://speedscope.app.
+# Desligado (sem token nem prefixos), o custo é um teste de booleano por requisição.
+# ==============================================================================
+
+PROFILE_KEEP = 20
+PROFILE_SUFFIX = '.prof'
+# Ramos com menos que esta fração do tempo total ficam fora do speedscope
+SPEEDSCOPE_MIN_FRACTION = 0.001
+SPEEDSCOPE_MAX_DEPTH = 128
+
+_SLUG = re.compile(r'[^A-Za-z0-9]+')
+
+
+class RequestProfiler:
+    def __init__(self, directory, token=None, prefixes=(), keep=PROFILE_KEEP):
+        self.directory = directory
+        self.token = token or None
+        self.prefixes = tuple(p for p in prefixes if p)
+        self.keep = keep
+        # O cProfile mede uma requisição por vez; as concorrentes seguem sem perfil
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.token or self.prefixes)
+
+    def authorized(self, provided):
+        return bool(self.token and provided) and hmac.compare_digest(provided.encode(), self.token.encode())
+
+    def wanted(self, path, provided_token):
+        # Prefixos sempre perfilados; fora deles, só com o token
+        return bool(self.prefixes and path.startswith(self.prefixes)) or self.authorized(provided_token)
+
+    def start(self):
+        """Inicia um perfil (ou None se outra requisição já está sendo perfilada)."""
+        if not self._lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.started = time.perf_counter()
+        profile.enable()
+        return profile
+
+    def stop(self, profile, method, path):
+        """Encerra o perfil e grava no anel. Retorna o nome do arquivo."""
+        try:
+            profile.disable()
+            elapsed_ms = (time.perf_counter() - profile.started) * 1000
+            stamp = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+            slug = _SLUG.sub('_', path).strip('_') or 'root'
+            name = f'{stamp}-{method}-{slug[:80]}-{elapsed_ms:.0f}ms{PROFILE_SUFFIX}'
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(os.path.join(self.directory, name))
+            self._trim()
+            return name
+        finally:
+            self._lock.release()
+
+    def discard(self, profile):
+        profile.disable()
+        self._lock.release()
+
+    def list(self):
+        """Perfis gravados, do mais recente para o mais antigo."""
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(PROFILE_SUFFIX)]
+        except OSError:
+            return []
+        return sorted(names, reverse=True)
+
+    def _trim(self):
+        for name in self.list()[self.keep:]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+def _frame_name(func):
+    filename, line, name = func
+    return {'name': name, 'file': filename, 'line': line}
+
+
+def to_speedscope(stats_path):
+    """Converte um .prof (pstats) no formato 'sampled' do speedscope.
+
+    O cProfile não guarda pilhas, só tempos por par chamador -> chamado: as
+    pilhas são reconstruídas a partir das raízes, repartindo o tempo de cada
+    função entre os chamados na proporção desses tempos (aproximação usual dos
+    flame graphs de cProfile).
+    """
+    stats = pstats.Stats(stats_path).stats
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    roots = [(func, ct) for func, (_, _, _, ct, callers) in stats.items() if not callers]
+    total = sum(ct for _, ct in roots) or 1e-9
+    frames, frame_index = [], {}
+    samples, weights = [], []
+
+    def index(func):
+        if func not in frame_index:
+            frame_index[func] = len(frames)
+            frames.append(_frame_name(func))
+        return frame_index[func]
+
+    def walk(func, budget, stack):
+        if budget < total * SPEEDSCOPE_MIN_FRACTION or len(stack) >= SPEEDSCOPE_MAX_DEPTH:
+            return
+        _, _, tt, ct, _ = stats[func]
+        scale = budget / ct if ct else 0
+        stack = stack + [index(func)]
+        self_time = tt * scale
+        if self_time > 0:
+            samples.append(stack)
+            weights.append(self_time)
+        for callee, edge_ct in callees.get(func, ()):
+            # Recursão: a função já está na pilha, o tempo fica no nível atual
+            if index(callee) not in stack:
+                walk(callee, edge_ct * scale, stack)
+
+    for func, ct in roots:
+        walk(func, ct, [])
+
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': os.path.basename(stats_path),
+        'exporter': 'antt profiler.py',
+        'activeProfileIndex': 0,
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': os.path.basename(stats_path),
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        }],
+    }
@@ -0,0 +1,135 @@
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # dependência opcional: sem ela, só gzip
+    brotli = None
+
+# ==============================================================================
+# COMPRESSÃO E CACHE DE RESPOSTAS CODIFICADAS
+# ------------------------------------------------------------------------------
+# Respostas JSON das leituras da API ficam em memória já codificadas (e, sob
+# demanda, já comprimidas em gzip/brotli), indexadas pelo ETag do recurso. Como
+# o ETag inclui a versão dos dados, uma nova carga gera chaves novas e as
+# entradas antigas saem pelo LRU. Uma requisição repetida custa só a busca.
+# ==============================================================================
+
+MIN_COMPRESS_BYTES = 512
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def supported_encodings():
+    # Ordem de preferência do servidor em caso de empate na qualidade
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encodings):
+    """Escolhe a codificação a partir do Accept-Encoding (werkzeug Accept). None = identity."""
+    best, best_quality = None, 0
+    for encoding in supported_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    # mtime=0: mesma entrada, mesmos bytes (o ETag da representação continua válido)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """Comprime um iterável de bytes bloco a bloco (respostas em streaming)."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            # Z_SYNC_FLUSH: cada lote chega ao cliente sem esperar o buffer encher
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class CachedResponse:
+    __slots__ = ('body', 'mimetype', 'headers', 'encoded')
+
+    def __init__(self, body, mimetype, headers):
+        self.body = body
+        self.mimetype = mimetype
+        self.headers = headers
+        self.encoded = {}
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(v) for v in self.encoded.values())
+
+    def get(self, encoding):
+        """(bytes, codificação efetiva) na codificação pedida, comprimindo uma única vez."""
+        if encoding is None or len(self.body) < MIN_COMPRESS_BYTES:
+            return self.body, None
+        if encoding not in self.encoded:
+            self.encoded[encoding] = compress(self.body, encoding)
+        return self.encoded[encoding], encoding
+
+
+class ResponseCache:
+    """LRU de CachedResponse por chave (ETag), limitado pelo total de bytes."""
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        if entry.size > self.max_bytes // 4:
+            # Respostas muito grandes expulsariam todo o resto do cache
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._evict()
+
+    def encode(self, key, entry, encoding):
+        """entry.get(encoding), contabilizando no limite os bytes comprimidos novos."""
+        with self._lock:
+            before = entry.size
+            data, used = entry.get(encoding)
+            if self._entries.get(key) is entry:
+                self._bytes += entry.size - before
+                self._evict()
+            return data, used
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
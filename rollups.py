@@ -0,0 +1,245 @@
+import json
+import re
+import sqlite3
+from datetime import datetime
+
+from data_version import VERSION_TABLE
+
+# ==============================================================================
+# ROLLUPS DIÁRIOS (séries temporais pré-agregadas)
+# ------------------------------------------------------------------------------
+# A ingestão mantém, junto com cada carga, tabelas com uma linha por dia e grupo:
+#   - AlertDailyRollup: nº de alertas por dia, severidade, categoria, status,
+#     modelo de ameaça e file server/domínio (dia = 'YYYY-MM-DD' do alert_time ISO);
+#   - ADDailyRollup / ADDailyTotals: soma das métricas por dia (date_iso) e
+#     domínio / só por dia.
+# A timeline de alertas e a evolução do AD no dashboard leem algumas centenas
+# de linhas daqui em vez de varrer o histórico bruto. Carga completa recria o
+# rollup da tabela; carga incremental recalcula só os dias tocados pelo lote
+# (inclusive o dia antigo de um alerta atualizado).
+# RollupState guarda a geração (data_version.py) da tabela de origem em que o
+# rollup foi atualizado: se não bate com a atual, os leitores voltam a agregar
+# a tabela bruta.
+# ==============================================================================
+
+STATE_TABLE = 'RollupState'
+
+ALERT_TIME_GLOB = '[0-9][0-9][0-9][0-9]-[0-1][0-9]-[0-3][0-9]*'
+ALERT_DAY = f"CASE WHEN alert_time GLOB '{ALERT_TIME_GLOB}' THEN substr(alert_time, 1, 10) END"
+_ALERT_DAY = re.compile(r'[0-9]{4}-[0-1][0-9]-[0-3][0-9]')
+
+
+def alert_day(value):
+    """ALERT_DAY para um valor em Python: 'YYYY-MM-DD' do alert_time ISO, ou None."""
+    return value[:10] if isinstance(value, str) and _ALERT_DAY.match(value) else None
+
+
+# Tabela de origem -> (coluna de data, expressão do dia)
+DAY_COLUMNS = {
+    'SecurityAlerts': ('alert_time', ALERT_DAY),
+    'ADMetrics': ('date_iso', 'date_iso'),
+    'FileServerMetrics': ('date_iso', 'date_iso'),
+}
+
+AD_MEASURES = (
+    'no_of_users', 'no_of_disabled_users', 'no_of_admin_accounts', 'no_of_disable_admin_accounts',
+    'no_of_service_accounts', 'no_of_enabled_but_stale_users', 'no_of_executive_accounts',
+)
+
+# Rollup -> (tabela de origem, grupos além do dia, coluna de contagem, métricas somadas).
+# Grupos e métricas ausentes na origem ficam fora do rollup. ADDailyTotals (só o
+# dia) existe porque o AD tem uma linha por domínio e dia: a evolução somaria
+# tantas linhas do rollup por domínio quanto da tabela bruta.
+ROLLUPS = {
+    'AlertDailyRollup': (
+        'SecurityAlerts', ('alert_severity', 'alert_category', 'status', 'threat_model_name', 'file_server_domain'),
+        'alerts', ()),
+    'ADDailyRollup': ('ADMetrics', ('domain_name',), 'snapshots', AD_MEASURES),
+    'ADDailyTotals': ('ADMetrics', (), 'snapshots', AD_MEASURES),
+}
+# Rollups que deixaram de ser mantidos: removidos na próxima recriação dos rollups da origem
+RETIRED_ROLLUPS = {'FileServerDailyRollup': 'FileServerMetrics'}
+
+
+def _columns(conn, table_name):
+    return [r[1] for r in conn.execute(f'PRAGMA table_info("{table_name}")')]
+
+
+def _rollups_of(table_name):
+    return [rollup for rollup, spec in ROLLUPS.items() if spec[0] == table_name]
+
+
+def _generation(conn, table_name):
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (VERSION_TABLE,)).fetchone():
+        return 0
+    row = conn.execute(f"SELECT generation FROM {VERSION_TABLE} WHERE table_name=?", (table_name,)).fetchone()
+    return row[0] if row else 0
+
+
+def _layout(conn, rollup):
+    """Colunas do rollup conforme a origem atual, ou None se a origem não tem a coluna de data."""
+    table_name, keys, count_column, measures = ROLLUPS[rollup]
+    source = set(_columns(conn, table_name))
+    if DAY_COLUMNS[table_name][0] not in source:
+        return None
+    return [k for k in keys if k in source], count_column, [m for m in measures if m in source]
+
+
+def _up_to_date_layout(conn, rollup, layout):
+    # O rollup tem exatamente as colunas que a origem atual pede (ex: não é de um esquema anterior)
+    return layout is not None and _columns(conn, rollup) == ['day', *layout[0], layout[1], *layout[2]]
+
+
+def is_current(conn, table_name):
+    """True se os rollups da tabela refletem a geração atual dos dados."""
+    try:
+        row = conn.execute(f"SELECT generation FROM {STATE_TABLE} WHERE table_name=?", (table_name,)).fetchone()
+        return row is not None and row[0] == _generation(conn, table_name)
+    except sqlite3.Error:
+        return False
+
+
+def record(conn, table_name):
+    """Marca os rollups da tabela como atualizados na geração atual (na mesma transação da carga)."""
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} ("
+        "table_name TEXT PRIMARY KEY, generation INTEGER NOT NULL, updated_at TEXT)"
+    )
+    conn.execute(
+        f"INSERT OR REPLACE INTO {STATE_TABLE} (table_name, generation, updated_at) VALUES (?, ?, ?)",
+        (table_name, _generation(conn, table_name), datetime.now().isoformat(timespec='seconds'))
+    )
+
+
+def _insert(conn, rollup, layout, where='1', params=()):
+    table_name = ROLLUPS[rollup][0]
+    keys, count_column, measures = layout
+    names = ', '.join(['day', *keys, count_column, *measures])
+    select = ', '.join(['day', *keys, 'COUNT(*)', *(f'SUM(COALESCE("{m}", 0))' for m in measures)])
+    group = ', '.join(['day', *keys])
+    conn.execute(
+        f'INSERT INTO "{rollup}" ({names}) SELECT {select} '
+        f'FROM (SELECT {DAY_COLUMNS[table_name][1]} AS day, * FROM "{table_name}" WHERE {where}) '
+        f'WHERE day IS NOT NULL GROUP BY {group}',
+        params
+    )
+
+
+def _create(conn, rollup, layout):
+    keys, count_column, measures = layout
+    conn.execute(f'DROP TABLE IF EXISTS "{rollup}"')
+    # Grupos sem tipo declarado: guardam o valor como está na origem (os filtros comparam iguais)
+    columns = ', '.join(['day TEXT NOT NULL', *(f'"{k}"' for k in keys), f'{count_column} INTEGER NOT NULL',
+                         *(f'"{m}" NUMERIC' for m in measures)])
+    conn.execute(f'CREATE TABLE "{rollup}" ({columns})')
+    conn.execute(f'CREATE INDEX "ix_{rollup.lower()}_day" ON "{rollup}" (day)')
+
+
+def rebuild(conn, table_name):
+    """Recria os rollups da tabela a partir dela inteira."""
+    for rollup in [r for r, source in RETIRED_ROLLUPS.items() if source == table_name]:
+        conn.execute(f'DROP TABLE IF EXISTS "{rollup}"')
+    for rollup in _rollups_of(table_name):
+        layout = _layout(conn, rollup)
+        if layout is None:
+            conn.execute(f'DROP TABLE IF EXISTS "{rollup}"')
+            continue
+        _create(conn, rollup, layout)
+        _insert(conn, rollup, layout)
+    record(conn, table_name)
+
+
+def affected_days(conn, table_name, df):
+    """Dias cujos rollups mudam com o upsert do lote (chamar antes do upsert).
+
+    Nos snapshots a data faz parte da chave natural, então basta o lote; nos
+    alertas, um alerta atualizado pode mudar de dia e o dia antigo também conta.
+    """
+    date_column = DAY_COLUMNS[table_name][0]
+    if date_column not in df.columns:
+        return set()
+    values = df[date_column].dropna()
+    if table_name != 'SecurityAlerts':
+        return {str(v) for v in values}
+    days = {alert_day(v) for v in values} - {None}
+    if 'alert_id' in df.columns:
+        ids = json.dumps(df['alert_id'].dropna().astype(str).tolist())
+        days.update(r[0] for r in conn.execute(
+            f"SELECT DISTINCT {ALERT_DAY} FROM SecurityAlerts WHERE alert_id IN (SELECT value FROM json_each(?))",
+            (ids,)
+        ) if r[0] is not None)
+    return days
+
+
+def refresh(conn, table_name, days):
+    """Recalcula só os dias informados (refaz tudo se o esquema da origem mudou)."""
+    layouts = {rollup: _layout(conn, rollup) for rollup in _rollups_of(table_name)}
+    for rollup, layout in layouts.items():
+        if not _up_to_date_layout(conn, rollup, layout):
+            rebuild(conn, table_name)
+            return
+    if days:
+        date_column, day = DAY_COLUMNS[table_name]
+        days = sorted(days)
+        in_days = json.dumps(days)
+        # Faixa na coluna de data (usa o índice de alert_time) + o dia exato de cada linha
+        upper = days[-1][:-1] + chr(ord(days[-1][-1]) + 1)
+        where = f'"{date_column}" >= ? AND "{date_column}" < ? AND {day} IN (SELECT value FROM json_each(?))'
+        for rollup, layout in layouts.items():
+            conn.execute(f'DELETE FROM "{rollup}" WHERE day IN (SELECT value FROM json_each(?))', (in_days,))
+            _insert(conn, rollup, layout, where, (days[0], upper, in_days))
+    record(conn, table_name)
+
+
+def update(conn, table_name, days=None):
+    """Atualiza os rollups após uma carga: days=None recria tudo; senão recalcula esses dias."""
+    if days is None:
+        rebuild(conn, table_name)
+    else:
+        refresh(conn, table_name, days)
+
+
+# ==============================================================================
+# LEITURA (dashboard): None quando o rollup não existe ou está desatualizado
+# ==============================================================================
+
+def _readable(conn, table_name, rollup):
+    return is_current(conn, table_name) and _up_to_date_layout(conn, rollup, _layout(conn, rollup))
+
+
+def alert_timeline(conn, where='1', scope=None):
+    """[(dia, nº de alertas)] em ordem de dia, só dos alertas que satisfazem `where` (e o recorte)."""
+    try:
+        if not _readable(conn, 'SecurityAlerts', 'AlertDailyRollup'):
+            return None
+        params = {}
+        if scope:
+            condition, params = scope.rollup_condition('SecurityAlerts', _columns(conn, 'AlertDailyRollup'))
+            where = f"({where}) AND {condition}"
+        return conn.execute(
+            f"SELECT day, SUM(alerts) FROM AlertDailyRollup WHERE {where} GROUP BY day ORDER BY day", params
+        ).fetchall()
+    except sqlite3.Error:
+        return None
+
+
+def ad_evolution(conn, scope=None):
+    """[(dia, usuários, desabilitados)] somados entre domínios, em ordem de dia.
+
+    Com um recorte por domínio, soma as linhas do domínio em ADDailyRollup.
+    """
+    try:
+        rollup = 'ADDailyRollup' if scope and scope.domain else 'ADDailyTotals'
+        if not _readable(conn, 'ADMetrics', rollup):
+            return None
+        if not scope:
+            return conn.execute(
+                "SELECT day, no_of_users, no_of_disabled_users FROM ADDailyTotals ORDER BY day"
+            ).fetchall()
+        condition, params = scope.rollup_condition('ADMetrics', _columns(conn, rollup))
+        return conn.execute(
+            f"SELECT day, SUM(no_of_users), SUM(no_of_disabled_users) FROM {rollup} "
+            f"WHERE {condition} GROUP BY day ORDER BY day", params
+        ).fetchall()
+    except sqlite3.Error:
+        return None
@@ -0,0 +1,156 @@
+import csv
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# app.py e dashboard_data_processor.py leem ANTT_DB_PATH ao serem importados
+# (inclusive como valor padrão de parâmetros): definido antes de qualquer
+# import do projeto, nenhum teste toca o antt_data.db do repositório
+API_DIR = tempfile.mkdtemp(prefix='antt-tests-')
+os.environ['ANTT_DB_PATH'] = os.path.join(API_DIR, 'antt_data.db')
+
+# ==============================================================================
+# BANCO DE TESTE
+# ------------------------------------------------------------------------------
+# Exports pequenos, no formato dos CSVs do Varonis (mesmos cabeçalhos das
+# colunas usadas pela API e pelo dashboard), carregados pelo process_data num
+# diretório temporário. Os alertas têm empates de alert_time e alertas sem
+# data, para a paginação por cursor.
+# ==============================================================================
+
+ALERT_HEADER = ['Threat Model Name', 'Alert Time', 'File Server/Domain', 'User Name', 'Alert Severity',
+                'Asset', 'Alert Category', 'Alert ID', 'Department', 'SAM Account Name', 'Close Reason', 'Status']
+FS_HEADER = ['Date', 'File Server', 'No of Folders', 'No of Files', 'No of Permission Entries',
+             'Size of all Files and Folders GB', 'Size of Folders with Stale Data GB',
+             'No of Folders with Unresolved SIDs']
+AD_HEADER = ['Date', 'Domain Name', 'No of Groups', 'No of Users', 'No of Computer Accounts', 'No of Admin Accounts',
+             'No of Disabled Users']
+
+USERS = ['Márcia Florêncio (antt.gov.br)', 'Rafael Souza (antt.gov.br)', 'João Lima (antt.gov.br)']
+
+
+def alert_rows():
+    rows = []
+    for i in range(12):
+        # Quatro alertas por horário: empates de alert_time entre páginas
+        alert_time = f'2025-04-{10 + i // 4:02d}T15:31:00'
+        rows.append([
+            'Abnormal admin behavior' if i % 3 else 'Deletion of sensitive files', alert_time, 'Exchange Online2',
+            USERS[i % 3], 'High' if i % 2 else 'Medium', 'SRVB403', 'Exploitation', f'ALERT-{i:04d}',
+            'SUTEC', USERS[i % 3].split()[0].lower(), '', 'Open' if i % 4 else 'Closed',
+        ])
+    # Sem alert_time: ficam no fim da ordem decrescente
+    for i in range(12, 15):
+        rows.append(['Abnormal admin behavior', '', 'SRVB403', USERS[0], 'Low', 'SRVB403', 'Exploitation',
+                     f'ALERT-{i:04d}', 'SUTEC', 'marcia', '', 'Open'])
+    return rows
+
+
+def fs_rows():
+    return [
+        ['01.jan.2025', 'SRVB403', 951533, 8635629, 2975571, 17153, 4000, 12],
+        ['01.jan.2025', 'Exchange', 40123, 14053790, 342704, 2868, 100, 0],
+        ['01.feb.2025', 'SRVB403', 951600, 8636000, 2975600, 17200, 4100, 10],
+        ['01.feb.2025', 'Exchange', 40200, 14054000, 342800, 2870, 120, 1],
+    ]
+
+
+def ad_rows():
+    return [
+        ['01.jan.2025', 'antt.gov.br', 3300, 9300, 4700, 90, 5500],
+        ['01.feb.2025', 'antt.gov.br', 3308, 9325, 4722, 91, 5557],
+    ]
+
+
+def write_csv(path, header, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return str(path)
+
+
+def write_exports(folder):
+    """Grava os três exports em `folder`; retorna {tabela: caminho}."""
+    return {
+        'SecurityAlerts': write_csv(folder / 'Alerts_20250714_000000000_0.csv', ALERT_HEADER, alert_rows()),
+        'FileServerMetrics': write_csv(folder / 'ANTT-14a01.csv', FS_HEADER, fs_rows()),
+        'ADMetrics': write_csv(folder / 'ANTT-14d01.csv', AD_HEADER, ad_rows()),
+    }
+
+
+@pytest.fixture
+def exports(tmp_path):
+    folder = tmp_path / 'upload'
+    folder.mkdir()
+    return write_exports(folder)
+
+
+def load_exports(project_dir, exports):
+    import process_data
+
+    original = process_data.PROJECT_DIR
+    process_data.PROJECT_DIR = str(project_dir)
+    try:
+        for table_name, path in exports.items():
+            assert process_data.load_csv(path, table_name)
+    finally:
+        process_data.PROJECT_DIR = original
+    return os.path.join(str(project_dir), process_data.DB_NAME)
+
+
+@pytest.fixture
+def project_dir(tmp_path, monkeypatch):
+    """Diretório do projeto do process_data apontado para um diretório temporário."""
+    import process_data
+
+    folder = tmp_path / 'project'
+    folder.mkdir()
+    monkeypatch.setattr(process_data, 'PROJECT_DIR', str(folder))
+    return folder
+
+
+@pytest.fixture
+def loaded_db(project_dir, exports):
+    """Banco com a carga completa dos três exports."""
+    return load_exports(project_dir, exports)
+
+
+@pytest.fixture
+def db(loaded_db):
+    conn = sqlite3.connect(loaded_db)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(scope='session')
+def api_db():
+    """Banco servido pela API nos testes (ANTT_DB_PATH)."""
+    db_path = load_exports(API_DIR, write_exports(Path(API_DIR)))
+    assert db_path == os.environ['ANTT_DB_PATH']
+    return db_path
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(API_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def app_module(api_db):
+    import app
+    assert app.db_path == api_db
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
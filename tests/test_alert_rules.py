@@ -0,0 +1,107 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import alert_rules
+import dashboard_data_processor
+from conftest import ALERT_HEADER, load_exports, write_csv
+
+# (modelo de ameaça, categoria, ativo, file server/domínio, usuário, motivo de fechamento, status)
+TEXTS = [
+    ('Deletion of sensitive files', 'Exploitation', 'SRV01', 'corp', 'ana', '', 'Open'),
+    ('Mass deactivation', 'Desativação de contas', 'SRV01', 'corp', 'ana', '', 'Open'),
+    ('PsExec usage', 'Lateral movement', 'SRV02', 'corp', 'bruno', '', 'Open'),
+    ('Remote Desktop brute force', 'Intrusion', 'SRV02', 'corp', 'bruno', '', 'Closed'),
+    ('Abnormal ADMIN behavior', 'Exploitation', 'SRV03', 'corp', 'caio', '', 'Open'),
+    ('Ransomware detected', 'Malware', 'SRV03', 'corp', 'caio', '', 'Open'),
+    ('File encryption spike', 'Malware', 'SRV04', 'corp', 'davi', '', 'Resolved'),
+    ('Cryptominer', 'RANSOM activity', 'SRV04', 'corp', 'davi', '', 'Open'),
+    ('Kerberoasting', 'Credential access', 'krbtgt', 'corp', 'eva', '', 'Open'),
+    ('Suspicious login', 'Kerberos', 'SRV05', 'antt.gov.br', 'eva', 'INC0012345', 'Closed'),
+    ('Suspicious login', 'Access', 'SRV05', 'corp', 'Fábio (antt.gov.br)', 'closed since monday', 'Closed'),
+    ('Calendar sharing', 'Exfiltration', 'SRV06', 'corp', 'gil', 'incident reviewed', 'Closed'),
+    ('ANTT STEP meeting invite', 'Phishing', 'ANTT-SRV', 'corp', 'gil', 'SR-42', 'Open'),
+    ('Stepping stone', 'Lateral movement', 'SRV07', 'corp', 'hugo', 'see #123', 'Dismissed'),
+    ('Unusual access', 'Access', 'SRV07', 'corp', 'hugo', 'JIRA SEC-9', 'Open'),
+    ('Unusual access', 'Access', 'SRV08', 'corp', 'iris', 'ServiceNow ticket', 'False Positive'),
+    ('Unusual access', '', '', '', '', '', 'Open'),
+]
+
+CLOSED_STATES = ['closed', 'resolved', 'dismissed', 'mitigated', 'false positive']
+
+
+def baseline_masks(df):
+    """As buscas por palavra-chave que o dashboard fazia a cada requisição (str.contains sobre os textos)."""
+    def text(column):
+        return df[column].fillna(0).astype(str).str.lower()
+
+    cat, threat, asset, cr = text('alert_category'), text('threat_model_name'), text('asset'), text('close_reason')
+    admin_tools = cat.str.contains('admin') | threat.str.contains('admin')
+    for k in ['psexec', 'wmic', 'dcom', 'schtask', 'system administration tools', 'remote desktop', 'winrm']:
+        admin_tools |= threat.str.contains(k, case=False, na=False)
+    return {
+        'flag_deletion': cat.str.contains('delet') | cat.str.contains('desativ') | threat.str.contains('delet')
+        | threat.str.contains('deactiv'),
+        'flag_admin_tool': admin_tools,
+        'flag_ransomware': threat.str.contains('ransom|encrypt|crypto|ransomware', case=False, na=False)
+        | cat.str.contains('ransom', case=False, na=False),
+        'flag_kerberos': (threat + ' ' + cat + ' ' + asset).str.contains('krbtgt|kerberos', case=False, na=False),
+        'flag_itsm_ticket': cr.str.contains('inc|sr-|#|ticket|jira|servicenow', case=False, na=False),
+        'flag_antt_access': (asset + ' ' + text('file_server_domain') + ' ' + text('user_name'))
+        .str.contains('antt', case=False, na=False),
+        'flag_step_meeting': threat.str.contains('step|antt step|meeting|calendar', case=False, na=False),
+    }
+
+
+@pytest.fixture
+def rules_db(tmp_path, monkeypatch):
+    rows = [[threat, f'2025-04-{10 + i % 5:02d}T08:00:00', fs_domain, user, 'High', asset, category, f'ALERT-{i:04d}',
+             'SUTEC', user, close_reason, status]
+            for i, (threat, category, asset, fs_domain, user, close_reason, status) in enumerate(TEXTS)]
+    (tmp_path / 'upload').mkdir()
+    (tmp_path / 'project').mkdir()
+    db_path = load_exports(tmp_path / 'project', {
+        'SecurityAlerts': write_csv(tmp_path / 'upload' / 'Alerts_20250714_000000000_0.csv', ALERT_HEADER, rows)})
+    monkeypatch.setattr(dashboard_data_processor, 'DB_PATH', db_path)
+    return db_path
+
+
+def read_alerts(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return pd.read_sql_query('SELECT * FROM SecurityAlerts ORDER BY id', conn)
+    finally:
+        conn.close()
+
+
+def test_ingestion_flags_match_the_baseline_keyword_search(rules_db):
+    df = read_alerts(rules_db)
+    for flag, mask in baseline_masks(df).items():
+        assert df[flag].astype(bool).tolist() == mask.tolist(), flag
+    # 'inc' é palavra-chave simples, como antes: 'since' e 'incident' também contam
+    assert df.loc[df['close_reason'].isin(['closed since monday', 'incident reviewed']), 'flag_itsm_ticket'].all()
+
+
+@pytest.mark.parametrize('backend', ['pandas', 'sql'])
+def test_security_counts_match_the_baseline_keyword_search(rules_db, backend):
+    df = read_alerts(rules_db)
+    active = ~df['status'].astype(str).str.lower().isin(CLOSED_STATES)
+    masks = baseline_masks(df)
+
+    security = dashboard_data_processor.get_dashboard_data(backend, sections=['security'])['security']
+
+    for key, flag in alert_rules.SECURITY_COUNTS.items():
+        assert security[key] == int((masks[flag] & active).sum()), key
+
+
+def test_rules_file_extends_and_removes_rules(tmp_path):
+    rules_file = tmp_path / 'alert_rules.json'
+    rules_file.write_text('{"flag_step_meeting": null, "flag_vpn": {"fields": {"threat_model_name": ["VPN"]}}}')
+
+    rules = alert_rules.load_rules(str(rules_file))
+    classifier = alert_rules.AlertClassifier(rules)
+
+    assert 'flag_step_meeting' not in rules
+    assert classifier.flags_for('threat_model_name', 'Impossible travel via vpn') == {'flag_vpn'}
+    assert classifier.fingerprint != alert_rules.AlertClassifier(alert_rules.load_rules(None)).fingerprint
@@ -0,0 +1,65 @@
+import pytest
+
+import alert_search
+import process_data
+from conftest import ALERT_HEADER, USERS, alert_rows, write_csv
+
+
+def search(conn, term):
+    return sorted(r[0] for r in conn.execute(
+        'SELECT a.alert_id FROM SecurityAlertsSearch s JOIN SecurityAlerts a ON a.id = s.rowid '
+        'WHERE SecurityAlertsSearch MATCH ?', (term,)))
+
+
+def alerts_of(user):
+    return sorted(r[7] for r in alert_rows() if r[3] == user)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('rafael', '"rafael"'),
+    ('Rafael Souza', '"Rafael" "Souza"'),
+    ('marc*', '"marc"*'),
+    ('"Deletion of" OR NOT', '"Deletion of" "OR" "NOT"'),
+    ('- ( )', None),
+    ('', None),
+])
+def test_match_query_quotes_every_term(text, expected):
+    assert alert_search.match_query(text) == expected
+
+
+def test_full_load_indexes_the_alerts(db):
+    assert alert_search.is_current(db)
+    assert search(db, alert_search.match_query('rafael')) == alerts_of(USERS[1])
+    # Sem diferenciar acentos, e por prefixo
+    assert search(db, alert_search.match_query('marcia')) == alerts_of(USERS[0])
+    assert search(db, alert_search.match_query('márc*')) == alerts_of(USERS[0])
+
+
+def test_incremental_load_keeps_the_index_in_sync(db, tmp_path):
+    rows = alert_rows()
+    # Um alerta renomeado e um alerta novo
+    rows[1][3], rows[1][9] = 'Beatriz Nogueira (antt.gov.br)', 'beatriz'
+    rows.append(['Ransomware detected', '2025-04-20T08:00:00', 'SRVB403', 'Carlos Prado (antt.gov.br)', 'High',
+                 'SRVB403', 'Malware', 'ALERT-9999', 'SUTEC', 'carlos', '', 'Open'])
+
+    assert process_data.append_csv_to_sqlite(write_csv(tmp_path / 'Alerts_20250715_000000000_0.csv',
+                                                       ALERT_HEADER, rows), 'SecurityAlerts')
+
+    # Índice mantido pelos gatilhos: texto novo encontrado, texto antigo não
+    assert search(db, 'beatriz') == ['ALERT-0001']
+    assert search(db, 'carlos') == ['ALERT-9999']
+    assert 'ALERT-0001' not in search(db, 'rafael')
+    # Erro se o índice divergir do conteúdo de SecurityAlerts
+    db.execute("INSERT INTO SecurityAlertsSearch (SecurityAlertsSearch, rank) VALUES ('integrity-check', 1)")
+
+
+def test_search_endpoint(client):
+    response = client.get('/api/v1/securityalerts/search?q=rafael&page_size=3')
+    assert response.status_code == 200
+    first = response.get_json()
+    assert len(first) == 3
+    second = client.get(response.headers['Link'][1:response.headers['Link'].index('>')]).get_json()
+    # A carga completa numera os alertas (id) na ordem do export
+    assert sorted(a['id'] for a in first + second) == [i + 1 for i, r in enumerate(alert_rows()) if r[3] == USERS[1]]
+
+    assert client.get('/api/v1/securityalerts/search').status_code == 400
@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+
+from data_version import bump_generation
+
+
+# ------------------------------------------------------------------------------
+# Requisições condicionais (ETag / Last-Modified)
+# ------------------------------------------------------------------------------
+
+@pytest.mark.parametrize('url', ['/api/v1/securityalerts', '/api/v1/admetrics', '/api/v1/dashboard_data'])
+def test_matching_etag_returns_304(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'public, no-cache'
+
+    revalidated = client.get(url, headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == etag
+    assert revalidated.get_data() == b''
+
+    stale = client.get(url, headers={'If-None-Match': '"other"'})
+    assert stale.status_code == 200
+    assert stale.get_data() == response.get_data()
+
+
+def test_if_modified_since_returns_304(client):
+    response = client.get('/api/v1/admetrics')
+    last_modified = response.headers['Last-Modified']
+    assert client.get('/api/v1/admetrics', headers={'If-Modified-Since': last_modified}).status_code == 304
+
+
+def test_etag_changes_with_a_new_load_of_the_table(client, app_module):
+    alerts = client.get('/api/v1/securityalerts').headers['ETag']
+    ad = client.get('/api/v1/admetrics').headers['ETag']
+
+    conn = sqlite3.connect(app_module.db_path)
+    try:
+        with conn:
+            bump_generation(conn, 'SecurityAlerts')
+    finally:
+        conn.close()
+
+    response = client.get('/api/v1/securityalerts', headers={'If-None-Match': alerts})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != alerts
+    # Outras tabelas não mudaram: o ETag delas continua válido
+    assert client.get('/api/v1/admetrics', headers={'If-None-Match': ad}).status_code == 304
+
+
+def test_revalidation_does_not_query_the_database(client, app_module):
+    from sqlalchemy import event
+
+    etag = client.get('/api/v1/fileservermetrics').headers['ETag']
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app_module.app.app_context():
+        engine = app_module.db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        assert client.get('/api/v1/fileservermetrics', headers={'If-None-Match': etag}).status_code == 304
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert statements == []
@@ -0,0 +1,53 @@
+import pytest
+
+from conftest import alert_rows
+
+
+def alert_ids(response):
+    return [alert['id'] for alert in response.get_json()]
+
+
+def expected_order(severity=None, keep=lambda row: True):
+    # (alert_time, id) decrescente; alertas sem alert_time no fim, também por id decrescente.
+    # A carga completa numera os alertas (id) na ordem do export
+    rows = [(r[1], i + 1) for i, r in enumerate(alert_rows()) if severity in (None, r[4]) and keep(r)]
+    dated = sorted((r for r in rows if r[0]), reverse=True)
+    undated = sorted((r for r in rows if not r[0]), reverse=True)
+    return [id for _, id in dated + undated]
+
+
+@pytest.mark.parametrize('page_size', [1, 3, 5, 100])
+def test_cursor_pagination_covers_ties_without_gaps_or_repeats(client, page_size):
+    seen, pages = [], 0
+    url = f'/api/v1/securityalerts?page_size={page_size}'
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        seen.extend(alert_ids(response))
+        pages += 1
+        link = response.headers.get('Link')
+        url = link[1:link.index('>')] if link else None
+        if url:
+            assert response.headers['X-Next-Cursor'] in url
+
+    assert seen == expected_order()
+    assert pages == -(-len(seen) // page_size)
+
+
+def test_cursor_pagination_keeps_filters(client):
+    first = client.get('/api/v1/securityalerts?page_size=2&severity=High')
+    second = client.get(f"/api/v1/securityalerts?page_size=2&severity=High&cursor={first.headers['X-Next-Cursor']}")
+    assert alert_ids(first) + alert_ids(second) == expected_order('High')[:4]
+
+
+def test_invalid_cursor_is_rejected(client):
+    assert client.get('/api/v1/securityalerts?cursor=not-a-cursor').status_code == 400
+
+
+def test_cursor_pagination_with_status_and_date_filters(client):
+    url = '/api/v1/securityalerts?page_size=2&status=Open&date_from=2025-04-11&date_to=2025-04-12'
+    first = client.get(url)
+    second = client.get(f"{url}&cursor={first.headers['X-Next-Cursor']}")
+    expected = expected_order(keep=lambda r: r[-1] == 'Open' and '2025-04-11' <= r[1][:10] <= '2025-04-12')
+    assert len(expected) == 6
+    assert alert_ids(first) + alert_ids(second) == expected[:4]
@@ -0,0 +1,70 @@
+import pytest
+
+from conftest import alert_rows
+
+
+def dashboard(client, query):
+    response = client.get(f'/api/v1/dashboard_data?{query}')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def active_alerts(keep):
+    return [r for r in alert_rows() if r[-1] != 'Closed' and keep(r)]
+
+
+def test_date_range_limits_the_alerts(client):
+    security = dashboard(client, 'sections=security&date_from=2025-04-11&date_to=2025-04-11')['security']
+    expected = active_alerts(lambda r: r[1].startswith('2025-04-11'))
+    assert security['total_alerts'] == len(expected)
+    assert security['timeline'] == {'labels': ['2025-04-11'], 'data': [len(expected)]}
+
+
+def test_date_range_limits_the_snapshots(client):
+    latest = dashboard(client, 'sections=ad_health&date_to=2025-01-31')['ad_health']['latest']
+    assert latest['users_total'] == 9300
+    evolution = dashboard(client, 'sections=ad_health&date_from=2025-02-01')['ad_health']['evolution']
+    assert evolution['dates'] == ['2025-02-01']
+
+
+def test_domain_filter(client):
+    assert dashboard(client, 'sections=ad_health&domain=antt.gov.br')['ad_health']['latest']['users_total'] == 9325
+    assert dashboard(client, 'sections=ad_health&domain=other.local')['ad_health']['latest']['users_total'] == 0
+    # Nos alertas o domínio é a coluna file_server_domain
+    security = dashboard(client, 'sections=security&domain=Exchange Online2')['security']
+    assert security['total_alerts'] == len(active_alerts(lambda r: r[2] == 'Exchange Online2'))
+
+
+def test_file_server_filter(client):
+    data = dashboard(client, 'sections=security,governance,data_exposure&file_server=SRVB403')
+    assert [s['server'] for s in data['data_exposure']['servers']] == ['SRVB403']
+    assert data['governance']['storage']['total_tb'] == round(17200 / 1024, 2)
+    assert data['security']['total_alerts'] == len(active_alerts(lambda r: r[2] == 'SRVB403'))
+
+
+def test_filter_values_are_not_sql(client):
+    data = dashboard(client, "file_server=x' OR '1'='1&domain=%27%3B DROP TABLE ADMetrics%3B --")
+    assert data['security']['total_alerts'] == 0
+    assert data['data_exposure']['servers'] == []
+    assert dashboard(client, 'sections=ad_health')['ad_health']['latest']['users_total'] == 9325
+
+
+@pytest.mark.parametrize('query', ['date_from=2025-05-01&date_to=2025-04-01', 'date_from=ontem'])
+def test_invalid_dates_are_rejected(client, query):
+    assert client.get(f'/api/v1/dashboard_data?{query}').status_code == 400
+
+
+def test_each_scope_gets_its_own_bounded_cache_entry(api_db):
+    from dashboard_data_processor import ScopedDashboardCache, compute_dashboard
+    from dashboard_scope import DashboardScope
+
+    version = compute_dashboard(api_db, sections=['security'])[0]
+    cache = ScopedDashboardCache(api_db, size=2)
+    scopes = [DashboardScope(date_from=day) for day in ('2025-04-10', '2025-04-11', '2025-04-12')]
+    responses = [cache.get(scope, version, ['security']) for scope in scopes]
+
+    assert [r['security']['total_alerts'] for r in responses] == [
+        len(active_alerts(lambda r, day=scope.date_from: r[1] >= day)) for scope in scopes]
+    # Mesmo recorte na mesma versão: a resposta em cache; o mais antigo saiu do LRU
+    assert cache.get(scopes[2], version, ['security']) is responses[2]
+    assert cache.get(scopes[0], version, ['security']) is not responses[0]
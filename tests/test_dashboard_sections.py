@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from dashboard_data_processor import GOVERNANCE_SECURITY_KEYS
+from dashboard_tasks import RESULT_FILE_NAME, recompute_dashboard
+
+
+@pytest.fixture
+def published(app_module):
+    """Resultado do recálculo em segundo plano publicado para a versão atual, com os indicadores da governança."""
+    recompute_dashboard(app_module.db_path)
+    store = app_module.dashboard_results
+    payload = store.latest()
+    payload['data']['security'].update(dict.fromkeys(GOVERNANCE_SECURITY_KEYS, 1))
+    store.publish(payload)
+    yield payload['data']
+    os.remove(os.path.join(os.path.dirname(app_module.db_path), RESULT_FILE_NAME))
+
+
+def test_published_result_is_served_whole(client, published):
+    assert client.get('/api/v1/dashboard_data').get_json() == published
+
+
+def test_published_result_keeps_only_the_requested_sections(client, published):
+    data = client.get('/api/v1/dashboard_data?sections=security').get_json()
+    assert list(data) == ['security']
+    # Sem a governança, 'security' não traz os indicadores calculados por ela (como no snapshot)
+    assert not set(GOVERNANCE_SECURITY_KEYS) & set(data['security'])
+    assert data['security']['total_alerts'] == published['security']['total_alerts']
+
+    data = client.get('/api/v1/dashboard_data?sections=security,governance').get_json()
+    assert data['security'] == published['security']
+    assert data['governance'] == published['governance']
+    assert 'ad_health' not in data
+
+
+def test_published_section_route(client, published):
+    assert client.get('/api/v1/dashboard_data/governance').get_json() == {'governance': published['governance']}
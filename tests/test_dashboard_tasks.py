@@ -0,0 +1,51 @@
+import os
+
+import dashboard_tasks
+import process_data
+
+
+def test_main_republishes_only_when_a_table_changed(project_dir, exports, monkeypatch):
+    published, cached = [], []
+    monkeypatch.setattr(process_data, 'trigger_dashboard_recompute', lambda db_path: published.append(db_path) or True)
+    monkeypatch.setattr(process_data.columnar_cache, 'available', lambda: True)
+    monkeypatch.setattr(process_data.columnar_cache, 'write_table',
+                        lambda conn, db_path, table_name: cached.append(table_name) or True)
+    sources = list(exports.values())
+
+    process_data.main(sources=sources)
+    assert len(published) == 1
+    assert sorted(cached) == ['ADMetrics', 'FileServerMetrics', 'SecurityAlerts']
+
+    # Recarga incremental dos mesmos exports: nenhuma geração nova
+    process_data.main(incremental=True, sources=sources)
+    assert len(published) == 1
+    assert len(cached) == 3
+
+
+def test_eager_recompute_publishes_the_dashboard(loaded_db):
+    assert dashboard_tasks.celery_app.conf.task_always_eager
+    assert dashboard_tasks.trigger_dashboard_recompute(loaded_db)
+
+    payload = dashboard_tasks.get_result_store(loaded_db).latest()
+    assert payload['data']['ad_health']['latest']['users_total'] == 9325
+
+
+def test_eager_recompute_failure_is_reported(loaded_db, monkeypatch, capsys):
+    def fail(db_path):
+        raise RuntimeError('falha no cálculo')
+
+    monkeypatch.setattr(dashboard_tasks, 'compute_dashboard', fail)
+
+    assert not dashboard_tasks.trigger_dashboard_recompute(loaded_db)
+    assert 'Erro ao recalcular o dashboard: falha no cálculo' in capsys.readouterr().out
+    assert not os.path.exists(os.path.join(os.path.dirname(loaded_db), dashboard_tasks.RESULT_FILE_NAME))
+
+
+def test_eager_retag_failure_is_reported(loaded_db, monkeypatch, capsys):
+    def fail(db_path, force=False):
+        raise ValueError('regras inválidas')
+
+    monkeypatch.setattr(dashboard_tasks, 'retag_alerts', fail)
+
+    assert not dashboard_tasks.trigger_alert_retag(loaded_db)
+    assert 'Erro ao reclassificar os alertas: regras inválidas' in capsys.readouterr().out
@@ -0,0 +1,84 @@
+import json
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import dashboard_data_processor
+from conftest import AD_HEADER, FS_HEADER, load_exports, write_csv
+
+# Dois domínios, com file servers que têm o nome de um domínio (o mapa de
+# vulnerabilidade soma os SIDs não resolvidos desses servidores em todas as datas)
+AD_ROWS = [
+    ['01.jan.2025', 'antt.gov.br', 3300, 9300, 4700, 90, 5500],
+    ['01.feb.2025', 'antt.gov.br', 3308, 9325, 4722, 91, 5557],
+    ['01.jan.2025', 'corp.local', 120, 400, 80, 30, 10],
+    ['01.feb.2025', 'corp.local', 121, 410, 81, 35, 12],
+    ['01.feb.2025', 'lab.local', 5, 0, 1, 2, 0],
+]
+FS_ROWS = [
+    ['01.jan.2025', 'SRVB403', 951533, 8635629, 2975571, 17153, 4000, 12],
+    ['01.feb.2025', 'SRVB403', 951600, 8636000, 2975600, 17200, 4100, 10],
+    ['01.jan.2025', 'corp.local', 100, 1000, 250, 40, 5, 7],
+    ['01.feb.2025', 'corp.local', 110, 1100, 260, 42, 6, 9],
+    ['01.feb.2025', 'antt.gov.br', 10, 100, 1500, 900, 1, 3],
+]
+
+
+def expected_governance(db_path):
+    """Os laços do cálculo original (iterrows / um filtro de df_fs por domínio), com o último snapshot por date_iso."""
+    conn = sqlite3.connect(db_path)
+    try:
+        df_fs = pd.read_sql_query('SELECT * FROM FileServerMetrics', conn).fillna(0)
+        df_ad = pd.read_sql_query('SELECT * FROM ADMetrics', conn).fillna(0)
+    finally:
+        conn.close()
+
+    latest_fs = df_fs.sort_values('date_iso', kind='stable').groupby('file_server').tail(1)
+    servers = []
+    for _, row in latest_fs.iterrows():
+        perms = int(row.get('no_of_permission_entries', 0) or 0)
+        size = float(row.get('size_of_all_files_and_folders', 0) or 0)
+        score = min(100, int((perms / 1000.0) * 50 + (size / 1000.0) * 50))
+        servers.append({"server": str(row['file_server']), "permission_entries": perms, "size_gb": size,
+                        "exposure_score": score})
+    exposure = {"exposure_score": int(sum(s['exposure_score'] for s in servers) / len(servers)), "servers": servers}
+
+    vuln_list = []
+    for domain, g in df_ad.groupby('domain_name'):
+        latest_dom = g.sort_values('date_iso', kind='stable').iloc[-1]
+        users_dom = int(latest_dom['no_of_users'])
+        disabled_pct = (int(latest_dom['no_of_disabled_users']) / users_dom * 100) if users_dom > 0 else 0
+        admins_dom = int(latest_dom['no_of_admin_accounts'])
+        matched = df_fs[df_fs['file_server'] == domain]
+        unresolved = int(matched['no_of_folders_with_unresolved_sids'].sum()) if not matched.empty else 0
+        score = min(100, int(unresolved * 2 + disabled_pct * 0.6
+                             + (admins_dom / users_dom * 100 if users_dom > 0 else 0) * 0.8))
+        vuln_list.append({"domain": domain, "vuln_score": score, "disabled_pct": round(disabled_pct, 1),
+                          "admins": admins_dom, "unresolved_sids": unresolved})
+    vuln_map = sorted(vuln_list, key=lambda x: x['vuln_score'], reverse=True)
+    return json.loads(json.dumps({'data_exposure': exposure, 'ad_vulnerability_map': vuln_map}))
+
+
+@pytest.fixture
+def governance_db(tmp_path, monkeypatch):
+    (tmp_path / 'upload').mkdir()
+    (tmp_path / 'project').mkdir()
+    db_path = load_exports(tmp_path / 'project', {
+        'FileServerMetrics': write_csv(tmp_path / 'upload' / 'ANTT-14a01.csv', FS_HEADER, FS_ROWS),
+        'ADMetrics': write_csv(tmp_path / 'upload' / 'ANTT-14d01.csv', AD_HEADER, AD_ROWS),
+    })
+    monkeypatch.setattr(dashboard_data_processor, 'DB_PATH', db_path)
+    return db_path
+
+
+@pytest.mark.parametrize('backend', ['pandas', 'sql'])
+def test_exposure_and_vulnerability_map_match_the_row_loops(governance_db, backend):
+    data = json.loads(json.dumps(dashboard_data_processor.get_dashboard_data(backend, sections=['governance'])))
+    expected = expected_governance(governance_db)
+
+    assert data['ad_vulnerability_map'] == expected['ad_vulnerability_map']
+    assert data['data_exposure'] == expected['data_exposure']
+    # Servidores com nome de domínio entram no mapa, em todas as datas
+    assert {d['domain']: d['unresolved_sids'] for d in data['ad_vulnerability_map']} == \
+        {'antt.gov.br': 3, 'corp.local': 16, 'lab.local': 0}
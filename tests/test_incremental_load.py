@@ -0,0 +1,72 @@
+import sqlite3
+
+import process_data
+from conftest import AD_HEADER, ALERT_HEADER, ad_rows, alert_rows, write_csv
+from data_version import read_data_version
+
+
+def alerts_snapshot(conn):
+    return {
+        'version': read_data_version(conn)['SecurityAlerts'],
+        'rows': conn.execute('SELECT * FROM SecurityAlerts ORDER BY id').fetchall(),
+    }
+
+
+def last_load(conn):
+    return conn.execute(
+        'SELECT mode, rows_read, rows_inserted, rows_updated FROM LoadHistory ORDER BY id DESC LIMIT 1'
+    ).fetchone()
+
+
+def test_incremental_reload_of_unchanged_export_is_a_no_op(db, exports):
+    before = alerts_snapshot(db)
+
+    assert process_data.append_csv_to_sqlite(exports['SecurityAlerts'], 'SecurityAlerts')
+
+    assert alerts_snapshot(db) == before
+    assert last_load(db) == ('incremental', len(alert_rows()), 0, 0)
+
+
+def test_incremental_reload_upserts_by_alert_id(db, exports, tmp_path):
+    rows = alert_rows()
+    # Um alerta fechado e renomeado, e um alerta novo num dia ainda sem alertas
+    rows[1][3], rows[1][9], rows[1][-1] = 'Beatriz Nogueira (antt.gov.br)', 'beatriz', 'Closed'
+    rows.append(['Ransomware detected', '2025-04-20T08:00:00', 'SRVB403', 'Carlos Prado (antt.gov.br)', 'High',
+                 'SRVB403', 'Malware', 'ALERT-9999', 'SUTEC', 'carlos', '', 'Open'])
+    changed = write_csv(tmp_path / 'Alerts_20250715_000000000_0.csv', ALERT_HEADER, rows)
+    before = alerts_snapshot(db)
+
+    assert process_data.append_csv_to_sqlite(changed, 'SecurityAlerts')
+
+    after = alerts_snapshot(db)
+    assert last_load(db) == ('incremental', len(rows), 1, 1)
+    assert after['version'][0] == before['version'][0] + 1
+    assert after['version'][1] == before['version'][1] + 1
+    assert db.execute("SELECT status FROM SecurityAlerts WHERE alert_id = 'ALERT-0001'").fetchone() == ('Closed',)
+
+
+
+def test_incremental_snapshot_load_skips_rows_before_the_high_water_mark(db, tmp_path):
+    rows = ad_rows()
+    rows[0][3] = 1          # jan: anterior à marca d'água (fev), ignorado
+    rows[1][3] = 9400       # fev: o próprio dia da marca d'água, atualizado pela chave (date, domain_name)
+    rows.append(['01.mar.2025', 'antt.gov.br', 3310, 9350, 4730, 92, 5560])
+
+    assert process_data.append_csv_to_sqlite(write_csv(tmp_path / 'ANTT-14d01.csv', AD_HEADER, rows), 'ADMetrics')
+
+    assert db.execute(
+        'SELECT mode, rows_read, rows_inserted, rows_updated, high_water_mark FROM LoadHistory ORDER BY id DESC LIMIT 1'
+    ).fetchone() == ('incremental', 3, 1, 1, '2025-03-01')
+    assert db.execute('SELECT date_iso, no_of_users FROM ADMetrics ORDER BY date_iso').fetchall() == [
+        ('2025-01-01', 9300), ('2025-02-01', 9400), ('2025-03-01', 9350)]
+
+
+def test_incremental_load_into_a_new_database_creates_the_table(project_dir, exports):
+    assert process_data.append_csv_to_sqlite(exports['SecurityAlerts'], 'SecurityAlerts')
+
+    conn = sqlite3.connect(project_dir / process_data.DB_NAME)
+    try:
+        assert last_load(conn) == ('incremental', len(alert_rows()), len(alert_rows()), 0)
+        assert conn.execute('SELECT COUNT(DISTINCT alert_id) FROM SecurityAlerts').fetchone() == (len(alert_rows()),)
+    finally:
+        conn.close()
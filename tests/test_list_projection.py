@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import event
+
+from conftest import ad_rows, fs_rows
+
+
+@pytest.fixture
+def statements(app_module):
+    captured = []
+
+    def capture(conn, cursor, statement, *args):
+        captured.append(statement)
+
+    with app_module.app.app_context():
+        engine = app_module.db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    yield captured
+    event.remove(engine, 'before_cursor_execute', capture)
+
+
+def test_full_list_keeps_every_field(client):
+    rows = client.get('/api/v1/admetrics').get_json()
+    assert len(rows) == len(ad_rows())
+    assert {'id', 'date', 'domain_name', 'no_of_users', 'no_of_disabled_users'} <= set(rows[0])
+
+
+def test_fields_are_projected_in_sql(client, statements):
+    rows = client.get('/api/v1/fileservermetrics?fields=date,file_server').get_json()
+
+    assert rows == [{'date': r[0], 'file_server': r[1]} for r in fs_rows()]
+    select = next(s for s in statements if 'FROM "FileServerMetrics"' in s)
+    assert 'size_of_all_files_and_folders' not in select and 'no_of_permission_entries' not in select
+
+
+def test_unknown_field_is_rejected(client):
+    response = client.get('/api/v1/admetrics?fields=date,no_such_field')
+    assert response.status_code == 400
+    assert 'no_such_field' in response.get_json()['message']
+
+
+@pytest.mark.parametrize('url', ['/api/v1/admetrics', '/api/v1/fileservermetrics'])
+def test_columnar_format_has_the_same_values(client, url):
+    rows = client.get(f'{url}?fields=date,id').get_json()
+    columnar = client.get(f'{url}?fields=date,id&format=columnar').get_json()
+
+    assert columnar['columns'] == ['date', 'id']
+    assert columnar['data'] == {name: [row[name] for row in rows] for name in columnar['columns']}
+
+
+def test_columnar_format_without_fields(client):
+    rows = client.get('/api/v1/admetrics').get_json()
+    columnar = client.get('/api/v1/admetrics?format=columnar').get_json()
+    assert columnar['columns'] == sorted(rows[0])
+    assert [dict(zip(columnar['columns'], values)) for values in zip(*columnar['data'].values())] == rows
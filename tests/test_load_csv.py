@@ -0,0 +1,53 @@
+import sqlite3
+
+import pytest
+
+import process_data
+from conftest import AD_HEADER, ALERT_HEADER, FS_HEADER, write_csv
+
+HEADERS = {'SecurityAlerts': ALERT_HEADER, 'FileServerMetrics': FS_HEADER, 'ADMetrics': AD_HEADER}
+
+
+def schema(db_path, table_name):
+    conn = sqlite3.connect(db_path)
+    try:
+        return (conn.execute(f'PRAGMA table_info("{table_name}")').fetchall(),
+                conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0])
+    finally:
+        conn.close()
+
+
+def header_only(tmp_path, table_name):
+    name = {'SecurityAlerts': 'Alerts_20250801_000000000_0.csv', 'FileServerMetrics': 'ANTT-14a01.csv',
+            'ADMetrics': 'ANTT-14d01.csv'}[table_name]
+    (tmp_path / 'empty').mkdir(exist_ok=True)
+    return write_csv(tmp_path / 'empty' / name, HEADERS[table_name], [])
+
+
+@pytest.mark.parametrize('table_name', sorted(HEADERS))
+def test_header_only_export_creates_an_empty_table(project_dir, tmp_path, table_name, capsys):
+    assert process_data.load_csv(header_only(tmp_path, table_name), table_name)
+
+    columns, rows = schema(project_dir / process_data.DB_NAME, table_name)
+    assert rows == 0
+    assert columns[0][1] == 'id'
+    assert 'não tem linhas de dados' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('table_name', sorted(HEADERS))
+@pytest.mark.parametrize('incremental', [False, True])
+def test_header_only_export_keeps_the_typed_table(loaded_db, tmp_path, table_name, incremental):
+    columns, rows = schema(loaded_db, table_name)
+
+    assert process_data.load_csv(header_only(tmp_path, table_name), table_name, incremental=incremental)
+
+    # Mesmo esquema (tipos da carga anterior); a carga completa esvazia a tabela, a incremental não muda nada
+    assert schema(loaded_db, table_name) == (columns, rows if incremental else 0)
+
+
+def test_header_only_export_in_a_parallel_load(loaded_db, tmp_path):
+    columns, _ = schema(loaded_db, 'ADMetrics')
+
+    assert process_data.load_parallel([(header_only(tmp_path, 'ADMetrics'), 'ADMetrics', False)], 2) == [True]
+
+    assert schema(loaded_db, 'ADMetrics') == (columns, 0)
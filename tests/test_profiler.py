@@ -0,0 +1,23 @@
+import pytest
+
+from profiler import RequestProfiler
+
+
+@pytest.mark.parametrize('token, prefixes, path, provided, wanted', [
+    # Só prefixos
+    (None, ['/api/v1/dashboard_data'], '/api/v1/dashboard_data/security', None, True),
+    (None, ['/api/v1/dashboard_data'], '/api/v1/admetrics', None, False),
+    # Só token
+    ('segredo', [], '/api/v1/admetrics', 'segredo', True),
+    ('segredo', [], '/api/v1/admetrics', 'outro', False),
+    ('segredo', [], '/api/v1/admetrics', None, False),
+    # Prefixos e token: o token vale também fora dos prefixos
+    ('segredo', ['/api/v1/dashboard_data'], '/api/v1/dashboard_data', None, True),
+    ('segredo', ['/api/v1/dashboard_data'], '/api/v1/admetrics', 'segredo', True),
+    ('segredo', ['/api/v1/dashboard_data'], '/api/v1/admetrics', 'outro', False),
+    # Prefixo vazio não perfila tudo
+    (None, [''], '/api/v1/admetrics', None, False),
+])
+def test_wanted(tmp_path, token, prefixes, path, provided, wanted):
+    profiler = RequestProfiler(str(tmp_path), token=token, prefixes=prefixes)
+    assert profiler.wanted(path, provided) is wanted
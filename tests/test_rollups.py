@@ -0,0 +1,56 @@
+import sqlite3
+
+import process_data
+import rollups
+from conftest import ALERT_HEADER, alert_rows, load_exports, write_csv
+
+
+def rollup_rows(conn):
+    columns = ', '.join(f'"{r[1]}"' for r in conn.execute('PRAGMA table_info(AlertDailyRollup)'))
+    return conn.execute(f'SELECT {columns} FROM AlertDailyRollup ORDER BY {columns}').fetchall()
+
+
+def test_full_load_builds_the_daily_rollups(db):
+    assert rollups.is_current(db, 'SecurityAlerts')
+    assert rollups.is_current(db, 'ADMetrics')
+    # Alertas sem alert_time ficam fora da timeline
+    assert rollups.alert_timeline(db) == db.execute(
+        f"SELECT {rollups.ALERT_DAY} AS day, COUNT(*) FROM SecurityAlerts WHERE day IS NOT NULL GROUP BY day ORDER BY day"
+    ).fetchall()
+    assert rollups.ad_evolution(db) == [('2025-01-01', 9300, 5500), ('2025-02-01', 9325, 5557)]
+
+
+def test_incremental_load_refreshes_only_the_touched_days(db, tmp_path):
+    rows = alert_rows()
+    # Um alerta movido para outro dia e um alerta novo num dia ainda sem alertas
+    rows[1][1] = '2025-04-12T09:00:00'
+    rows.append(['Ransomware detected', '2025-04-20T08:00:00', 'SRVB403', 'Carlos Prado (antt.gov.br)', 'High',
+                 'SRVB403', 'Malware', 'ALERT-9999', 'SUTEC', 'carlos', '', 'Open'])
+    changed = write_csv(tmp_path / 'Alerts_20250715_000000000_0.csv', ALERT_HEADER, rows)
+
+    assert process_data.append_csv_to_sqlite(changed, 'SecurityAlerts')
+
+    # Rollup diário recalculado nos dias tocados = rollup de uma carga completa do mesmo export
+    assert rollups.is_current(db, 'SecurityAlerts')
+    (tmp_path / 'full').mkdir()
+    full = sqlite3.connect(load_exports(tmp_path / 'full', {'SecurityAlerts': changed}))
+    try:
+        assert rollup_rows(db) == rollup_rows(full)
+    finally:
+        full.close()
+
+
+def test_stale_rollup_is_not_read(db):
+    with db:
+        db.execute("UPDATE DataVersion SET generation = generation + 1 WHERE table_name = 'SecurityAlerts'")
+    assert rollups.alert_timeline(db) is None
+    assert rollups.ad_evolution(db) is not None
+
+
+def test_retired_file_server_rollup_is_dropped(db, exports):
+    with db:
+        db.execute('CREATE TABLE FileServerDailyRollup (day TEXT NOT NULL)')
+
+    assert process_data.load_csv(exports['FileServerMetrics'], 'FileServerMetrics')
+
+    assert not db.execute("SELECT 1 FROM sqlite_master WHERE name = 'FileServerDailyRollup'").fetchone()